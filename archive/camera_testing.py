@@ -32,7 +32,7 @@ while True:
     # that's where red is in hsv space
     binary_image_1 = cv.inRange(hsv_frame, (0, 60, 60), (10, 255, 130))
     binary_image_2 = cv.inRange(hsv_frame, (170, 60, 60), (180, 255, 130))
-    binary_image = binary_image_1 + binary_image_2
+    binary_image = cv.bitwise_or(binary_image_1, binary_image_2)
 
     moments = cv.moments(binary_image)
     # print(moments)
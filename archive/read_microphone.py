@@ -29,10 +29,13 @@ START_TIME = time.time()
 all_audio_data = []
 
 
-def save_audio_wav(data, filename=time.time() - START_TIME):
+def save_audio_wav(data, filename=None):
     """
     Saves audio data (payloads only) to a .wav file.
     """
+    if filename is None:
+        # a default of time.time() would be a float fixed when the module loads
+        filename = f"audio_{time.time() - START_TIME:.0f}"
     print(f"\nSaving audio chunks directly to {filename}...")
 
     samples = np.frombuffer(
@@ -40,7 +43,7 @@ def save_audio_wav(data, filename=time.time() - START_TIME):
     )  # little-endian('<') 16-bit('i2') signed int
 
     with wave.open(filename + ".wav", "wb") as f_out:
-        f_out.setnchannels(1)
+        f_out.setnchannels(CHANNELS)  # payloads hold interleaved frames
         f_out.setframerate(SAMPLE_RATE)
         f_out.setsampwidth(SAMPLE_WIDTH_BYTES)
         f_out.writeframes(samples.tobytes())
@@ -85,7 +88,6 @@ def start_serial_listener():
                     all_audio_data.append(data)
                     # Print "." to show a successful packet
                     print(".", end="", flush=True)
-                    save_audio_wav(data)
                 else:
                     # Didn't get the full payload, buffer was incomplete.
                     # This indicates a problem (e.g., serial buffer overrun)
@@ -0,0 +1,63 @@
+"""
+Pitch analysis ActivityGate saves on the WAV files padded with noise, and whether the
+melody is still found.
+"""
+
+import time
+import numpy as np
+import librosa
+from robot.software.activity_detection import ActivityGate
+from robot.software.audio_processing import CollectAudio, NoteSegmenter, StreamingPitch
+from robot.software.melody_matcher import MelodyMatcher
+from robot.benchmarks.media import wav_files
+
+PADDING_SECONDS = 10
+NOISE_LEVELS = (0.0, 0.002, 0.01)  # RMS of the background noise
+
+
+def stream(y, sr, use_gate, chunk_seconds=0.25):
+    pitch = StreamingPitch(sr)
+    segmenter = NoteSegmenter(min_instances=2)
+    matcher = MelodyMatcher()
+    matcher.add(CollectAudio.TREAT_MELODY, CollectAudio.MELODY_MIDI)
+    gate = ActivityGate(sr) if use_gate else None
+    chunk = int(chunk_seconds * sr)
+    heard = []
+    start = time.perf_counter()
+    # same steps as CollectAudio.analyze()
+    for i in range(0, len(y), chunk):
+        samples = y[i : i + chunk]
+        if gate is not None and not gate.process(samples):
+            pitch.skip(samples)
+            notes = segmenter.flush()
+        else:
+            notes = segmenter.process(pitch.process(samples))
+        heard += matcher.feed_many(notes)
+    elapsed = time.perf_counter() - start
+    gated = gate.gated_ratio() if gate is not None else 0.0
+    return elapsed / (len(y) / sr), gated, CollectAudio.TREAT_MELODY in heard
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    sr = CollectAudio.RATE
+    print(f"{PADDING_SECONDS} s of noise before and after each file")
+    print("CPU seconds per audio second, share of audio gated, melody found")
+    print(
+        f"{'file':<24}{'noise':>7}{'ungated':>9}{'found':>6}"
+        f"{'gated':>9}{'skipped':>8}{'found':>6}"
+    )
+    for name, path in wav_files():
+        y, _ = librosa.load(path, sr=sr)
+        padding = np.zeros(PADDING_SECONDS * sr, dtype=np.float32)
+        clean = np.concatenate([padding, y, padding])
+        for level in NOISE_LEVELS:
+            noisy = clean + rng.normal(0, level, len(clean)).astype(np.float32)
+            # through int16 like the microphone stream
+            noisy = (np.clip(noisy, -1, 1) * 32767).astype(np.int16) / 32768
+            cost, _, found = stream(noisy, sr, use_gate=False)
+            gated_cost, gated, gated_found = stream(noisy, sr, use_gate=True)
+            print(
+                f"{name:<24}{level:>7.3f}{cost:>9.4f}{'yes' if found else 'no':>6}"
+                f"{gated_cost:>9.4f}{gated:>8.0%}{'yes' if gated_found else 'no':>6}"
+            )
@@ -0,0 +1,427 @@
+"""
+Emulates robot/hardware/usb_receive/usb_receive.ino on a pty, with the serial line and
+the sketch's loop timed like on an Uno. Use its port or link in place of /dev/ttyACM0:
+    python -m robot.benchmarks.arduino_emulator [baud] [link]
+    python -m robot.main [link]
+"""
+
+import collections
+import math
+import os
+import select
+import sys
+import threading
+import time
+import tty
+import numpy as np
+from robot.software.packet_protocol import (
+    CRC_SIZE,
+    FRAME_TELEMETRY,
+    HEADER_SIZE,
+    MAX_PAYLOAD,
+    PACKET_SIZE,
+    DeltaDecoder,
+    FrameDecoder,
+    FrameEncoder,
+)
+from robot.software.telemetry import (
+    BUTTON_LATCHED,
+    BUTTON_PRESSED,
+    NEEDS_KEYFRAME,
+    TELEMETRY,
+)
+
+BITS_PER_BYTE = 10  # start bit, 8 data bits, stop bit
+RX_BUFFER_SIZE = 64  # HardwareSerial's receive buffer on the ATmega328P
+TX_BUFFER_SIZE = 64
+FRAME_BUFFER_SIZE = HEADER_SIZE + MAX_PAYLOAD + CRC_SIZE  # the sketch's frame[]
+TELEMETRY_INTERVAL = 0.02  # must match TELEMETRY_INTERVAL_MS in the sketch
+
+# rough seconds the sketch spends on each step on a 16 MHz Uno
+COSTS = {
+    "loop": 10e-6,  # a pass with nothing to do
+    "read_byte": 2e-6,  # Serial.read() into the frame buffer
+    "crc_byte": 5e-6,  # the bitwise CRC-16
+    "motors": 1.5e-3,  # run() and setSpeed() of both motors over I2C
+    "servo": 10e-6,  # one Servo.write()
+    "brightness": 0.4e-3,  # setIntensity() on both displays
+    "eye_row": 0.2e-3,  # one setRow(), shifted out to both chained displays
+}
+
+
+class ArduinoEmulator(threading.Thread):
+    """
+    Runs the sketch against a pty on a model of the serial line. Everything is timed on
+    one clock that follows time.monotonic(): bytes are stamped when the host writes them,
+    reach the receive buffer one byte time apart, and the sketch's loop passes take
+    their modelled cost, so the numbers don't depend on how busy this process is.
+    """
+
+    def __init__(self, baud=115200, link=None, costs=None):
+        """
+        Args:
+            baud (Int) (optional): Modelled bits per second of the Arduino's Serial
+                (defaults to 115200, like the sketch)
+            link (String) (optional): Path of a symlink to the pty, e.g. /tmp/ttyACM0
+                (defaults to None, no link)
+            costs (dict) (optional): Seconds per step replacing entries of COSTS
+        """
+        super().__init__(daemon=True)
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)  # no echo or newline translation before the host opens it
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self.link = link
+        if link is not None:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.port, link)
+
+        self.baud = baud
+        self.byte_time = BITS_PER_BYTE / baud
+        self.costs = dict(COSTS, **(costs or {}))
+        self._running = True
+        self._clock = None  # start of the sketch's next loop pass
+
+        # serial line, (arrival, write time, byte) per byte not in the receive buffer yet
+        self._wire = collections.deque()
+        self._wire_free = 0.0  # when the line is done with the last byte written
+        self._rx = collections.deque()  # (write time, byte), at most RX_BUFFER_SIZE
+        self._tx = collections.deque()  # (time its last byte is sent, frame)
+        self._tx_free = 0.0
+
+        # the sketch's state, its frame buffer, counters and actuators
+        self.decoder = FrameDecoder()
+        self.actuator_state = DeltaDecoder()
+        self.loop_count = 0
+        self._telemetry = FrameEncoder()  # the sketch's telemetrySequence
+        self._last_telemetry = None
+        self.button_down = False
+        self.button_latched = False
+        self.encoder_right = 0
+        self.encoder_left = 0
+
+        # statistics
+        self.start_time = None
+        self.bytes_received = 0
+        self.commands = 0  # frames whose fields were written to the actuators
+        self.overruns = 0  # bytes lost to a full receive buffer
+        self.max_line_delay = 0.0  # longest a written byte waited for the line
+        self.telemetry_sent = 0
+        self.telemetry_skipped = 0  # loop passes the transmit buffer was too full
+        self.telemetry_dropped = 0  # frames the host didn't read in time
+        self._latencies = collections.deque(maxlen=100000)
+        self._lock = threading.Lock()
+
+    def run(self):
+        try:
+            while self._running:
+                now = time.monotonic()
+                # frames are only sent to the host in real time, everything else can
+                # be caught up on the next wake up
+                wake = now + 0.005
+                if self._tx:
+                    wake = min(wake, self._tx[0][0])
+                timeout = max(0.0, wake - now)
+                ready, _, _ = select.select([self._master], [], [], timeout)
+                if ready:
+                    try:
+                        data = os.read(self._master, 4096)
+                    except (BlockingIOError, OSError):
+                        data = b""
+                    self.receive(data, time.monotonic())
+                now = time.monotonic()
+                self.advance(now)
+                self._send_due(now)
+        finally:
+            self.close()
+
+    def receive(self, data, now):
+        """
+        Put bytes the host wrote on the serial line.
+
+        Args:
+            data (bytes): Bytes as written by the host
+            now (Float): Monotonic time they were written
+        """
+        if self._clock is None:
+            self._start(now)
+        byte_time = self.byte_time
+        free = max(now, self._wire_free)
+        self.max_line_delay = max(self.max_line_delay, free - now)
+        for byte in data:
+            free += byte_time
+            self._wire.append((free, now, byte))
+        self._wire_free = free
+        self.bytes_received += len(data)
+
+    def advance(self, until):
+        """
+        Run the sketch's loop passes that start up to the given time.
+
+        Args:
+            until (Float): Monotonic time to run to
+        """
+        if self._clock is None:
+            self._start(until)
+        costs = self.costs
+        wire, rx = self._wire, self._rx
+        while self._clock <= until:
+            now = self._clock
+            # bytes that finished arriving since the last pass
+            while wire and wire[0][0] <= now:
+                _, written, byte = wire.popleft()
+                if len(rx) < RX_BUFFER_SIZE:
+                    rx.append((written, byte))
+                else:
+                    self.overruns += 1
+
+            telemetry_at = self._last_telemetry + TELEMETRY_INTERVAL
+            if not rx and now < telemetry_at:
+                # nothing to do before the next byte or telemetry, count the idle
+                # passes in between at once
+                idle_until = min(wire[0][0] if wire else until, telemetry_at, until)
+                passes = max(1, math.ceil((idle_until - now) / costs["loop"]))
+                self.loop_count += passes
+                self._clock = now + passes * costs["loop"]
+                continue
+
+            # the sketch reads until its frame buffer is full, then parses
+            count = min(len(rx), FRAME_BUFFER_SIZE - self.decoder.pending)
+            data = [rx.popleft() for _ in range(count)]
+            cost = costs["loop"] + count * costs["read_byte"]
+            cost += self._handle_bytes(data, now + cost)
+            if now + cost >= telemetry_at:
+                sent_at = now + cost
+                cost += self._send_telemetry(sent_at)
+            self.loop_count += 1
+            self._clock = now + cost
+
+    def _start(self, now):
+        self.start_time = now
+        self._clock = now
+        self._last_telemetry = now
+
+    def _handle_bytes(self, data, now):
+        """
+        parseFrames() and handleFrame(): parse bytes as they are read and apply every
+        frame they complete, returns the seconds it took. The parsing, sequence checks
+        and delta decoding are the host's FrameDecoder and DeltaDecoder, only their cost
+        is modelled here.
+        """
+        costs = self.costs
+        cost = 0.0
+        for written, byte in data:
+            rejected = self.decoder.rejected
+            for frame_type, sequence, payload in self.decoder.feed(bytes((byte,))):
+                cost += costs["crc_byte"] * (HEADER_SIZE - 2 + len(payload))
+                mask = self.actuator_state.apply(frame_type, sequence, payload)
+                if mask:
+                    cost += self._fields_cost(mask)
+                    self.commands += 1
+                    with self._lock:
+                        # every byte of a frame is written at once, so this byte's
+                        # write time is the frame's
+                        self._latencies.append(now + cost - written)
+            # a frame failing its CRC was checked in full first, about a packet's worth
+            cost += (self.decoder.rejected - rejected) * costs["crc_byte"] * PACKET_SIZE
+        return cost
+
+    def _fields_cost(self, mask):
+        """applyFields(): seconds to write the fields in mask to the hardware."""
+        costs = self.costs
+        cost = 0.0
+        if mask & 1:
+            cost += costs["motors"]
+        if mask & 2:
+            cost += 2 * costs["servo"]  # both ears
+        if mask & 4:
+            cost += costs["servo"]
+        if mask & 8:
+            cost += costs["brightness"]
+        return cost + bin(mask >> 4).count("1") * costs["eye_row"]
+
+    def _send_telemetry(self, now):
+        """sendTelemetry(): queue a frame unless the transmit buffer is too full."""
+        size = HEADER_SIZE + TELEMETRY.size + CRC_SIZE
+        queued = max(0, math.ceil((self._tx_free - now) / self.byte_time))
+        if TX_BUFFER_SIZE - queued < size:
+            self.telemetry_skipped += 1
+            return 0.0
+
+        flags = (
+            (BUTTON_PRESSED if self.button_down else 0)
+            | (BUTTON_LATCHED if self.button_latched else 0)
+            | (0 if self.actuators_synced else NEEDS_KEYFRAME)
+        )
+        self.button_latched = False
+        payload = TELEMETRY.pack(
+            flags,
+            self.encoder_right,
+            self.encoder_left,
+            self.loop_count & 0xFFFFFFFF,
+            self.frames_received & 0xFFFFFFFF,
+            self.frames_rejected & 0xFFFF,
+            self.frames_lost & 0xFFFF,
+        )
+        self._tx_free = max(now, self._tx_free) + size * self.byte_time
+        self._tx.append((self._tx_free, self._telemetry.encode(FRAME_TELEMETRY, payload)))
+        self._last_telemetry = now
+        self.telemetry_sent += 1
+        return self.costs["crc_byte"] * (HEADER_SIZE - 2 + TELEMETRY.size)
+
+    @property
+    def actuators(self):
+        """The sketch's actuators[], rebuilt from keyframes and deltas."""
+        return self.actuator_state.packet
+
+    @property
+    def actuators_synced(self):
+        """actuatorsSynced: whether actuators matches the host's packet."""
+        return self.actuator_state.synced
+
+    @property
+    def frames_received(self):
+        """framesReceived: frames accepted."""
+        return self.decoder.frames
+
+    @property
+    def frames_rejected(self):
+        """framesRejected: framing and CRC errors, and deltas not matching their mask."""
+        return self.decoder.rejected + self.actuator_state.rejected
+
+    @property
+    def frames_out_of_order(self):
+        """framesOutOfOrder: stale or repeated frames ignored."""
+        return self.decoder.out_of_order
+
+    @property
+    def frames_lost(self):
+        """framesLost: frames missing from gaps in the sequence numbers."""
+        return self.decoder.lost
+
+    def sent(self, now):
+        """
+        Take the telemetry frames whose last byte has left the line by now, for a caller
+        running the emulator on its own clock instead of the pty.
+
+        Args:
+            now (Float): Time on the emulator's clock
+
+        Returns:
+            list<bytes>: Frames sent, oldest first
+        """
+        frames = []
+        while self._tx and self._tx[0][0] <= now:
+            frames.append(self._tx.popleft()[1])
+        return frames
+
+    def _send_due(self, now):
+        """Write the telemetry frames whose last byte has left the line by now."""
+        for frame in self.sent(now):
+            try:
+                os.write(self._master, frame)
+            except (BlockingIOError, OSError):
+                self.telemetry_dropped += 1
+
+    def press_button(self):
+        """Latch a press for the next telemetry frame, like the button's interrupt."""
+        self.button_latched = True
+
+    def state(self):
+        """
+        Returns:
+            dict: Actuator values as the sketch decodes them from its packet
+        """
+        packet = self.actuators
+        return {
+            "left_speed": (packet[0] - 128) * 2,
+            "right_speed": (packet[1] - 128) * 2,
+            "ear": packet[2],
+            "tail": packet[3],
+            "brightness": packet[4],
+            "left_eye": bytes(packet[5:13]),
+            "right_eye": bytes(packet[13:21]),
+            "synced": self.actuators_synced,
+        }
+
+    def stats(self):
+        """
+        Returns:
+            dict: Seconds emulated, bytes and frames received, packets applied per
+                second, the sketch's link counters, overruns, line delay, telemetry
+                counters and the mean, 99th percentile and max command latency
+        """
+        elapsed = 0.0 if self._clock is None else self._clock - self.start_time
+        with self._lock:
+            latencies = np.array(self._latencies)
+        if len(latencies) == 0:
+            latencies = np.array([np.nan])
+        return {
+            "elapsed": elapsed,
+            "bytes_received": self.bytes_received,
+            "frames_received": self.frames_received,
+            "commands": self.commands,
+            "packet_rate": self.commands / elapsed if elapsed > 0 else 0.0,
+            "frames_rejected": self.frames_rejected,
+            "frames_out_of_order": self.frames_out_of_order,
+            "frames_lost": self.frames_lost,
+            "overruns": self.overruns,
+            "max_line_delay": self.max_line_delay,
+            "loops": self.loop_count,
+            "telemetry_sent": self.telemetry_sent,
+            "telemetry_skipped": self.telemetry_skipped,
+            "telemetry_dropped": self.telemetry_dropped,
+            "mean_latency": float(np.mean(latencies)),
+            "p99_latency": float(np.percentile(latencies, 99)),
+            "max_latency": float(np.max(latencies)),
+        }
+
+    def stop(self):
+        """Stop the emulator, it closes the pty and removes the link on its way out."""
+        self._running = False
+
+    def close(self):
+        """Close the pty and remove the link, for an emulator that was never started."""
+        if self._master is None:
+            return
+        os.close(self._master)
+        os.close(self._slave)
+        self._master = self._slave = None
+        if self.link is not None and os.path.islink(self.link):
+            os.remove(self.link)
+
+
+def print_link_report(stats):
+    print("\n============== EMULATED ARDUINO ==============")
+    print(f"Emulated:         {stats['elapsed']:.1f} s")
+    print(f"Bytes received:   {stats['bytes_received']}")
+    print(f"Packets applied:  {stats['commands']} ({stats['packet_rate']:.1f} per s)")
+    print(f"Frames received:  {stats['frames_received']}")
+    print(f"Frames rejected:  {stats['frames_rejected']}")
+    print(f"Frames lost:      {stats['frames_lost']}")
+    print(f"Out of order:     {stats['frames_out_of_order']}")
+    print(f"RX overruns:      {stats['overruns']} bytes")
+    print(f"Max line delay:   {stats['max_line_delay'] * 1000:.1f} ms")
+    print(f"Mean latency:     {stats['mean_latency'] * 1000:.1f} ms")
+    print(f"99% latency:      {stats['p99_latency'] * 1000:.1f} ms")
+    print(f"Max latency:      {stats['max_latency'] * 1000:.1f} ms")
+    print(f"Loop passes:      {stats['loops']}")
+    print(f"Telemetry sent:   {stats['telemetry_sent']}")
+    print("=============================================")
+
+
+if __name__ == "__main__":
+    baud = int(sys.argv[1]) if len(sys.argv) > 1 else 115200
+    link = sys.argv[2] if len(sys.argv) > 2 else None
+    emulator = ArduinoEmulator(baud, link)
+    emulator.start()
+    print(f"Emulating the Arduino at {baud} baud on {link or emulator.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print_link_report(emulator.stats())
+    except KeyboardInterrupt:
+        emulator.stop()
+        emulator.join()
+        print_link_report(emulator.stats())
@@ -0,0 +1,106 @@
+"""
+Actuator link against the emulated Arduino, exact on its clock, then packet rate and
+latency in real time through its pty.
+"""
+
+import time
+import numpy as np
+import serial
+from robot.benchmarks.delta_packets import behavior_packets
+from robot.benchmarks.arduino_emulator import ArduinoEmulator
+from robot.software.packet_protocol import DeltaEncoder, FrameDecoder
+from robot.software.scheduling import TickScheduler
+from robot.software.telemetry import NEEDS_KEYFRAME, TELEMETRY, TelemetryReader
+
+CHECK_RATE = 50  # Hz
+CORRUPTION = 0.01
+BAUD = 115200
+RATES = (50, 100, 200, 400)  # Hz
+SECONDS = 3  # of real time per rate and encoding
+START = 14  # seconds into the behaviors, where chase_tail moves motors and eyes
+
+
+def replay(packets, rate, keyframe_interval, corruption, rng):
+    """
+    Send packets on the emulator's clock, resending a lost delta base early on its
+    telemetry. Returns the emulator and the ticks its actuators didn't match the packet
+    just sent.
+    """
+    emulator = ArduinoEmulator(BAUD)
+    emulator.close()  # only its clock is used
+    encoder = DeltaEncoder(keyframe_interval)
+    telemetry = FrameDecoder()
+    wrong = 0
+    now = 0.0
+    for packet in packets:
+        # like main.py, resend everything once telemetry says a delta's base was lost
+        for frame in emulator.sent(now):
+            for _, _, payload in telemetry.feed(frame):
+                if TELEMETRY.unpack(payload)[0] & NEEDS_KEYFRAME:
+                    encoder.request_keyframe()
+        frame = bytearray(encoder.encode(packet))
+        if frame and rng.random() < corruption:
+            frame[rng.integers(len(frame))] ^= 1 << int(rng.integers(8))
+        emulator.receive(frame, now)
+        now += 1 / rate
+        emulator.advance(now - 1e-9)  # just before the next tick
+        wrong += emulator.actuators != packet
+    return emulator, wrong
+
+
+def link(packets, rate, keyframe_interval):
+    """Send packets through the pty in real time, returns the emulator's and host's stats."""
+    emulator = ArduinoEmulator(BAUD)
+    emulator.start()
+    port = serial.Serial(emulator.port, BAUD, timeout=0.1)
+    telemetry = TelemetryReader(port)
+    telemetry.start()
+    encoder = DeltaEncoder(keyframe_interval)
+    scheduler = TickScheduler(rate)
+    scheduler.start()
+    requested = 0.0
+    for packet in packets[START * rate : (START + SECONDS) * rate]:
+        scheduler.wait()
+        latest = telemetry.latest
+        # like main.py, resend everything when a delta's base was lost
+        if latest is not None and latest["needs_keyframe"] and latest["time"] > requested:
+            encoder.request_keyframe()
+            requested = time.monotonic()
+        port.write(encoder.encode(packet))
+    time.sleep(0.2)  # the line and the sketch catch up
+    telemetry.stop()
+    telemetry.join()
+    emulator.stop()
+    emulator.join()
+    port.close()
+    return emulator.stats(), telemetry
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    packets = behavior_packets(CHECK_RATE)
+    print(f"Protocol check, {len(packets)} behavior packets at {CHECK_RATE} Hz")
+    for name, interval in (("full", 1), ("delta", CHECK_RATE)):
+        _, wrong = replay(packets, CHECK_RATE, interval, 0.0, rng)
+        print(f"{name:>6}: {'exact' if wrong == 0 else f'{wrong} ticks WRONG'}")
+        emulator, wrong = replay(packets, CHECK_RATE, interval, CORRUPTION, rng)
+        print(
+            f"{'':>6}  {CORRUPTION:.0%} corrupted: {emulator.frames_rejected} rejected, "
+            f"{emulator.frames_lost} lost, {wrong} wrong ticks"
+        )
+
+    print(f"\nReal time through the pty at {BAUD} baud, {SECONDS} s of chase_tail each")
+    print(
+        f"{'rate':>5}{'frames':>8}{'applied/s':>11}{'overruns':>10}{'lost':>6}"
+        f"{'mean ms':>9}{'p99 ms':>8}{'max ms':>8}{'telemetry':>11}"
+    )
+    for rate in RATES:
+        packets = behavior_packets(rate)
+        for name, interval in (("full", 1), ("delta", rate)):
+            stats, telemetry = link(packets, rate, interval)
+            print(
+                f"{rate:>5}{name:>8}{stats['packet_rate']:>11.1f}{stats['overruns']:>10}"
+                f"{stats['frames_lost']:>6}{stats['mean_latency'] * 1000:>9.2f}"
+                f"{stats['p99_latency'] * 1000:>8.2f}{stats['max_latency'] * 1000:>8.2f}"
+                f"{telemetry.stats()['frames']:>11}"
+            )
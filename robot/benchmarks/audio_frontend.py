@@ -0,0 +1,65 @@
+"""
+Melody analysis cost at the capture rate against decimating first, and the Decimator's
+aliasing.
+"""
+
+import time
+import numpy as np
+import librosa
+from robot.software.audio_frontend import Decimator
+from robot.software.audio_processing import CollectAudio, NoteSegmenter, StreamingPitch
+from robot.software.melody_matcher import MelodyMatcher
+from robot.benchmarks.media import wav_files
+
+RATES = (CollectAudio.RATE, 11025, 8000)
+CHUNK = 1024  # samples per audio callback
+
+
+def stream(y, rate, backend):
+    """Decimate callback sized chunks to rate, then find notes the way CollectAudio does."""
+    frontend = Decimator(CollectAudio.RATE, rate) if rate != CollectAudio.RATE else None
+    pitch = StreamingPitch(rate, backend=backend, notes=CollectAudio.MELODY_MIDI)
+    segmenter = NoteSegmenter(min_instances=2)
+    matcher = MelodyMatcher()
+    matcher.add(CollectAudio.TREAT_MELODY, CollectAudio.MELODY_MIDI)
+    analysis_chunk = rate // 4  # MelodyListener hop
+    pending = []
+    heard = []
+
+    start = time.perf_counter()
+    for i in range(0, len(y), CHUNK):
+        samples = y[i : i + CHUNK]
+        pending.append(samples if frontend is None else frontend.process(samples))
+        if sum(len(part) for part in pending) >= analysis_chunk:
+            notes = segmenter.process(pitch.process(np.concatenate(pending)))
+            heard += matcher.feed_many(notes)
+            pending = []
+    elapsed = time.perf_counter() - start
+    return elapsed / (len(y) / CollectAudio.RATE), CollectAudio.TREAT_MELODY in heard
+
+
+def leakage(rate, frequency, seconds=1.0):
+    """Level in dB of a full scale tone after decimation."""
+    t = np.arange(int(seconds * CollectAudio.RATE)) / CollectAudio.RATE
+    tone = np.sin(2 * np.pi * frequency * t).astype(np.float32)
+    out = Decimator(CollectAudio.RATE, rate).process(tone)[rate // 10 :]
+    return 20 * np.log10(np.sqrt(np.mean(out**2) / 0.5) + 1e-12)
+
+
+if __name__ == "__main__":
+    for backend in ("yin", "goertzel"):
+        print(f"\n{backend}: CPU seconds per audio second, melody found")
+        print(f"{'file':<24}" + "".join(f"{rate:>14}" for rate in RATES))
+        for name, path in wav_files():
+            y, _ = librosa.load(path, sr=CollectAudio.RATE)
+            row = f"{name:<24}"
+            for rate in RATES:
+                cost, found = stream(y, rate, backend)
+                row += f"{cost:>9.4f} {'yes' if found else 'no':>4}"
+            print(row)
+
+    print("\ntone level after decimation, dB")
+    frequencies = (440, 1000, 3000, 5000, 7000, 12000)
+    print(f"{'rate':<8}" + "".join(f"{f:>8}" for f in frequencies))
+    for rate in RATES[1:]:
+        print(f"{rate:<8}" + "".join(f"{leakage(rate, f):>8.1f}" for f in frequencies))
@@ -0,0 +1,103 @@
+"""
+Melody detection against SNR, one microphone against the Beamformer's three.
+"""
+
+import os
+import time
+import numpy as np
+import librosa
+from robot.benchmarks.localization import simulate
+from robot.software.activity_detection import ActivityGate
+from robot.software.audio_processing import CollectAudio, NoteSegmenter, StreamingPitch
+from robot.software.beamforming import Beamformer
+from robot.software.melody_matcher import MelodyMatcher
+from robot.software.serial_audio import SAMPLE_RATE
+from robot.benchmarks.media import MEDIA_DIR
+
+SOURCE = "beastling_sing.wav"
+ROOM = ("mic2_output.wav", "mic3_output.wav")  # mic1's recording is stuck near full scale
+BEARINGS = range(-150, 180, 60)
+SNRS = (20, 15, 10, 5, 0)  # dB, per microphone
+CHUNK = SAMPLE_RATE // 4  # MelodyListener hop
+
+
+def detect(y):
+    """Whether the treat melody is found in y, streamed like CollectAudio.analyze()."""
+    gate = ActivityGate(SAMPLE_RATE)
+    pitch = StreamingPitch(SAMPLE_RATE, notes=CollectAudio.MELODY_MIDI)
+    segmenter = NoteSegmenter(min_instances=2)
+    matcher = MelodyMatcher()
+    matcher.add(CollectAudio.TREAT_MELODY, CollectAudio.MELODY_MIDI)
+    heard = []
+    for i in range(0, len(y), CHUNK):
+        samples = y[i : i + CHUNK]
+        if gate.process(samples):
+            notes = segmenter.process(pitch.process(samples))
+        else:
+            pitch.skip(samples)
+            notes = segmenter.flush()
+        heard += matcher.feed_many(notes)
+    heard += matcher.feed_many(segmenter.flush())
+    return CollectAudio.TREAT_MELODY in heard
+
+
+def room_noise(length, rng):
+    """(3, length) stretches of the array's room recordings, unit RMS per microphone."""
+    recordings = []
+    for name in ROOM:
+        y, _ = librosa.load(os.path.join(MEDIA_DIR, name), sr=SAMPLE_RATE)
+        recordings.append(y - y.mean())
+    noise = []
+    for i in range(3):
+        y = recordings[i % len(recordings)]
+        y = np.roll(y, rng.integers(len(y)))
+        y = np.tile(y, length // len(y) + 1)[:length]
+        noise.append(y / np.sqrt(np.mean(y**2)))
+    return np.array(noise)
+
+
+def trial(source, bearing, snr, noise, rng):
+    """Detection by the front microphone alone and by the beamformer."""
+    clean = simulate(source, bearing, np.inf, rng)
+    if noise == "sensor":
+        channels = simulate(source, bearing, snr, rng)
+    else:
+        level = np.sqrt(np.mean(clean**2)) * 10 ** (-snr / 20)
+        channels = clean + room_noise(clean.shape[1], rng) * level
+    channels = channels.astype(np.float32)
+
+    beamformer = Beamformer(SAMPLE_RATE)
+    start = time.perf_counter()
+    steered = np.concatenate(
+        [
+            beamformer.process(channels[:, i : i + CHUNK])
+            for i in range(0, len(source), CHUNK)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    return detect(channels[0]), detect(steered), elapsed
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    source, _ = librosa.load(os.path.join(MEDIA_DIR, SOURCE), sr=SAMPLE_RATE)
+    seconds = len(source) / SAMPLE_RATE
+
+    print(f"{SOURCE} at {SAMPLE_RATE} Hz from {len(BEARINGS)} bearings")
+    print(f"{'noise':<8}{'SNR dB':>7}{'one mic':>9}{'beamformed':>12}")
+    elapsed, runs = 0.0, 0
+    for noise in ("sensor", "room"):
+        for snr in SNRS:
+            single, steered = 0, 0
+            for bearing in BEARINGS:
+                one, both, cost = trial(source, bearing, snr, noise, rng)
+                single += one
+                steered += both
+                elapsed += cost
+                runs += 1
+            print(
+                f"{noise:<8}{snr:>7}{single / len(BEARINGS):>9.0%}"
+                f"{steered / len(BEARINGS):>12.0%}"
+            )
+    cost = elapsed / (runs * seconds)
+    print(f"\nBeamformer CPU seconds per audio second: {cost:.4f}")
@@ -0,0 +1,187 @@
+"""
+Per-tick cost of berry detection and the darkness check, the original separate passes
+against the shared analysis at full and reduced resolution and with a ROI, on a
+recording from the robot's camera (RECORDING by default, synthetic frames without one):
+    python -m robot.benchmarks.berry_detection [--record] [recording.avi]
+    python -m robot.benchmarks.berry_detection --synthetic
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import cv2 as cv
+from robot.benchmarks.media import MEDIA_DIR
+from robot.software.berry_detection import BerryDetection
+from robot.software.color_segmentation import COLOR_TARGETS, ColorTarget
+
+RECORDING = os.path.join(MEDIA_DIR, "berry_test.avi")
+
+# extra treat colours, to see what tracking several targets costs
+EXTRA_TARGETS = (
+    ColorTarget("blue", (((100, 80, 40), (130, 255, 255)),)),
+    ColorTarget("green", (((40, 80, 40), (80, 255, 255)),)),
+)
+
+
+class RecordedFrames:
+    """Stands in for CameraCapture, serving a list of frames one by one."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = -1
+
+    def next(self):
+        self.index += 1
+
+    def latest(self):
+        return self.frames[self.index], float(self.index), self.index + 1
+
+
+def load_frames(path, limit=300):
+    cap = cv.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def record_frames(path, count=300, device=0):
+    """Save count frames from the camera, e.g. with the berry moved around in front of it."""
+    cap = cv.VideoCapture(device)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open camera {device}")
+    writer = None
+    for _ in range(count):
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if writer is None:
+            fourcc = cv.VideoWriter_fourcc(*"MJPG")
+            size = (frame.shape[1], frame.shape[0])
+            writer = cv.VideoWriter(path, fourcc, 30, size)
+        writer.write(frame)
+    cap.release()
+    if writer is not None:
+        writer.release()
+
+
+def synthetic_frames(count=300, width=640, height=480):
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 200, (height, width, 3), dtype=np.uint8)
+    background = cv.GaussianBlur(background, (9, 9), 0)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int(width / 2 + width / 3 * np.sin(i / 30))
+        y = int(height / 2 + height / 4 * np.cos(i / 45))
+        cv.circle(frame, (x, y), 25, (30, 25, 115), -1)
+        frames.append(frame)
+    return frames
+
+
+def original_tick(frame):
+    """
+    get_berry_position() and get_darkness() as they were before the shared frame
+    analysis, each converting the whole frame to HSV on every tick.
+    """
+    hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
+    _, _, v = cv.split(hsv_frame)
+    np.mean(v) < 100
+    return original_berry_position(frame)
+
+
+def original_berry_position(frame):
+    """get_berry_position() as it was before the shared frame analysis."""
+    frame = cv.rotate(frame, cv.ROTATE_90_COUNTERCLOCKWISE)
+    hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
+    binary_image_1 = cv.inRange(hsv_frame, (0, 60, 60), (10, 255, 130))
+    binary_image_2 = cv.inRange(hsv_frame, (170, 60, 60), (180, 255, 130))
+    binary_image = binary_image_1 + binary_image_2
+    moments = cv.moments(binary_image)
+    if moments["m00"] != 0:
+        return (moments["m10"] / moments["m00"], moments["m01"] / moments["m00"])
+    return None
+
+
+def run(frames, detect):
+    positions = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # get_darkness() prints its value
+        for frame in frames:
+            positions.append(detect(frame))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(frames), positions
+
+
+def error(positions, reference):
+    errors = [
+        np.hypot(p[0] - r[0], p[1] - r[1])
+        for p, r in zip(positions, reference)
+        if p is not None and r is not None
+    ]
+    misses = sum((p is None) != (r is None) for p, r in zip(positions, reference))
+    return (max(errors) if errors else 0.0), misses
+
+
+def detection_mode(frames, **options):
+    camera = RecordedFrames(frames)
+    detection = BerryDetection(camera, **options)
+
+    def detect(_):
+        camera.next()
+        detection.get_darkness()
+        return detection.get_berry_position()
+
+    return detect
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--synthetic"]:
+        frames = synthetic_frames()
+        print(f"{len(frames)} synthetic frames")
+    else:
+        if args[:1] == ["--record"]:
+            args = args[1:]
+            record_frames(args[0] if args else RECORDING)
+        path = args[0] if args else RECORDING
+        frames = load_frames(path) if os.path.exists(path) else []
+        if frames:
+            print(f"{len(frames)} frames from {path}")
+        elif args:
+            sys.exit(f"No frames in {path}")
+        else:
+            frames = synthetic_frames()
+            print(f"No recording at {path}, record one with --record")
+            print(f"{len(frames)} synthetic frames instead")
+
+    base_time, reference = run(frames, original_tick)
+    modes = {
+        "full resolution": dict(pyramid_levels=0, track=False),
+        "1 pyramid level": dict(pyramid_levels=1, track=False),
+        "2 pyramid levels": dict(pyramid_levels=2, track=False),
+        "1 level + ROI": dict(pyramid_levels=1, track=True),
+        "2 levels + ROI": dict(pyramid_levels=2, track=True),
+        "1 level, LUT": dict(pyramid_levels=1, track=False, targets=COLOR_TARGETS),
+        "1 level, LUT x3": dict(
+            pyramid_levels=1, track=False, targets=COLOR_TARGETS + EXTRA_TARGETS
+        ),
+        "1 level + ROI, LUT": dict(pyramid_levels=1, track=True, targets=COLOR_TARGETS),
+    }
+
+    print(f"{'mode':<18}{'ms/frame':>10}{'speedup':>10}{'max err px':>12}{'misses':>8}")
+    print(f"{'original':<18}{base_time * 1000:>10.2f}{1:>10.1f}{0:>12.1f}{0:>8}")
+    for name, options in modes.items():
+        per_frame, positions = run(frames, detection_mode(frames, **options))
+        max_error, misses = error(positions, reference)
+        print(
+            f"{name:<18}{per_frame * 1000:>10.2f}{base_time / per_frame:>10.1f}"
+            f"{max_error:>12.1f}{misses:>8}"
+        )
@@ -0,0 +1,107 @@
+"""
+Serial bytes per second of full against delta frames for the behaviors' packets.
+"""
+
+import contextlib
+import io
+from types import SimpleNamespace
+import numpy as np
+from robot.software.behaviors import RobotBehaviors
+from robot.software.packet_protocol import (
+    FRAME_ACTUATORS,
+    DeltaDecoder,
+    DeltaEncoder,
+    FrameDecoder,
+    FrameEncoder,
+)
+
+RATES = (50, 200)  # Hz
+# behaviors in the order they are run, with seconds each, like StateManager's durations
+SCRIPT = (
+    ("default", 5),
+    ("wag_tail", 3),
+    ("blink", 6),
+    ("chase_tail", 10),
+    ("look_around", 12),
+    ("run_petted", 3),
+    ("run_look_for_treat", 20),
+    ("run_sleep", 5),
+)
+LOSS = 0.01
+TELEMETRY_INTERVAL = 0.02  # seconds, how often the sketch reports needing a keyframe
+
+
+def run_behaviors(rate):
+    """Every tick of SCRIPT without a StateManager or hardware, yields RobotBehaviors."""
+    manager = SimpleNamespace(
+        state="default",
+        berry_detection=SimpleNamespace(get_berry_position=lambda: None),
+        eye_state="happy",
+        now=0.0,
+        idle_start=0.0,
+        look_for_treat_start=0.0,
+    )
+    fox = RobotBehaviors(manager)
+    now = 0.0
+    for state, seconds in SCRIPT:
+        manager.state = state
+        manager.idle_start = manager.look_for_treat_start = now
+        for _ in range(int(seconds * rate)):
+            manager.now = now
+            fox.update_behavior()
+            with contextlib.redirect_stdout(io.StringIO()):  # chase_tail prints frames
+                fox.behavior()
+            yield fox
+            now += 1 / rate
+
+
+def behavior_packets(rate):
+    """Actuator packets of every tick of SCRIPT."""
+    return [bytes(fox.build_packet()) for fox in run_behaviors(rate)]
+
+
+def replay(packets, keyframe_interval, loss, rng, rate=None):
+    """
+    Encode, lose some frames, decode. Returns bytes sent and ticks with a wrong state.
+    Given the rate, the decoder's state is reported back every TELEMETRY_INTERVAL like
+    the sketch's telemetry, and a lost base is resent early like main.py does.
+    """
+    encoder = DeltaEncoder(keyframe_interval)
+    frames = FrameDecoder()
+    decoder = DeltaDecoder()
+    report = None if rate is None else max(1, round(rate * TELEMETRY_INTERVAL))
+    wrong = 0
+    for tick, packet in enumerate(packets):
+        if report is not None and tick % report == 0 and not decoder.synced:
+            encoder.request_keyframe()
+        frame = encoder.encode(packet)
+        if frame and rng.random() >= loss:
+            for frame_type, sequence, payload in frames.feed(frame):
+                decoder.apply(frame_type, sequence, payload)
+        wrong += decoder.packet != packet
+    return encoder.bytes_sent, wrong
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    seconds = sum(duration for _, duration in SCRIPT)
+    full_frame = len(FrameEncoder().encode(FRAME_ACTUATORS, bytes(21)))
+
+    print(f"{seconds} s of behaviors, every packet sent in full is {full_frame} bytes")
+    print(
+        f"{'rate':>5}{'full B/s':>10}{'delta B/s':>11}{'saved':>8}"
+        f"{'exact':>7}{'wrong ticks at ' + format(LOSS, '.0%') + ' loss':>43}"
+    )
+    for rate in RATES:
+        packets = behavior_packets(rate)
+        full, _ = replay(packets, 1, 0.0, rng)
+        # a keyframe every second at either rate
+        delta, wrong = replay(packets, rate, 0.0, rng)
+        _, lossy_full = replay(packets, 1, LOSS, rng)
+        _, lossy_delta = replay(packets, rate, LOSS, rng)
+        _, resent = replay(packets, rate, LOSS, rng, rate)
+        lossy = f"{lossy_full} full, {lossy_delta} delta, {resent} with early resend"
+        print(
+            f"{rate:>5}{full / seconds:>10.0f}{delta / seconds:>11.0f}"
+            f"{1 - delta / full:>8.0%}{'yes' if wrong == 0 else 'NO':>7}{lossy:>43}"
+        )
@@ -0,0 +1,67 @@
+"""
+Three audio consumers transforming the stream separately against sharing a FeatureBus.
+"""
+
+import time
+import numpy as np
+import librosa
+from robot.software.audio_processing import CollectAudio
+from robot.software.feature_bus import FeatureBus
+from robot.software.pitch_tracking import GoertzelBank, frame_signal
+from robot.benchmarks.media import wav_files
+
+SR = CollectAudio.ANALYSIS_RATE
+FRAME_LENGTH = 1024
+HOP_LENGTH = 256
+CHUNK = SR // 4  # MelodyListener hop
+SECONDS = 30
+
+
+def separate(y):
+    """Every consumer frames and transforms the audio itself."""
+    bank = GoertzelBank(SR, CollectAudio.MELODY_MIDI, FRAME_LENGTH)
+    window = np.hanning(FRAME_LENGTH + 1)[:-1]
+    mel_basis = librosa.filters.mel(sr=SR, n_fft=FRAME_LENGTH, n_mels=40)
+    pending = np.zeros(0, dtype=np.float32)
+    start = time.perf_counter()
+    for i in range(0, len(y), CHUNK):
+        pending = np.concatenate([pending, y[i : i + CHUNK]])
+        frames = frame_signal(pending, FRAME_LENGTH, HOP_LENGTH)
+        pending = pending[len(frames) * HOP_LENGTH :]
+        if len(frames) == 0:
+            continue
+        bank.detect(frames)
+        for n_mfcc in (None, 13):
+            S = np.abs(np.fft.rfft(frames * window)) ** 2
+            mel = S @ mel_basis.T
+            if n_mfcc is not None:
+                librosa.feature.mfcc(S=librosa.power_to_db(mel.T), n_mfcc=n_mfcc)
+    return time.perf_counter() - start
+
+
+def shared(y):
+    """Every consumer subscribes to the feature it needs."""
+    bank = GoertzelBank(SR, CollectAudio.MELODY_MIDI, FRAME_LENGTH)
+    bus = FeatureBus(SR, FRAME_LENGTH, HOP_LENGTH)
+    spectrum = bus.subscribe("spectrum")
+    mel = bus.subscribe("mel")
+    mfcc = bus.subscribe("mfcc")
+    bank.detect_spectrum(np.zeros((1, FRAME_LENGTH // 2 + 1), dtype=np.complex64))
+    start = time.perf_counter()
+    for i in range(0, len(y), CHUNK):
+        bus.process(y[i : i + CHUNK])
+        bank.detect_spectrum(spectrum.read())
+        mel.read()
+        mfcc.read()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"CPU seconds per audio second at {SR} Hz")
+    print(f"{'file':<24}{'separate':>10}{'bus':>10}{'speedup':>9}")
+    for name, path in wav_files():
+        y, _ = librosa.load(path, sr=SR)
+        y = np.tile(y, int(np.ceil(SECONDS * SR / len(y))))  # long enough to time
+        seconds = len(y) / SR
+        alone, together = separate(y) / seconds, shared(y) / seconds
+        print(f"{name:<24}{alone:>10.4f}{together:>10.4f}{alone / together:>9.1f}")
@@ -0,0 +1,14 @@
+"""
+Recordings in robot/media that the audio benchmarks run on.
+"""
+
+import os
+
+MEDIA_DIR = os.path.join(os.path.dirname(__file__), "..", "media")
+
+
+def wav_files():
+    """Name and path of every WAV file in robot/media, in name order."""
+    for name in sorted(os.listdir(MEDIA_DIR)):
+        if name.endswith(".wav"):
+            yield name, os.path.join(MEDIA_DIR, name)
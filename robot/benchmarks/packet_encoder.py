@@ -0,0 +1,94 @@
+"""
+RobotBehaviors.build_packet checked byte for byte against struct.pack, and timed.
+"""
+
+import struct
+import timeit
+from types import SimpleNamespace
+import numpy as np
+from robot.benchmarks.delta_packets import run_behaviors
+from robot.software.behaviors import RobotBehaviors
+from robot.software.eye_display import EyeDisplay
+
+RANDOM_PACKETS = 10000
+CALLS = 200000
+
+
+def old_build_packet(fox):
+    """build_packet before the precompiled encoder, eye rows are unpacked one by one."""
+    return struct.pack(
+        "<BBBBB8B8B",
+        int(fox.left_speed + 127),
+        int(fox.right_speed + 127),
+        int(fox.ear),
+        int(fox.tail),
+        fox.eye_brightness,
+        *fox.left_eye.current_state,
+        *fox.right_eye.current_state,
+    )
+
+
+def old_eye_to_bytes(eye_list):
+    """EyeDisplay.eye_to_bytes before the rows became bytes."""
+    return [int("".join(str(bit) for bit in line), 2) for line in eye_list]
+
+
+def eyes_identical():
+    """Eye patterns compared and how many convert differently."""
+    eye = EyeDisplay()
+    patterns = [
+        value
+        for value in vars(EyeDisplay).values()
+        if isinstance(value, list) and len(value) == 8
+    ]
+    patterns += [eye.eye_with_position((x, y)) for x in range(4) for y in range(4)]
+    different = sum(
+        list(eye.eye_to_bytes(pattern)) != old_eye_to_bytes(pattern)
+        for pattern in patterns
+    )
+    return len(patterns), different
+
+
+def make_fox():
+    manager = SimpleNamespace(state="default", berry_detection=None)
+    return RobotBehaviors(manager)
+
+
+def identical(rng):
+    """Packets compared and how many differ, from behaviors and from random values."""
+    checked, different = 0, 0
+    for fox in run_behaviors(50):
+        checked += 1
+        different += bytes(fox.build_packet()) != old_build_packet(fox)
+
+    fox = make_fox()
+    for _ in range(RANDOM_PACKETS):
+        fox.left_speed = int(rng.integers(-127, 129))
+        fox.right_speed = int(rng.integers(-127, 129))
+        fox.ear = int(rng.integers(0, 181))
+        fox.tail = int(rng.integers(0, 121))
+        fox.eye_brightness = int(rng.integers(0, 2))
+        fox.left_eye.current_state = rng.integers(0, 256, 8, dtype=np.uint8).tobytes()
+        fox.right_eye.current_state = rng.integers(0, 256, 8, dtype=np.uint8).tobytes()
+        checked += 1
+        different += bytes(fox.build_packet()) != old_build_packet(fox)
+    return checked, different
+
+
+if __name__ == "__main__":
+    checked, different = identical(np.random.default_rng(0))
+    print(f"{checked} packets compared with struct.pack, {different} differ")
+    checked, different = eyes_identical()
+    print(f"{checked} eye patterns compared with the old conversion, {different} differ")
+
+    fox = make_fox()
+    # best of a few runs, the least disturbed by the rest of the system
+    new = min(timeit.repeat(lambda: fox.build_packet(), number=CALLS, repeat=5)) / CALLS
+    # the old encoder got the eye rows as lists of ints
+    old_fox = make_fox()
+    old_fox.left_eye.current_state = list(old_fox.left_eye.current_state)
+    old_fox.right_eye.current_state = list(old_fox.right_eye.current_state)
+    old = min(timeit.repeat(lambda: old_build_packet(old_fox), number=CALLS, repeat=5))
+    old /= CALLS
+    print(f"\nstruct.pack, lists of rows:      {old * 1e9:.0f} ns per packet")
+    print(f"Struct.pack_into, bytes rows:    {new * 1e9:.0f} ns per packet ({old / new:.1f}x)")
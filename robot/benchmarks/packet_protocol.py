@@ -0,0 +1,84 @@
+"""
+Packets applied right and wrong over a faulty serial link, raw against framed.
+"""
+
+import time
+import numpy as np
+from robot.software.packet_protocol import FRAME_ACTUATORS, FrameDecoder, FrameEncoder
+
+PACKET_SIZE = 21
+PACKETS = 20000
+FAULT_RATES = (0.0, 0.001, 0.01)  # chance of a fault per packet
+
+
+def make_packets(count, rng):
+    rows = rng.integers(0, 256, (count, PACKET_SIZE), dtype=np.uint8)
+    return [row.tobytes() for row in rows]
+
+
+def corrupt(pieces, rate, rng):
+    """Join the pieces, hitting some of them with a dropped, extra or flipped byte."""
+    stream = []
+    for piece in pieces:
+        if rng.random() < rate:
+            piece = bytearray(piece)
+            i = rng.integers(len(piece))
+            fault = rng.integers(3)
+            if fault == 0:
+                del piece[i]
+            elif fault == 1:
+                piece.insert(i, rng.integers(256))
+            else:
+                piece[i] ^= 1 << rng.integers(8)
+        stream.append(bytes(piece))
+    return b"".join(stream)
+
+
+def raw(packets, rate, rng):
+    stream = corrupt(packets, rate, rng)
+    sent = set(packets)
+    received = [stream[i : i + PACKET_SIZE] for i in range(0, len(stream), PACKET_SIZE)]
+    received = [packet for packet in received if len(packet) == PACKET_SIZE]
+    good = sum(packet in sent for packet in received)
+    return good, len(received) - good, {}
+
+
+def framed(packets, rate, rng):
+    encoder = FrameEncoder()
+    stream = corrupt([encoder.encode(FRAME_ACTUATORS, p) for p in packets], rate, rng)
+    decoder = FrameDecoder()
+    received = [payload for _, _, payload in decoder.feed(stream)]
+    sent = set(packets)
+    good = sum(packet in sent for packet in received)
+    return good, len(received) - good, decoder.stats()
+
+
+def cost(packets):
+    encoder = FrameEncoder()
+    start = time.perf_counter()
+    stream = b"".join(encoder.encode(FRAME_ACTUATORS, packet) for packet in packets)
+    encode = time.perf_counter() - start
+
+    decoder = FrameDecoder()
+    start = time.perf_counter()
+    for i in range(0, len(stream), 64):  # about what one serial read returns
+        decoder.feed(stream[i : i + 64])
+    decode = time.perf_counter() - start
+    return encode / len(packets), decode / len(packets)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    packets = make_packets(PACKETS, rng)
+
+    print(f"{PACKETS} packets")
+    print(f"{'faults':>7}{'protocol':>10}{'applied':>9}{'corrupt':>9}  framed counters")
+    for rate in FAULT_RATES:
+        for name, parse in (("raw", raw), ("framed", framed)):
+            good, bad, stats = parse(packets, rate, rng)
+            counters = ", ".join(f"{key} {value}" for key, value in stats.items())
+            print(f"{rate:>7.1%}{name:>10}{good:>9}{bad:>9}  {counters}")
+
+    encode, decode = cost(packets)
+    print(f"\nencode: {encode * 1e6:.1f} us per packet")
+    print(f"decode: {decode * 1e6:.1f} us per packet")
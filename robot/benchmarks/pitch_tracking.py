@@ -0,0 +1,90 @@
+"""
+Vectorized YIN against librosa.pyin, then the streaming backends, on the WAV files.
+"""
+
+import time
+import numpy as np
+import librosa
+from robot.software.pitch_tracking import frame_signal, hz_to_midi, yin
+from robot.software.audio_processing import CollectAudio, NoteSegmenter, StreamingPitch
+from robot.software.melody_matcher import MelodyMatcher
+from robot.benchmarks.media import wav_files
+
+SR = 22050
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+
+def compare(path):
+    y, sr = librosa.load(path, sr=SR)
+    fmin, fmax = librosa.note_to_hz("C3"), librosa.note_to_hz("C7")
+
+    start = time.perf_counter()
+    f0_pyin, voiced_pyin, _ = librosa.pyin(
+        y,
+        fmin=fmin,
+        fmax=fmax,
+        sr=sr,
+        frame_length=FRAME_LENGTH,
+        hop_length=HOP_LENGTH,
+        center=False,
+    )
+    pyin_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    f0_yin, voiced_yin = yin(frame_signal(y, FRAME_LENGTH, HOP_LENGTH), sr, fmin, fmax)
+    yin_time = time.perf_counter() - start
+
+    frames = min(len(f0_pyin), len(f0_yin))
+    voiced_pyin, voiced_yin = voiced_pyin[:frames], voiced_yin[:frames]
+    both = voiced_pyin & voiced_yin
+    same_note = hz_to_midi(f0_yin[:frames][both]) == hz_to_midi(f0_pyin[:frames][both])
+    return {
+        "seconds": len(y) / sr,
+        "pyin": pyin_time,
+        "yin": yin_time,
+        "voicing": np.mean(voiced_pyin == voiced_yin),
+        "notes": np.mean(same_note) if both.any() else float("nan"),
+    }
+
+
+def stream(path, backend, chunk_seconds=0.25):
+    y, sr = librosa.load(path, sr=CollectAudio.RATE)
+    pitch = StreamingPitch(sr, backend=backend, notes=CollectAudio.MELODY_MIDI)
+    segmenter = NoteSegmenter(min_instances=2)
+    matcher = MelodyMatcher()
+    matcher.add(CollectAudio.TREAT_MELODY, CollectAudio.MELODY_MIDI)
+    chunk = int(chunk_seconds * sr)
+    heard = []
+    start = time.perf_counter()
+    for i in range(0, len(y), chunk):
+        notes = segmenter.process(pitch.process(y[i : i + chunk]))
+        heard += matcher.feed_many(notes)
+    elapsed = time.perf_counter() - start
+    return elapsed / (len(y) / sr), CollectAudio.TREAT_MELODY in heard
+
+
+if __name__ == "__main__":
+    print(
+        f"{'file':<24}{'audio s':>8}{'pyin s':>8}{'yin s':>8}{'speedup':>9}"
+        f"{'voicing':>9}{'notes':>7}"
+    )
+    for name, path in wav_files():
+        result = compare(path)
+        print(
+            f"{name:<24}{result['seconds']:>8.1f}{result['pyin']:>8.2f}"
+            f"{result['yin']:>8.3f}{result['pyin'] / result['yin']:>9.0f}"
+            f"{result['voicing']:>9.0%}{result['notes']:>7.0%}"
+        )
+    print("voicing: frames where both agree on voiced/unvoiced")
+    print("notes: frames voiced in both that round to the same MIDI note")
+
+    backends = ("pyin", "yin", "goertzel")
+    print(f"\nstreaming at {CollectAudio.RATE} Hz: CPU seconds per audio second, melody found")
+    print(f"{'file':<24}" + "".join(f"{backend:>16}" for backend in backends))
+    for name, path in wav_files():
+        row = f"{name:<24}"
+        for backend in backends:
+            cost, found = stream(path, backend)
+            row += f"{cost:>10.4f} {'yes' if found else 'no':>5}"
+        print(row)
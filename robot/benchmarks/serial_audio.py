@@ -0,0 +1,189 @@
+"""
+Serial audio parser against archive/read_microphone.py's byte by byte sync, and a pty
+loopback check.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+from robot.software.audio_buffer import AudioRingBuffer
+from robot.software.serial_audio import (
+    CHANNELS,
+    HEADER,
+    PAYLOAD_SIZE,
+    SAMPLE_RATE,
+    FramedAudioParser,
+    SerialAudioReader,
+)
+
+FRAMES = PAYLOAD_SIZE // (2 * CHANNELS)  # per packet
+PACKETS_PER_SECOND = SAMPLE_RATE / FRAMES
+BYTES_PER_SECOND = PACKETS_PER_SECOND * (len(HEADER) + PAYLOAD_SIZE)
+USB_CHUNK = 64  # bytes per full speed USB packet, how a live port hands data over
+
+
+def make_packets(count, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(-32768, 32767, size=(count, FRAMES, CHANNELS), dtype="<i2")
+    # audio can hold the header bytes too, 0xFEFF is -257
+    samples[:, 5, 0] = -257
+    packets = [HEADER + packet.tobytes() for packet in samples]
+    return samples, packets
+
+
+def corrupt(packets, truncated, stray):
+    """
+    Cut one packet short and put stray bytes before another, like a lost USB read.
+    Returns the stream and the samples the parser should get out of it: the cut short
+    packet is taken with the start of the next one, and that next one is lost.
+    """
+    stream = []
+    expected = []
+    for i, packet in enumerate(packets):
+        if i == stray:
+            stream.append(b"\x00\xff\x13")
+        if i == truncated:
+            stream.append(packet[:-100])
+            expected.append((packet[:-100] + packets[i + 1][:100])[len(HEADER) :])
+        else:
+            stream.append(packet)
+            if i != truncated + 1:
+                expected.append(packet[len(HEADER) :])
+    samples = np.frombuffer(b"".join(expected), dtype="<i2").reshape(-1, CHANNELS)
+    return b"".join(stream), samples.T
+
+
+def byte_by_byte(fd, seconds):
+    """
+    Header sync from archive/read_microphone.py, reading the whole stream from fd into
+    the same channel ring as FramedAudioParser.
+    """
+    ring = AudioRingBuffer(int(seconds * SAMPLE_RATE), shape=(CHANNELS,), planar=True)
+
+    def read(size):
+        data = b""
+        while len(data) < size:
+            more = os.read(fd, size - len(data))
+            if not more:
+                break
+            data += more
+        return data
+
+    while True:
+        byte = read(1)
+        if not byte:
+            break
+        if byte[0] != HEADER[0]:
+            continue
+        byte = read(1)
+        if not byte or byte[0] != HEADER[1]:
+            continue
+        data = read(PAYLOAD_SIZE)
+        if len(data) == PAYLOAD_SIZE:
+            ring.write(np.frombuffer(data, dtype="<i2").reshape(-1, CHANNELS))
+    return ring
+
+
+def bulk(fd, seconds):
+    """FramedAudioParser reading the whole stream from fd straight into its buffer."""
+    parser = FramedAudioParser(buffer_seconds=seconds)
+    done = False
+
+    def read_into(space):
+        nonlocal done
+        count = os.readv(fd, [space])
+        done = count == 0
+        return count
+
+    while not done:
+        parser.fill_from(read_into)
+        time.sleep(parser.wait_time())  # like SerialAudioReader
+    return parser
+
+
+def read_cost(read, stream, chunk=None):
+    """
+    CPU time read() takes to get through stream, written into a pipe by a thread, all
+    at once or chunk bytes at a time at the microphones' real rate.
+    """
+    out, into = os.pipe()
+
+    def write():
+        if chunk is None:
+            os.write(into, stream)
+        else:
+            interval = chunk / BYTES_PER_SECOND
+            next_write = time.monotonic()
+            for i in range(0, len(stream), chunk):
+                next_write += interval
+                time.sleep(max(0.0, next_write - time.monotonic()))
+                os.write(into, stream[i : i + chunk])
+        os.close(into)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    start = time.thread_time()
+    read(out)
+    elapsed = time.thread_time() - start
+    writer.join()
+    os.close(out)
+    return elapsed
+
+
+def parse_cost(seconds, chunk=None):
+    """CPU seconds per second of audio of both readers."""
+    count = int(seconds * PACKETS_PER_SECOND)
+    _, packets = make_packets(count)
+    # start mid packet, like opening the port while the Arduino is already sending
+    stream = b"".join(packets)[700:]
+    old = read_cost(lambda fd: byte_by_byte(fd, seconds), stream, chunk)
+    new = read_cost(lambda fd: bulk(fd, seconds), stream, chunk)
+    return old / seconds, new / seconds
+
+
+def loopback(count=100, speedup=4.0, truncated=30, stray=60):
+    """Stream packets through a pty and check that the reader got the right samples."""
+    import serial  # pyserial opens the pty like the Arduino's port
+
+    _, packets = make_packets(count, seed=1)
+    stream, expected = corrupt(packets, truncated, stray)
+
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), timeout=0.1)
+    reader = SerialAudioReader(port, buffer_seconds=count / PACKETS_PER_SECOND + 1)
+    reader.start()
+    time.sleep(0.1)  # the reader flushes the port when it starts
+
+    # the stand-in writes packet sized pieces at speedup times the real rate
+    interval = 1 / (PACKETS_PER_SECOND * speedup)
+    piece = len(HEADER) + PAYLOAD_SIZE
+    for i in range(0, len(stream), piece):
+        os.write(master, stream[i : i + piece])
+        time.sleep(interval)
+    time.sleep(0.3)
+    reader.stop()
+    reader.join()
+    os.close(master)
+    os.close(slave)
+
+    stats = reader.stats()
+    received, _ = reader.parser.read_from(0)
+    assert received.shape == expected.shape, f"{received.shape} != {expected.shape}"
+    assert np.array_equal(received, expected), "samples differ from the ones sent"
+    assert stats["packets"] == count - 1, stats
+    return stats
+
+
+if __name__ == "__main__":
+    print("CPU seconds per second of 3 channel audio, including copying into the ring")
+    old, new = parse_cost(30)
+    print(f"whole stream buffered     byte by byte {old:.5f}   FramedAudioParser {new:.5f}")
+    old, new = parse_cost(5, USB_CHUNK)
+    print(f"{USB_CHUNK} byte reads, real time  byte by byte {old:.5f}   FramedAudioParser {new:.5f}")
+
+    if os.name == "posix":
+        stats = loopback()
+        print("\npty loopback with one cut short packet and 3 stray bytes: samples match")
+        for name, value in stats.items():
+            print(f"{name + ':':<20} {value}")
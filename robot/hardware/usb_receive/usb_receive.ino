@@ -11,10 +11,93 @@ const int ENCODER_PIN_L = 3; // Encoder for left motor (must be 2 or 3 for ISR)
 const int SERVO_EAR_R = 10; // Right ear servo
 const int SERVO_EAR_L = 11; // Left ear servo
 const int SERVO_TAIL = 6; // Tail servo
+const int BUTTON_PIN = 9; // Button on top, pressed is LOW because of the pull-up (PB1, PCINT1)
 
 const int NUM_DEVICES = 2; // Number of displays daisy-chained together
 
-byte SERIAL_PACKET_SIZE = 21; // Serial Comm Constants
+byte SERIAL_PACKET_SIZE = 21; // Serial Comm Constants, actuator payload size
+
+// ----------------------------------------------------------
+// Frame format, must match robot/software/packet_protocol.py:
+// Bytes 0-1 = Sync bytes 0xAA 0x55
+// Byte 2 = Protocol version
+// Byte 3 = Frame type
+// Byte 4 = Sequence number, +1 per frame and wrapping at 255
+// Byte 5 = Payload length
+// Bytes 6.. = Payload
+// Last 2 bytes = CRC-16/CCITT-FALSE of byte 2 to the end of the payload, little endian
+// ----------------------------------------------------------
+const byte SYNC_0 = 0xAA;
+const byte SYNC_1 = 0x55;
+const byte PROTOCOL_VERSION = 1;
+const byte FRAME_ACTUATORS = 1;
+const byte FRAME_DELTA = 2;
+const byte FRAME_TELEMETRY = 3; // Sent to the host
+const byte FRAME_HELLO = 4; // Empty, sent first by a newly opened host, restarts the sequence
+const byte FRAME_HEADER_SIZE = 6;
+const byte FRAME_CRC_SIZE = 2;
+const byte MAX_PAYLOAD = 32;
+const byte FRAME_BUFFER_SIZE = FRAME_HEADER_SIZE + MAX_PAYLOAD + FRAME_CRC_SIZE;
+const int8_t SEQUENCE_WINDOW = 16; // Frames further back than this mean the host restarted
+
+byte frame[FRAME_BUFFER_SIZE]; // Bytes received but not parsed yet
+byte frameFill = 0;
+byte lastSequence = 0;
+bool haveSequence = false;
+
+// Link statistics
+unsigned long framesReceived = 0; // Frames accepted
+unsigned long framesRejected = 0; // Wrong version, length or CRC
+unsigned long framesOutOfOrder = 0; // Older than or the same as the last accepted frame
+unsigned long framesLost = 0; // Missing from gaps in the sequence numbers
+bool sequenceGap = true; // Whether frames were lost right before the last accepted one
+
+// ----------------------------------------------------------
+// Delta frame format, must match DeltaEncoder in robot/software/packet_protocol.py:
+// Bytes 0-2 = Mask of the changed fields, little endian
+// Bytes 3.. = Bytes of the changed fields, in the order of their bits
+// Bit 0 = Motors (actuator bytes 0-1), bit 1 = ears, bit 2 = tail, bit 3 = brightness,
+// bits 4-11 = left eye rows, bits 12-19 = right eye rows
+// A delta only applies on top of the frame right before it, after lost frames deltas
+// are ignored until the next full actuator frame (keyframe)
+// ----------------------------------------------------------
+const byte DELTA_MASK_SIZE = 3;
+const byte DELTA_FIELDS = 20;
+const byte DELTA_OFFSETS[DELTA_FIELDS] = {0, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20};
+const byte DELTA_SIZES[DELTA_FIELDS] = {2, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1};
+const uint32_t FIELD_MOTORS = 1UL << 0;
+const uint32_t FIELD_EARS = 1UL << 1;
+const uint32_t FIELD_TAIL = 1UL << 2;
+const uint32_t FIELD_BRIGHTNESS = 1UL << 3;
+const byte FIELD_FIRST_EYE_ROW = 4; // Bit of left eye row 0
+const uint32_t FIELD_ALL = (1UL << DELTA_FIELDS) - 1;
+
+byte actuators[21]; // Last actuator packet, keyframes and deltas are written into it
+bool actuatorsSynced = false; // Whether actuators matches the host's packet
+
+// ----------------------------------------------------------
+// Telemetry payload format, must match robot/software/telemetry.py:
+// Byte 0 = Flags, bit 0 = button pressed now, bit 1 = button pressed since the last
+// telemetry, bit 2 = a delta's base was lost and the actuators wait for a keyframe
+// Bytes 1-4 = Right encoder count, signed, little endian like everything below
+// Bytes 5-8 = Left encoder count, signed
+// Bytes 9-12 = Loop counter
+// Bytes 13-16 = Frames received
+// Bytes 17-18 = Frames rejected, wrapping
+// Bytes 19-20 = Frames lost, wrapping
+// ----------------------------------------------------------
+const byte TELEMETRY_SIZE = 21;
+const unsigned long TELEMETRY_INTERVAL_MS = 20; // 50 Hz, 1450 bytes/s with framing
+byte telemetrySequence = 0;
+unsigned long lastTelemetry = 0;
+unsigned long loopCount = 0;
+
+// Written by interrupts, read with interrupts off
+volatile long encoderCountR = 0; // Pulses, counted down while the wheel is driven backwards
+volatile long encoderCountL = 0;
+volatile int8_t encoderDirectionR = 1; // Sign of the last speed set, kept while coasting
+volatile int8_t encoderDirectionL = 1;
+volatile bool buttonLatched = false; // Pressed since the last telemetry
 
 // Motor shield setup
 Adafruit_MotorShield MS1 = Adafruit_MotorShield(); // Motor shield (0x60 address)
@@ -68,12 +151,31 @@ byte rightArray[] = {
 
 const int PATTERN_ROWS = 8; // Max number of rows in the pattern
 
-void setDisplays(int brightness, byte leftArray[], byte rightArray[]) {
-  lc.setIntensity(0, brightness); // Set the brightness from 0-15 
-  lc.setIntensity(1, brightness); // Set the brightness from 0-15  
-  for (int row = 0; row < PATTERN_ROWS; row++) { // Set patterns
-    lc.setRow(0, row, leftArray[row]);
-    lc.setRow(1, row, rightArray[row]);
+void setBrightness(int brightness) {
+  lc.setIntensity(0, brightness); // Set the brightness from 0-15
+  lc.setIntensity(1, brightness); // Set the brightness from 0-15
+}
+
+void setEyeRow(int device, int row, byte pattern) { // Device 0 is the left eye
+  if (device == 0) {
+    leftArray[row] = pattern;
+  } else {
+    rightArray[row] = pattern;
+  }
+  lc.setRow(device, row, pattern);
+}
+
+void countEncoderR() {
+  encoderCountR += encoderDirectionR;
+}
+
+void countEncoderL() {
+  encoderCountL += encoderDirectionL;
+}
+
+ISR(PCINT0_vect) { // Any change on port B, only the button's pin is enabled
+  if (digitalRead(BUTTON_PIN) == LOW) {
+    buttonLatched = true;
   }
 }
 
@@ -92,6 +194,14 @@ void setMotors(int speedL, int speedR) {
     speedR = -255;
   }
   
+  // Encoder pulses don't say which way the wheel turns, the last command does
+  if (speedL != 0) {
+    encoderDirectionL = speedL > 0 ? 1 : -1;
+  }
+  if (speedR != 0) {
+    encoderDirectionR = speedR > 0 ? 1 : -1;
+  }
+
   // Set speed and direction of left motor
   if (speedL==0){
     m1 -> run(RELEASE);
@@ -126,14 +236,214 @@ void setTail(byte tail_angle) { // Set tail angle
 }
 
 
+uint16_t crc16(const byte *data, byte length) { // CRC-16/CCITT-FALSE
+  uint16_t crc = 0xFFFF;
+  for (byte i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (byte bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void dropBytes(byte count) { // Remove parsed or skipped bytes from the frame buffer
+  memmove(frame, frame + count, frameFill - count);
+  frameFill -= count;
+}
+
+bool acceptSequence(byte sequence) { // False for a stale or repeated frame
+  if (haveSequence) {
+    int8_t step = (int8_t)(sequence - lastSequence);
+    if (step <= 0 && step > -SEQUENCE_WINDOW) {
+      framesOutOfOrder++;
+      return false;
+    }
+    if (step <= 0) { // Far behind, the host restarted and missed its hello frame
+      sequenceGap = true;
+    } else {
+      framesLost += step - 1;
+      sequenceGap = step != 1;
+    }
+  }
+  haveSequence = true;
+  lastSequence = sequence;
+  framesReceived++;
+  return true;
+}
+
+void applyFields(uint32_t mask) { // Only touches the hardware for the fields in mask
+  // ----------------------------------------------------------
+  // Actuator payload format:
+  // Byte 0 = Left motor speed -128-127(byte)
+  // Byte 1 = Right motor speed -128-127(byte)
+  // Byte 2 = Servo angle for ears 0-180(byte)
+  // Byte 3 = Servo angle for the tail 0-180(byte)
+  // Byte 4 = Eye brightness (0-1 -> scaled to 0-255)
+  // Bytes 5-12 = Array for left eye (8 bytes)
+  // Bytes 13-20 = Array for right eye (8 bytes)
+  // ----------------------------------------------------------
+  if (mask & FIELD_MOTORS) {
+    int leftSpeed = ((int)actuators[0] - 128)*2; // Convert unsigned 0-255 to signed -255-255
+    int rightSpeed = ((int)actuators[1] - 128)*2; // Convert unsigned 0-255 to signed -255-255
+    setMotors(leftSpeed, rightSpeed);
+  }
+  if (mask & FIELD_EARS) {
+    setEars(actuators[2]);
+  }
+  if (mask & FIELD_TAIL) {
+    setTail(actuators[3]);
+  }
+  if (mask & FIELD_BRIGHTNESS) {
+    setBrightness(actuators[4]);
+  }
+  for (int row = 0; row < PATTERN_ROWS; row++) {
+    if (mask & (1UL << (FIELD_FIRST_EYE_ROW + row))) {
+      setEyeRow(0, row, actuators[5 + row]);
+    }
+    if (mask & (1UL << (FIELD_FIRST_EYE_ROW + PATTERN_ROWS + row))) {
+      setEyeRow(1, row, actuators[5 + PATTERN_ROWS + row]);
+    }
+  }
+}
+
+void applyKeyframe(byte payload[]) { // Full actuator packet, rewrites everything
+  memcpy(actuators, payload, SERIAL_PACKET_SIZE);
+  actuatorsSynced = true;
+  applyFields(FIELD_ALL);
+}
+
+void applyDelta(byte payload[], byte length) {
+  if (!actuatorsSynced || sequenceGap) { // The delta's base was lost, wait for a keyframe
+    actuatorsSynced = false;
+    return;
+  }
+  uint32_t mask = payload[0] | ((uint32_t)payload[1] << 8) | ((uint32_t)payload[2] << 16);
+  byte expected = DELTA_MASK_SIZE;
+  for (byte field = 0; field < DELTA_FIELDS; field++) {
+    if (mask & (1UL << field)) {
+      expected += DELTA_SIZES[field];
+    }
+  }
+  if (expected != length) {
+    framesRejected++;
+    return;
+  }
+  byte position = DELTA_MASK_SIZE;
+  for (byte field = 0; field < DELTA_FIELDS; field++) {
+    if (mask & (1UL << field)) {
+      memcpy(actuators + DELTA_OFFSETS[field], payload + position, DELTA_SIZES[field]);
+      position += DELTA_SIZES[field];
+    }
+  }
+  applyFields(mask);
+}
+
+void handleFrame(byte type, byte sequence, byte payload[], byte length) {
+  if (type == FRAME_HELLO) { // A new host, its sequence starts here and deltas wait for its keyframe
+    haveSequence = false;
+    sequenceGap = true;
+  }
+  if (!acceptSequence(sequence)) {
+    return;
+  }
+  if (type == FRAME_ACTUATORS && length == SERIAL_PACKET_SIZE) {
+    applyKeyframe(payload);
+  } else if (type == FRAME_DELTA && length >= DELTA_MASK_SIZE) {
+    applyDelta(payload, length);
+  }
+}
+
+bool sendTelemetry() { // False if the transmit buffer has no room, the loop never waits
+  byte out[FRAME_HEADER_SIZE + TELEMETRY_SIZE + FRAME_CRC_SIZE];
+  if (Serial.availableForWrite() < (int)sizeof(out)) {
+    return false;
+  }
+
+  noInterrupts();
+  long countR = encoderCountR;
+  long countL = encoderCountL;
+  bool latched = buttonLatched;
+  buttonLatched = false;
+  interrupts();
+
+  out[0] = SYNC_0;
+  out[1] = SYNC_1;
+  out[2] = PROTOCOL_VERSION;
+  out[3] = FRAME_TELEMETRY;
+  out[4] = telemetrySequence++;
+  out[5] = TELEMETRY_SIZE;
+  byte *payload = out + FRAME_HEADER_SIZE;
+  // Check if the button is pressed (LOW because of the pull-up resistor on the pin)
+  bool pressed = digitalRead(BUTTON_PIN) == LOW;
+  payload[0] = (pressed ? 1 : 0) | (latched ? 2 : 0) | (actuatorsSynced ? 0 : 4);
+  uint16_t rejected = framesRejected;
+  uint16_t lost = framesLost;
+  memcpy(payload + 1, &countR, 4); // AVR is little endian
+  memcpy(payload + 5, &countL, 4);
+  memcpy(payload + 9, &loopCount, 4);
+  memcpy(payload + 13, &framesReceived, 4);
+  memcpy(payload + 17, &rejected, 2);
+  memcpy(payload + 19, &lost, 2);
+  uint16_t crc = crc16(out + 2, FRAME_HEADER_SIZE - 2 + TELEMETRY_SIZE);
+  out[sizeof(out) - 2] = crc & 0xFF;
+  out[sizeof(out) - 1] = crc >> 8;
+  Serial.write(out, sizeof(out));
+  return true;
+}
+
+void parseFrames() {
+  // Handles every complete frame in the buffer. A frame that fails its checks only
+  // skips its first byte, so the search for sync bytes resumes right behind it instead
+  // of after a length that may be corrupted too
+  while (true) {
+    byte start = 0;
+    while (start < frameFill && frame[start] != SYNC_0) {
+      start++;
+    }
+    dropBytes(start);
+    if (frameFill < 2) {
+      return;
+    }
+    if (frame[1] != SYNC_1) {
+      dropBytes(1);
+      continue;
+    }
+    if (frameFill < FRAME_HEADER_SIZE) {
+      return;
+    }
+
+    byte length = frame[5];
+    if (frame[2] != PROTOCOL_VERSION || length > MAX_PAYLOAD) {
+      framesRejected++;
+      dropBytes(1);
+      continue;
+    }
+    byte total = FRAME_HEADER_SIZE + length + FRAME_CRC_SIZE;
+    if (frameFill < total) {
+      return;
+    }
+    uint16_t crc = frame[total - 2] | ((uint16_t)frame[total - 1] << 8);
+    if (crc16(frame + 2, FRAME_HEADER_SIZE - 2 + length) != crc) {
+      framesRejected++;
+      dropBytes(1);
+      continue;
+    }
+
+    handleFrame(frame[3], frame[4], frame + FRAME_HEADER_SIZE, length);
+    dropBytes(total);
+  }
+}
+
 void setup() {
   MS1.begin();
   //------------------------------------------------------------------------------------------------
   // The arduino code needs to receive a 21 byte array message to run 
-  // 21 bytes = 168 bits
+  // 21 bytes + 8 bytes of framing = 29 bytes = 290 bits on the wire (start and stop bits)
   // The robot should have a refresh rate of around 200-500 times a second for seameless operation 
   // Realistically 60hz or so would probably be fine but where is the fun in that
-  // 168*500 = 84,000 which means 9600 is too slow so we need 115200 bps or faster
+  // 290*200 = 58,000 which means 9600 is too slow so we need 115200 bps or faster,
+  // 500 Hz needs 145,000 bps
   //------------------------------------------------------------------------------------------------
   Serial.begin(115200); // Bitrate justified above
   delay(100); // Give time for Raspi to connect
@@ -150,61 +460,26 @@ void setup() {
   lc.shutdown(1, false); // Wake up the display 2
   lc.setIntensity(1, 1); // Set the brightness from 0-15 
   lc.clearDisplay(1); // Clear display 2
-  pinMode(9, INPUT_PULLUP); 
+  pinMode(BUTTON_PIN, INPUT_PULLUP);
+  PCMSK0 |= _BV(PCINT1); // Pin change interrupt for the button
+  PCICR |= _BV(PCIE0);
+
+  pinMode(ENCODER_PIN_R, INPUT_PULLUP);
+  pinMode(ENCODER_PIN_L, INPUT_PULLUP);
+  attachInterrupt(digitalPinToInterrupt(ENCODER_PIN_R), countEncoderR, RISING);
+  attachInterrupt(digitalPinToInterrupt(ENCODER_PIN_L), countEncoderL, RISING);
 }
 
 void loop() {
-  if (Serial.available() >= SERIAL_PACKET_SIZE) {
-    byte buffer[SERIAL_PACKET_SIZE];
-
-    // ----------------------------------------------------------
-    // Serial Data format:
-    // Byte 0 = Left motor speed -128-127(byte)
-    // Byte 1 = Right motor speed -128-127(byte)
-    // Byte 2 = Servo angle for ears 0-180(byte)
-    // Byte 3 = Servo angle for the tail 0-180(byte)
-    // Byte 4 = Eye brightness (0-1 -> scaled to 0-255)
-    // Bytes 5-12 = Array for left eye (8 bytes)
-    // Bytes 13-20 = Array for right eye (8 bytes)
-    // ----------------------------------------------------------
-    
-    if (Serial.readBytes(buffer, SERIAL_PACKET_SIZE) == SERIAL_PACKET_SIZE) { // Unpack message data
-      int receivedLeftSpeed = (int)buffer[0];
-      int receivedRightSpeed = (int)buffer[1];
-      int leftSpeed = (receivedLeftSpeed - 128)*2; // Convert unsigned 0-255 to signed -255-255
-      int rightSpeed = (receivedRightSpeed - 128)*2; // Convert unsigned 0-255 to signed -255-255
-      int receivedEar = (int)buffer[2];
-      int receivedTail = (int)buffer[3];
-      int receivedBrightness = (int)buffer[4];
-
-      for (int i = 0; i < 8; i++) { // Unpack array for left eye
-        leftArray[i] = buffer[5 + i];
-      }
-
-      for (int i = 0; i < 8; i++) { // Unpack array for right eye
-        rightArray[i] = buffer[13 + i];
-      }
-
-      setDisplays(receivedBrightness, leftArray, rightArray); // Set displays based on arrays unpacked above
-
-      setMotors(leftSpeed, rightSpeed); // Set motors to speeds unpacked above
-
-      if (l_receivedEar != receivedEar) { // Set ear angles
-        setEars(receivedEar);
-      }
-      
-      if (l_receivedTail != receivedTail) { // Set tail angle
-        setTail(receivedTail);
-      }
-
-    }
+  // Take everything that arrived, the parser keeps partial frames for the next loop
+  while (Serial.available() > 0 && frameFill < FRAME_BUFFER_SIZE) {
+    frame[frameFill++] = Serial.read();
+  }
+  parseFrames();
 
-    int buttonState = digitalRead(9);
-    // Check if the button is pressed (LOW because of the pull-up resistor on the pin)
-    if (buttonState == LOW) {
-      Serial.print(1);
-    } else {
-      Serial.print(0);
-    }s
+  unsigned long now = millis();
+  if (now - lastTelemetry >= TELEMETRY_INTERVAL_MS && sendTelemetry()) {
+    lastTelemetry = now;
   }
-}
\ No newline at end of file
+  loopCount++;
+}
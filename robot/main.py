@@ -1,9 +1,19 @@
 import time
 from robot.software.behaviors import RobotBehaviors
 from robot.software.behavior_manager import StateManager
+from robot.software.packet_protocol import DeltaEncoder
+from robot.software.scheduling import TickScheduler
 import serial
+import sys
 import time
 
+ARDUINO_PORT = "/dev/ttyACM0"  # or the link of robot/benchmarks/arduino_emulator.py
+CONTROL_RATE = 50  # hz
+OVERRUN_POLICY = "skip"  # "skip" or "catch_up" when a tick runs long
+USE_VISION_WORKER = False  # run camera capture and analysis in a separate process
+DELTA_PACKETS = False  # only send the actuator fields that changed since the last tick
+KEYFRAME_INTERVAL = CONTROL_RATE  # ticks between full packets when sending deltas
+
 
 def print_robot_state(fox, state_manager):
     print("\n================ ROBOT STATE ================")
@@ -16,23 +26,79 @@ def print_robot_state(fox, state_manager):
     print(f"Right eye array:  {fox.right_eye.current_state}")
     print(f"State:            {fox.state}")
     print(f"Button state:     {state_manager.button_pressed}")
+    telemetry = state_manager.telemetry.latest
+    if telemetry is not None:
+        print(f"Encoders (L, R):  {telemetry['encoder_left']}, {telemetry['encoder_right']}")
     print(f"Melody:           {state_manager.heard_melody}")
     print(f"Word command:     {state_manager.command}")
-    print("Raw bytes:", packet)
+    brightness = state_manager.berry_detection.brightness
+    if brightness.calls:  # in "pixels" mode it is part of the frame analysis
+        print(f"Darkness check:   {brightness.cost() * 1e6:.0f} us")
+    print("Raw bytes:", bytes(packet))
+    print("=============================================")
+
+
+def print_loop_timing(scheduler, state_manager):
+    stats = scheduler.stats()
+    print("\n================ LOOP TIMING ================")
+    print(f"Target period:    {scheduler.period * 1000:.1f} ms")
+    print(f"Ticks:            {stats['ticks']}")
+    print(f"Overruns:         {stats['overruns']}")
+    print(f"Skipped ticks:    {stats['skipped']}")
+    print(f"Mean period:      {stats['mean_period'] * 1000:.1f} ms")
+    print(f"Mean jitter:      {stats['mean_jitter'] * 1000:.1f} ms")
+    print(f"Max jitter:       {stats['max_jitter'] * 1000:.1f} ms")
+    print("Period histogram:")
+    print(scheduler.format_histogram(scheduler.period_histogram))
+    print("Jitter histogram:")
+    print(scheduler.format_histogram(scheduler.jitter_histogram))
+    if state_manager.audio_collector.listener is not None:
+        audio = state_manager.audio_collector.listener.stats()
+        print(f"Melody analyses:  {audio['hops']}")
+        print(f"Mean analysis:    {audio['mean_analysis'] * 1000:.1f} ms")
+        print(f"Max analysis:     {audio['max_analysis'] * 1000:.1f} ms")
+        print(f"Melodies heard:   {audio['events']}")
+        print(f"Max event wait:   {audio['max_event_wait'] * 1000:.1f} ms")
+    if state_manager.audio_collector.gate is not None:
+        gated = state_manager.audio_collector.gate.gated_ratio()
+        print(f"Audio gated:      {gated:.0%}")
+    if state_manager.audio_collector.buffer is not None:
+        overflowed = state_manager.audio_collector.buffer.overflowed
+        print(f"Audio overwritten:{overflowed:>6} samples")
+    link = state_manager.telemetry.stats()
+    print(f"Telemetry frames: {link['frames']}")
+    print(f"Telemetry lost:   {link['lost']} ({link['rejected']} rejected)")
+    print(f"Telemetry age:    {state_manager.telemetry.age() * 1000:.0f} ms")
+    if link["disconnected"]:
+        print("Telemetry:        port disconnected")
+    telemetry = state_manager.telemetry.latest
+    if telemetry is not None:
+        # what the Arduino saw of the packets sent to it
+        print(f"Arduino loops:    {telemetry['loop_count']}")
+        print(f"Arduino received: {telemetry['frames_received']}")
+        print(f"Arduino lost:     {telemetry['frames_lost']}")
+        print(f"Arduino rejected: {telemetry['frames_rejected']}")
     print("=============================================")
 
 
 if __name__ == "__main__":
     print("Started run...")
-    port = "/dev/ttyACM0"
+    port = sys.argv[1] if len(sys.argv) > 1 else ARDUINO_PORT
     arduino = serial.Serial(port, 115200, timeout=0.1)
     time.sleep(1)  # wait for Arduino reset after serial connection
     print("Waking up...")
-    state_manager = StateManager(arduino)
+    state_manager = StateManager(arduino, use_vision_worker=USE_VISION_WORKER)
     fox = RobotBehaviors(state_manager)
+    scheduler = TickScheduler(CONTROL_RATE, policy=OVERRUN_POLICY)
+    # sync bytes, sequence number and CRC around each packet, every packet in full
+    # unless sending deltas
+    frames = DeltaEncoder(KEYFRAME_INTERVAL if DELTA_PACKETS else 1)
+    keyframe_requested = 0.0
 
     try:
+        scheduler.start()
         while True:
+            scheduler.wait()  # sleeps until the next tick is due
             print("Starting loop...")
             # recieved data from arduino
             # data = arduino.readline().decode()
@@ -46,17 +112,31 @@ if __name__ == "__main__":
             fox.behavior()
             print("foxbot updated...")
 
+            telemetry = state_manager.telemetry.latest
+            # a lost delta's base, resend it all now instead of at the next keyframe, once
+            # per telemetry frame that came after the last request
+            if (
+                telemetry is not None
+                and telemetry["needs_keyframe"]
+                and telemetry["time"] > keyframe_requested
+            ):
+                frames.request_keyframe()
+                keyframe_requested = time.monotonic()
             packet = fox.build_packet()
-            arduino.write(packet)
+            arduino.write(frames.encode(packet))
             print("Sent packet...")
 
             print_robot_state(fox, state_manager)
-            time.sleep(0.02)  # 50 hz
+            if scheduler.ticks % (CONTROL_RATE * 10) == 0:  # every ~10 seconds
+                print_loop_timing(scheduler, state_manager)
             print("Sleeping...")
     except KeyboardInterrupt:
         print("STOPPING...")
+        print_loop_timing(scheduler, state_manager)
         fox.left_speed = 0
         fox.right_speed = 0
 
         packet = fox.build_packet()
-        arduino.write(packet)
+        frames.keyframe_interval = 1  # the stop packet can't depend on a lost delta
+        arduino.write(frames.encode(packet))
+        state_manager.telemetry.stop()
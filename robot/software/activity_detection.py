@@ -0,0 +1,98 @@
+"""
+RMS activity gate with an adaptive noise floor, so pitch analysis only runs while
+something is playing.
+"""
+
+import numpy as np
+from robot.software.pitch_tracking import frame_signal
+
+
+class ActivityGate:
+    """Decides per chunk of audio whether it is worth analyzing."""
+
+    def __init__(
+        self,
+        sr,
+        frame_seconds=0.01,
+        ratio=3.0,
+        min_rms=2e-3,
+        hangover_frames=30,
+        floor_rise=0.0005,
+        floor_fall=0.2,
+    ):
+        """
+        Args:
+            sr (Int): Sample rate
+            frame_seconds (Float) (optional): RMS frame length (defaults to 0.01)
+            ratio (Float) (optional): How far above the noise floor a frame's RMS has to
+                be to count as sound, 3 is about 10 dB (defaults to 3.0)
+            min_rms (Float) (optional): Quietest frame that can count as sound, for
+                float samples in [-1, 1] (defaults to 2e-3)
+            hangover_frames (Int) (optional): Frames the gate stays open after the last
+                loud frame (defaults to 30, 0.3 s)
+            floor_rise (Float) (optional): Share the noise floor rises by per frame while
+                frames are louder than it (defaults to 0.0005)
+            floor_fall (Float) (optional): Weight of a quieter frame in the noise floor
+                (defaults to 0.2)
+        """
+        self.frame_length = max(1, int(frame_seconds * sr))
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.hangover_frames = hangover_frames
+        self.floor_rise = floor_rise
+        self.floor_fall = floor_fall
+
+        self.floor = None  # noise floor RMS
+        self.hangover = 0  # frames the gate still stays open for
+        self.pending = np.zeros(0, dtype=np.float32)  # samples short of a full frame
+
+        # samples that skipped or went through the analysis
+        self.gated_samples = 0
+        self.passed_samples = 0
+
+    def process(self, samples):
+        """
+        Update the noise floor with new samples and decide whether they hold sound.
+
+        Args:
+            samples (ndarray): New float samples
+
+        Returns:
+            Boolean: Whether any of the samples is sound, or within the hangover of it
+        """
+        self.pending = np.concatenate([self.pending, samples])
+        frames = frame_signal(self.pending, self.frame_length, self.frame_length)
+        self.pending = self.pending[len(frames) * self.frame_length :]
+
+        active = self.hangover > 0
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        for level in rms:
+            if self.floor is None:
+                self.floor = level
+            elif level < self.floor:
+                self.floor += self.floor_fall * (level - self.floor)
+            else:
+                # kept above 0, so the floor can still rise after digital silence
+                self.floor = max(self.floor * (1 + self.floor_rise), 1e-6)
+
+            if level >= self.min_rms and level > self.ratio * self.floor:
+                self.hangover = self.hangover_frames
+                active = True
+            elif self.hangover > 0:
+                self.hangover -= 1
+
+        if active:
+            self.passed_samples += len(samples)
+        else:
+            self.gated_samples += len(samples)
+        return active
+
+    def gated_ratio(self):
+        """
+        Returns:
+            Float: Share of the audio the analysis skipped
+        """
+        total = self.gated_samples + self.passed_samples
+        if total == 0:
+            return 0.0
+        return self.gated_samples / total
@@ -0,0 +1,132 @@
+"""
+Preallocated ring buffer for streamed audio, readers get views and keep their own cursor.
+"""
+
+import threading
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size int16 sample ring shared by one writer and one reader thread.
+
+    Every sample is stored twice, at i and i + capacity, so any stretch of up to capacity
+    samples is contiguous in memory and can be handed out as a view.
+    """
+
+    def __init__(self, capacity, dtype=np.int16, shape=(), planar=False):
+        """
+        Args:
+            capacity (Int): Number of samples held
+            dtype (numpy dtype) (optional): Sample type (defaults to int16)
+            shape (tuple) (optional): Shape of one sample, e.g. (n_bins,) to hold
+                spectrum frames (defaults to (), single values)
+            planar (Boolean) (optional): Store each entry of a (n,) sample as its own
+                contiguous plane, e.g. one per microphone channel, so the transpose of a
+                view is a (n, count) view with contiguous rows (defaults to False)
+        """
+        self.capacity = capacity
+        if planar:
+            # samples are still indexed along the first axis, only the memory order
+            # differs, so writes scatter each column into its plane
+            self._data = np.zeros(tuple(shape) + (2 * capacity,), dtype=dtype).T
+        else:
+            self._data = np.zeros((2 * capacity,) + tuple(shape), dtype=dtype)
+        self._written = 0  # total samples ever written
+        self._read = 0  # total samples ever read
+        self._lock = threading.Lock()
+        self.overflowed = 0  # unread samples that were overwritten
+
+    def write(self, samples):
+        """
+        Append samples, overwriting the oldest ones once full.
+
+        Args:
+            samples (bytes or ndarray): Raw sample bytes, as given to the audio callback,
+                or an array of samples
+        """
+        if isinstance(samples, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(samples, dtype=self._data.dtype)
+        dropped = max(0, len(samples) - self.capacity)
+        samples = samples[dropped:]
+        count = len(samples)
+
+        with self._lock:
+            # a chunk longer than the ring only keeps its tail
+            self._written += dropped
+            start = self._written % self.capacity
+            first = min(count, self.capacity - start)
+            rest = count - first
+            # main copy
+            self._data[start : start + first] = samples[:first]
+            self._data[:rest] = samples[first:]
+            # mirror copy
+            self._data[start + self.capacity : start + self.capacity + first] = samples[
+                :first
+            ]
+            self._data[self.capacity : self.capacity + rest] = samples[first:]
+            self._written += count
+
+            unread = self._written - self._read
+            if unread > self.capacity:
+                self.overflowed += unread - self.capacity
+                self._read = self._written - self.capacity
+
+    def _view(self, end, count):
+        """View of the count samples before the end-th sample ever written."""
+        start = (end - count) % self.capacity
+        return self._data[start : start + count]
+
+    def latest(self, count):
+        """
+        Get a view of the newest samples without copying. The writer overwrites it once it
+        wraps around, so copy or convert it before the ring fills up again.
+
+        Args:
+            count (Int): Number of samples, at most the capacity
+
+        Returns:
+            ndarray: Up to count newest samples, oldest first
+        """
+        with self._lock:
+            count = min(count, self._written, self.capacity)
+            return self._view(self._written, count)
+
+    @property
+    def written(self):
+        """Total samples ever written, the cursor of a reader that is up to date."""
+        return self._written
+
+    def read_from(self, position, end=None):
+        """
+        Get a view of every sample written since a reader's own cursor, as far back as the
+        capacity allows, for rings with more than one reader. Same lifetime rules as
+        latest().
+
+        Args:
+            position (Int): Reader's cursor, from written or a previous call
+            end (Int) (optional): Stop before this sample, e.g. to stay lined up with
+                another ring that is a little behind (defaults to everything written)
+
+        Returns:
+            (ndarray, Int): New samples, oldest first, and the reader's new cursor. Fewer
+                than cursor difference samples means the rest was overwritten.
+        """
+        with self._lock:
+            end = self._written if end is None else min(end, self._written)
+            # the newest capacity samples are the only ones still held
+            count = max(0, min(end - position, self.capacity - (self._written - end)))
+            return self._view(end, count), end
+
+    def read_new(self):
+        """
+        Get a view of every sample written since the last call, as far back as the
+        capacity allows. Same lifetime rules as latest().
+
+        Returns:
+            ndarray: New samples, oldest first
+        """
+        with self._lock:
+            count = self._written - self._read
+            self._read = self._written
+            return self._view(self._written, count)
@@ -0,0 +1,101 @@
+"""
+Streaming polyphase resampler that brings the microphone audio down to the analysis rate.
+"""
+
+from fractions import Fraction
+import numpy as np
+
+
+class Decimator:
+    """
+    Resamples a stream from in_rate to out_rate.
+
+    Conceptually the input is upsampled by L, low-pass filtered and downsampled by M. The
+    polyphase form only computes the outputs that are kept: each output sample is the dot
+    product of the newest input samples with one of the L filter phases.
+    """
+
+    def __init__(self, in_rate, out_rate, taps_per_phase=32, cutoff=0.8, beta=8.0):
+        """
+        Args:
+            in_rate (Int): Sample rate of the input
+            out_rate (Int): Sample rate to produce, at most in_rate
+            taps_per_phase (Int) (optional): Filter length, in units of the larger of the
+                up and down factors. Longer is sharper but slower (defaults to 32)
+            cutoff (Float) (optional): Passband edge as a share of the output Nyquist
+                frequency (defaults to 0.8)
+            beta (Float) (optional): Kaiser window shape, 8 gives about 80 dB of stopband
+                attenuation (defaults to 8.0)
+        """
+        if out_rate > in_rate:
+            raise ValueError("Decimator can't raise the sample rate")
+
+        ratio = Fraction(int(out_rate), int(in_rate))
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+
+        # windowed sinc low-pass at the upsampled rate, gain up so the level is kept
+        factor = max(self.up, self.down)
+        length = taps_per_phase * factor
+        length += -length % self.up
+        fc = cutoff * 0.5 / factor  # cycles per upsampled sample
+        n = np.arange(length) - (length - 1) / 2
+        h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(length, beta) * self.up
+
+        # phases[p, j] = h[p + j * up], stored reversed so it lines up with a window of
+        # input samples in time order
+        self.phase_length = length // self.up
+        self.phases = h.reshape(self.phase_length, self.up).T[:, ::-1].copy()
+
+        # input samples the next outputs still need, starting at absolute index _start
+        self._history = np.zeros(self.phase_length - 1, dtype=np.float32)
+        self._start = -(self.phase_length - 1)
+        self._next = 0  # absolute index of the next output sample
+
+    def process(self, samples):
+        """
+        Resample the next chunk of the stream.
+
+        Args:
+            samples (ndarray): New float samples at in_rate
+
+        Returns:
+            ndarray: float32 samples at out_rate, every output the input now allows
+        """
+        if len(samples) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        buf = np.concatenate([self._history, samples])
+        end = self._start + len(buf)  # absolute index after the last input sample
+        # output n needs the input up to sample n * down // up
+        stop = (end * self.up + self.down - 1) // self.down
+        outputs = np.arange(self._next, stop)
+
+        position = outputs * self.down
+        first = position // self.up - self._start - (self.phase_length - 1)
+        step = buf.strides[0]
+        if self.up == 1:
+            # plain decimation, the windows are evenly spaced and can be a strided view
+            windows = np.lib.stride_tricks.as_strided(
+                buf[first[0] :] if len(first) else buf,
+                shape=(len(first), self.phase_length),
+                strides=(self.down * step, step),
+                writeable=False,
+            )
+            out = windows @ self.phases[0]
+        else:
+            windows = np.lib.stride_tricks.as_strided(
+                buf,
+                shape=(len(buf) - self.phase_length + 1, self.phase_length),
+                strides=(step, step),
+                writeable=False,
+            )
+            out = np.einsum("ij,ij->i", windows[first], self.phases[position % self.up])
+
+        self._next = stop
+        keep = self.phase_length - 1
+        self._history = buf[len(buf) - keep :]
+        self._start = end - keep
+        return out.astype(np.float32)
@@ -1,10 +1,29 @@
 import time
-import wave
 import os
+import queue
+import threading
 import pyaudio
 import numpy as np
 import sounddevice
 import librosa
+from robot.software.activity_detection import ActivityGate
+from robot.software.audio_buffer import AudioRingBuffer
+from robot.software.audio_frontend import Decimator
+from robot.software.beamforming import Beamformer
+from robot.software.feature_bus import FeatureBus
+from robot.software.melody_matcher import MelodyMatcher
+from robot.software.pitch_tracking import (
+    GoertzelBank,
+    frame_signal,
+    hz_to_midi,
+    midi_to_hz,
+    midi_to_note,
+    note_to_midi,
+    yin,
+)
+from robot.software.serial_audio import SAMPLE_RATE as ARRAY_RATE, SerialAudioReader
+
+PITCH_BACKENDS = ("pyin", "yin", "goertzel")
 
 
 def load_audio(filename: str):
@@ -17,14 +36,25 @@ def load_audio(filename: str):
     return y, sr
 
 
-def estimate_pitch(y, sr, fmin_note="C3", fmax_note="C7"):
+def estimate_pitch(y, sr, fmin_note="C3", fmax_note="C7", backend="pyin", notes=None):
     """
-    Estimate fundamental frequency (f0) using probabilistic YIN.
+    Estimate fundamental frequency (f0) using probabilistic YIN, the lighter
+    vectorized YIN from pitch_tracking, or a GoertzelBank listening for the given
+    MIDI notes.
     Return an array of all recognized frequences.
     """
-    f0, voiced_flag, _ = librosa.pyin(
-        y, fmin=librosa.note_to_hz(fmin_note), fmax=librosa.note_to_hz(fmax_note)
-    )
+    if backend not in PITCH_BACKENDS:
+        raise ValueError(f"Unknown pitch backend: {backend}")
+
+    fmin, fmax = librosa.note_to_hz(fmin_note), librosa.note_to_hz(fmax_note)
+    if backend == "yin":
+        f0, voiced_flag = yin(frame_signal(y, 2048, 512), sr, fmin, fmax)
+    elif backend == "goertzel":
+        bank = GoertzelBank(sr, notes, 2048)
+        midi, voiced_flag = bank.detect(frame_signal(y, 2048, 512))
+        f0 = midi_to_hz(midi)
+    else:
+        f0, voiced_flag, _ = librosa.pyin(y, fmin=fmin, fmax=fmax)
     return f0[voiced_flag]
 
 
@@ -51,99 +81,462 @@ def pitch_to_note(f0, min_instances=5):
     return cleaned_notes
 
 
+class StreamingPitch:
+    """
+    Runs a pitch tracker over streamed audio on one continuous frame grid, so pitch
+    frames line up across calls and nothing at a window boundary is lost.
+
+    The "yin" and "goertzel" backends can also read the frames from a FeatureBus on the
+    same grid through estimate(), instead of framing the audio themselves.
+    """
+
+    # FeatureBus feature each backend estimates from, pyin needs the raw audio
+    FEATURES = {"yin": "frames", "goertzel": "spectrum"}
+
+    def __init__(
+        self,
+        sr,
+        fmin_note="C3",
+        fmax_note="C7",
+        min_frames=8,
+        backend="yin",
+        notes=None,
+    ):
+        """
+        Args:
+            sr (Int): Sample rate of the stream
+            fmin_note (String) (optional): Lowest note to track (defaults to "C3")
+            fmax_note (String) (optional): Highest note to track (defaults to "C7")
+            min_frames (Int) (optional): Fewest new pitch frames worth a tracker call
+                (defaults to 8)
+            backend (String) (optional): "yin" for the vectorized NumPy YIN, "pyin" for
+                librosa's probabilistic YIN, or "goertzel" to only listen for the given
+                notes with a GoertzelBank (defaults to "yin")
+            notes (list<Int>) (optional): MIDI numbers of the notes the "goertzel"
+                backend listens for
+        """
+        if backend not in PITCH_BACKENDS:
+            raise ValueError(f"Unknown pitch backend: {backend}")
+
+        self.sr = sr
+        self.backend = backend
+        # same window length in seconds as librosa's default of 2048 at 22050 Hz
+        self.frame_length = 2 ** int(np.ceil(np.log2(2048 * sr / 22050)))
+        self.hop_length = self.frame_length // 4
+        self.fmin = librosa.note_to_hz(fmin_note)
+        self.fmax = librosa.note_to_hz(fmax_note)
+        self.min_frames = min_frames
+        self.pending = np.zeros(0, dtype=np.float32)  # samples not yet fully analyzed
+
+        self.bank = None
+        if backend == "goertzel":
+            self.bank = GoertzelBank(sr, notes, self.frame_length)
+
+    def process(self, samples):
+        """
+        Add samples and estimate pitch for every frame that is now complete.
+
+        Args:
+            samples (ndarray): New float samples
+
+        Returns:
+            ndarray: Frequencies of the voiced frames, in order
+        """
+        self.pending = np.concatenate([self.pending, samples])
+        if len(self.pending) < self.frame_length:
+            return np.zeros(0)
+        n_frames = 1 + (len(self.pending) - self.frame_length) // self.hop_length
+        if n_frames < self.min_frames:
+            return np.zeros(0)
+
+        used = (n_frames - 1) * self.hop_length + self.frame_length
+        if self.backend == "yin":
+            frames = frame_signal(self.pending[:used], self.frame_length, self.hop_length)
+            f0, voiced_flag = yin(frames, self.sr, self.fmin, self.fmax)
+        elif self.backend == "goertzel":
+            frames = frame_signal(self.pending[:used], self.frame_length, self.hop_length)
+            notes, voiced_flag = self.bank.detect(frames)
+            f0 = midi_to_hz(notes)
+        else:
+            f0, voiced_flag, _ = librosa.pyin(
+                self.pending[:used],
+                fmin=self.fmin,
+                fmax=self.fmax,
+                sr=self.sr,
+                frame_length=self.frame_length,
+                hop_length=self.hop_length,
+                center=False,
+            )
+        # keep what the next frame on the grid still needs
+        self.pending = self.pending[n_frames * self.hop_length :]
+        return f0[voiced_flag]
+
+    def estimate(self, features):
+        """
+        Estimate pitch from FeatureBus frames instead of raw samples.
+
+        Args:
+            features (ndarray): Frames of the bus feature in FEATURES for this backend,
+                on this tracker's frame_length and hop_length
+
+        Returns:
+            ndarray: Frequencies of the voiced frames, in order
+        """
+        if self.backend == "yin":
+            f0, voiced_flag = yin(features, self.sr, self.fmin, self.fmax)
+        elif self.backend == "goertzel":
+            notes, voiced_flag = self.bank.detect_spectrum(features)
+            f0 = midi_to_hz(notes)
+        else:
+            raise ValueError(f"The {self.backend} backend needs the raw audio")
+        return f0[voiced_flag]
+
+    def skip(self, samples):
+        """
+        Add samples without analyzing them, e.g. silence. The last frame's worth is kept,
+        so a note starting right after still has its first frame.
+
+        Args:
+            samples (ndarray): New float samples
+        """
+        self.pending = np.concatenate([self.pending, samples])[-self.frame_length :]
+
+
+class NoteSegmenter:
+    """
+    Streaming version of pitch_to_note, a run of notes can continue into the next call.
+    Notes are integer MIDI numbers, so runs are found with array comparisons.
+    """
+
+    def __init__(self, min_instances=5):
+        """
+        Args:
+            min_instances (Int) (optional): Consecutive frames a note needs to count
+                (defaults to 5)
+        """
+        self.min_instances = min_instances
+        self.current = None  # MIDI number of the run still in progress
+        self.count = 0
+
+    def process(self, f0):
+        """
+        Args:
+            f0 (ndarray): Voiced frequencies, in order
+
+        Returns:
+            list<Int>: MIDI numbers of the notes whose runs ended in these frequencies
+        """
+        if len(f0) == 0:
+            return []
+        midi = hz_to_midi(f0)
+
+        # runs of equal notes
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(midi)) + 1))
+        lengths = np.diff(np.append(starts, len(midi)))
+        values = midi[starts]
+
+        if values[0] == self.current:
+            lengths[0] += self.count
+        elif self.current is not None:
+            values = np.concatenate(([self.current], values))
+            lengths = np.concatenate(([self.count], lengths))
+
+        # every run but the last has ended
+        self.current, self.count = int(values[-1]), int(lengths[-1])
+        ended = values[:-1][lengths[:-1] >= self.min_instances]
+        return [int(note) for note in ended]
+
+    def flush(self):
+        """
+        End the run in progress, e.g. when the sound stops. Otherwise the last note of a
+        melody only counts once another note follows it.
+
+        Returns:
+            list<Int>: MIDI number of the run's note, if it was long enough
+        """
+        ended = []
+        if self.current is not None and self.count >= self.min_instances:
+            ended = [self.current]
+        self.current, self.count = None, 0
+        return ended
+
+
 class CollectAudio:
 
     WIDTH = 2
     CHANNELS = 1
     RATE = 44100
+    # the melody tops out at C5 (523 Hz), so analysis doesn't need the capture rate
+    ANALYSIS_RATE = 11025
 
     MELODY = np.array(["A4", "A♯4", "G4", "A4", "D4", "A4", "F4", "C5"])
+    MELODY_MIDI = [note_to_midi(note) for note in MELODY]
+    TREAT_MELODY = "treat"  # name of the melody that calls the robot for a treat
+
+    def __init__(
+        self,
+        buffer_seconds=10,
+        pitch_backend="yin",
+        use_listener=True,
+        max_incorrect_notes=-1,
+        use_gate=True,
+        analysis_rate=ANALYSIS_RATE,
+        array_port=None,
+    ):
+        """
+        Args:
+            buffer_seconds (Float) (optional): Seconds of audio kept for the analysis
+                (defaults to 10)
+            pitch_backend (String) (optional): "yin", "pyin" or "goertzel", see
+                StreamingPitch (defaults to "yin")
+            use_listener (Boolean) (optional): Analyze on a MelodyListener thread instead
+                of in detect_melody() (defaults to True)
+            max_incorrect_notes (Int) (optional): Maximum number of incorrect notes that can be
+                between correct notes of the treat melody. If -1, then there is no limit to
+                incorrect notes. Defaults to -1
+            use_gate (Boolean) (optional): Skip the pitch analysis while an ActivityGate
+                hears no sound (defaults to True)
+            analysis_rate (Int) (optional): Rate the captured audio is decimated to before
+                any analysis, e.g. 8000-11025 (defaults to ANALYSIS_RATE)
+            array_port (String) (optional): Serial port of the Arduino's 3 microphone
+                array. If given, melodies are detected on the array's channels combined
+                by a Beamformer, instead of on the default input device, and the
+                analysis rate is at most the array's 7500 Hz (defaults to None)
+        """
+        self.matcher = MelodyMatcher()
+        self.matcher.add(
+            CollectAudio.TREAT_MELODY, CollectAudio.MELODY_MIDI, max_incorrect_notes
+        )
+        self.heard = []  # every melody heard by the last detect_melody()
 
-    def __init__(self):
-        self.num_correct_notes = 0
+        # the microphone array, steered toward the loudest sound, or the default input
+        self.array = None
+        self.beamformer = None
+        capture_rate = CollectAudio.RATE
+        if array_port is not None:
+            self.array = SerialAudioReader(array_port, buffer_seconds=buffer_seconds)
+            self.beamformer = Beamformer(ARRAY_RATE)
+            self._array_cursor = 0
+            capture_rate = ARRAY_RATE
+            analysis_rate = min(analysis_rate, ARRAY_RATE)
 
-        self.p = pyaudio.PyAudio()
-        self.frames = []
+        self.analysis_rate = analysis_rate
+        # runs in analyze(), so everything after it works on the smaller stream while the
+        # audio callback only copies raw samples
+        self.frontend = Decimator(capture_rate, analysis_rate)
+        # raw int16 capture from the default input, the array has its own ring
+        self.buffer = None
+        if self.array is None:
+            self.buffer = AudioRingBuffer(int(buffer_seconds * capture_rate))
+        self.pitch = StreamingPitch(
+            analysis_rate, backend=pitch_backend, notes=CollectAudio.MELODY_MIDI
+        )
+        self.notes = NoteSegmenter(min_instances=2)
+        self.gate = ActivityGate(analysis_rate) if use_gate else None
+
+        # shared transforms on the pitch tracker's grid, other consumers subscribe too
+        self.features = FeatureBus(
+            analysis_rate, self.pitch.frame_length, self.pitch.hop_length
+        )
+        self.pitch_input = None
+        if pitch_backend in StreamingPitch.FEATURES:
+            self.pitch_input = self.features.subscribe(
+                StreamingPitch.FEATURES[pitch_backend]
+            )
 
         def callback(in_data, frame_count, time_info, status):
             """
             Callback function to be called for audio data
             """
-            self.frames.append(in_data)
+            self.buffer.write(in_data)
             return in_data, pyaudio.paContinue
 
-        self.stream = self.p.open(
-            format=self.p.get_format_from_width(CollectAudio.WIDTH),
-            channels=CollectAudio.CHANNELS,
-            rate=CollectAudio.RATE,
-            input=True,
-            output=False,
-            stream_callback=callback,
-        )
+        self.p = None
+        self.stream = None
+        if self.array is not None:
+            self.array.start()
+        else:
+            self.p = pyaudio.PyAudio()
+            self.stream = self.p.open(
+                format=self.p.get_format_from_width(CollectAudio.WIDTH),
+                channels=CollectAudio.CHANNELS,
+                rate=CollectAudio.RATE,
+                input=True,
+                output=False,
+                stream_callback=callback,
+            )
+            self.stream.start_stream()
 
         self.last_sample = time.time()
-        self.stream.start_stream()
 
-    def __del__(self):
-        self.stream.stop_stream()
-        self.stream.close()
+        self.listener = None
+        if use_listener:
+            self.listener = MelodyListener(self)
+            self.listener.start()
 
-        self.p.terminate()
+    def __del__(self):
+        if self.listener is not None:
+            self.listener.stop()
+        if self.array is not None:
+            self.array.stop()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.p.terminate()
 
-    def detect_melody(self, save_interval=2, max_incorrect_notes=-1):
+    def add_melody(self, name, notes, max_incorrect_notes=-1):
         """
-        Save audio if more than 2 seconds has passed since the last save, and detect notes
+        Listen for another melody, e.g. for a new command.
 
         Args:
-            save_interval (Int) (optional): Number of seconds between each save (defaults to 2)
-            max_incorrect_notes (Int) (optional): Maximum number of incorrect notes that can be
-                between correct notes. If -1, then there is no limit to incorrect notes. Defaults
-                to -1
+            name (String): Melody name, reported in self.heard
+            notes (list<String>): Note names, e.g. ["A4", "C5"]
+            max_incorrect_notes (Int) (optional): See MelodyMatcher.add() (defaults to -1)
+        """
+        midi = [note_to_midi(note) for note in notes]
+        self.matcher.add(name, midi, max_incorrect_notes)
+
+    def analyze(self):
+        """
+        Analyze the audio collected since the last analysis and detect notes. Pitch, note
+        and melody state carry over between calls, so notes and melodies that straddle
+        two analyses are still found.
 
         Returns:
-            Boolean: Whether or not the notes match the set melody
-        """
-        is_melody = False
-        if time.time() - self.last_sample >= save_interval:
-
-            media_dir = os.path.join(os.path.dirname(__file__), "..", "..", "media")
-            audio_path = os.path.join(media_dir, "output.wav")
-            with wave.open(audio_path, "wb") as wf:
-                wf.setnchannels(CollectAudio.CHANNELS)
-                wf.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
-                wf.setframerate(CollectAudio.RATE)
-                wf.writeframes(b"".join(self.frames))
-
-            y, sr = load_audio("output.wav")
-            f0 = estimate_pitch(y, sr)
-            if len(f0) != 0:  # if there are detected pitches
-                notes = pitch_to_note(f0, min_instances=2)
-                print(notes)
-
-                while True:
-                    next_note: str = CollectAudio.MELODY[self.num_correct_notes]
-                    try:
-                        index_of_note: int = notes.index(next_note)
-                    except ValueError:  # next correct note was not found
-                        break
-
-                    # note exists and there's not that many incorrect notes, or ignore incorrect notes if -1
-                    if (
-                        index_of_note <= max_incorrect_notes
-                        or max_incorrect_notes == -1
-                    ):
-                        self.num_correct_notes += 1  # increment correct notes
-                        notes = notes[
-                            index_of_note + 1 :
-                        ]  # cut off already used part of notes array
-                        if self.num_correct_notes == len(
-                            CollectAudio.MELODY
-                        ):  # if entire melody is there
-                            self.num_correct_notes = 0  # reset correct notes
-                            is_melody = True
-                            break
+            list<String>: Names of the melodies completed by the new notes
+        """
+        if self.array is not None:
+            samples = self._pull_array()
+        else:
+            # the int16 view goes straight into the decimator, only its output is scaled
+            samples = self.frontend.process(self.buffer.read_new()) / np.float32(32768)
+        if self.gate is not None and not self.gate.process(samples):
+            # silence, so the note in progress is over
+            self.features.skip(samples)
+            self.pitch.skip(samples)
+            notes = self.notes.flush()
+        else:
+            self.features.process(samples)
+            if self.pitch_input is not None:
+                f0 = self.pitch.estimate(self.pitch_input.read())
+            else:
+                f0 = self.pitch.process(samples)
+            notes = self.notes.process(f0)
+        if len(notes) == 0:
+            return []
+
+        print([midi_to_note(note) for note in notes])
+        return self.matcher.feed_many(notes)
+
+    def _pull_array(self):
+        """Steer and decimate the array samples that arrived since the last call."""
+        samples, self._array_cursor = self.array.parser.read_from(self._array_cursor)
+        steered = self.beamformer.process(samples.astype(np.float32) / 32768)
+        return self.frontend.process(steered)
+
+    def detect_melody(self, save_interval=2):
+        """
+        Check whether the treat melody was heard. With a listener thread running this only
+        collects its events and never waits on the analysis. Otherwise the audio is
+        analyzed here if more than save_interval seconds have passed since the last time.
+        Every melody heard, including the other registered ones, is left in self.heard.
 
+        Args:
+            save_interval (Int) (optional): Number of seconds between each analysis without
+                a listener (defaults to 2)
+
+        Returns:
+            Boolean: Whether or not the treat melody was heard
+        """
+        if self.listener is not None:
+            self.heard = [name for _, name in self.listener.drain()]
+        elif time.time() - self.last_sample >= save_interval:
+            self.heard = self.analyze()
             self.last_sample = time.time()
-            self.frames = []
+        else:
+            self.heard = []
+
+        return CollectAudio.TREAT_MELODY in self.heard
+
+
+class MelodyListener(threading.Thread):
+    """
+    Runs the melody analysis on its own thread, so the control loop never waits on it.
+    Each time a melody is heard, its time and name go into a queue for the control loop.
+    """
+
+    def __init__(self, collector, hop_seconds=0.25):
+        """
+        Args:
+            collector (CollectAudio): Audio source and analysis state
+            hop_seconds (Float) (optional): Seconds between analyses (defaults to 0.25)
+        """
+        super().__init__(daemon=True)
+        self.collector = collector
+        self.hop_seconds = hop_seconds
+        self.events = queue.Queue()
+        self._running = True
+
+        # latency metrics, in seconds
+        self.hops = 0
+        self.total_analysis_time = 0.0
+        self.max_analysis_time = 0.0
+        self.events_heard = 0
+        self.max_event_wait = 0.0  # from detection until the control loop collected it
+
+    def run(self):
+        next_hop = time.monotonic()
+        while self._running:
+            next_hop += self.hop_seconds
+            remaining = next_hop - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                next_hop = time.monotonic()  # analysis fell behind, don't try to catch up
+
+            start = time.monotonic()
+            heard = self.collector.analyze()
+            finished = time.monotonic()
+
+            self.hops += 1
+            elapsed = finished - start
+            self.total_analysis_time += elapsed
+            self.max_analysis_time = max(self.max_analysis_time, elapsed)
+            for name in heard:
+                self.events_heard += 1
+                self.events.put((finished, name))
+
+    def drain(self):
+        """
+        Collect every melody event without waiting.
+
+        Returns:
+            list<(Float, String)>: Monotonic time each melody was heard at, and its name
+        """
+        heard = []
+        while True:
+            try:
+                heard.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        now = time.monotonic()
+        for timestamp, _ in heard:
+            self.max_event_wait = max(self.max_event_wait, now - timestamp)
+        return heard
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of analyses, mean and max analysis time, melodies heard and the
+                longest an event waited to be collected, in seconds
+        """
+        return {
+            "hops": self.hops,
+            "mean_analysis": self.total_analysis_time / max(self.hops, 1),
+            "max_analysis": self.max_analysis_time,
+            "events": self.events_heard,
+            "max_event_wait": self.max_event_wait,
+        }
 
-        return is_melody
+    def stop(self):
+        self._running = False
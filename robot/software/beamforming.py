@@ -0,0 +1,137 @@
+"""
+Delay-and-sum beamformer for the 3 microphone array, steered by SoundLocalizer.
+"""
+
+import numpy as np
+from robot.software.localization import (
+    MIC_ANGLES,
+    RADIUS,
+    SPEED_OF_SOUND,
+    SoundLocalizer,
+)
+from robot.software.pitch_tracking import frame_signal, hann_window
+
+
+class Beamformer:
+    """
+    Combines the microphone channels into one signal steered at the strongest source.
+    Sound from the steered bearing adds up in phase on every channel, while noise that
+    differs between the microphones partly cancels.
+    """
+
+    def __init__(
+        self,
+        sr,
+        frame_length=512,
+        hop_length=256,
+        min_confidence=0.2,
+        radius=RADIUS,
+        mic_angles=MIC_ANGLES,
+    ):
+        """
+        Args:
+            sr (Int): Sample rate of every channel
+            frame_length (Int) (optional): Samples per window (defaults to 512)
+            hop_length (Int) (optional): Samples between windows, must divide
+                frame_length (defaults to 256)
+            min_confidence (Float) (optional): SoundLocalizer confidence needed to steer
+                to a new bearing (defaults to 0.2)
+            radius (Float) (optional): Radius of the microphone circle in meters
+                (defaults to 10.5 inches)
+            mic_angles (tuple) (optional): Direction of each microphone in degrees,
+                counterclockwise from the front (defaults to forward, left, right)
+        """
+        if frame_length % hop_length != 0:
+            raise ValueError("hop_length must divide frame_length")
+
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.min_confidence = min_confidence
+        self.localizer = SoundLocalizer(
+            sr, frame_length, hop_length, radius=radius, mic_angles=mic_angles
+        )
+        self.channels = len(mic_angles)
+        self.pending = np.zeros((self.channels, 0), dtype=np.float32)
+
+        # periodic Hann windows overlap-add to a constant, divided out after synthesis
+        self.window = hann_window(frame_length)
+        self.overlap = frame_length // hop_length
+        self._gain = self.window.reshape(self.overlap, hop_length).sum(axis=0)
+        # newest overlap - 1 windows, still missing the windows after them
+        self._tail = np.zeros((self.overlap - 1, self.overlap, hop_length))
+
+        # steering[b, i, k]: undoes microphone i's early arrival from bearing b at bin k,
+        # and averages the channels
+        theta = np.radians(self.localizer.bearings)[:, None]
+        phi = np.radians(np.asarray(mic_angles))[None, :]
+        early = radius * np.cos(theta - phi) / SPEED_OF_SOUND  # (bearings, mics)
+        frequencies = np.fft.rfftfreq(frame_length, 1 / sr)
+        self._steering = (
+            np.exp(-2j * np.pi * early[:, :, None] * frequencies) / self.channels
+        ).astype(np.complex64)
+
+        self.bearing = 0.0  # starts out facing forward
+        self._bearing_index = int(np.argmin(np.abs(self.localizer.bearings)))
+
+    def process(self, samples):
+        """
+        Add samples of every channel and get the steered signal for every hop that is now
+        complete. Output sample i lines up with input sample i, but the last
+        frame_length - hop_length samples given wait for the windows after them.
+
+        Args:
+            samples (ndarray): (channels, n) new float samples, lined up in time
+
+        Returns:
+            ndarray: float32 steered samples, a multiple of hop_length of them
+        """
+        self.pending = np.concatenate([self.pending, samples], axis=1)
+        if self.pending.shape[1] < self.frame_length:
+            return np.zeros(0, dtype=np.float32)
+
+        # (windows, channels, frame_length) views, every channel on the same grid
+        frames = np.stack(
+            [
+                frame_signal(channel, self.frame_length, self.hop_length)
+                for channel in self.pending
+            ],
+            axis=1,
+        )
+        self.pending = self.pending[:, len(frames) * self.hop_length :]
+
+        steering = self._steer(frames)
+        spectra = np.fft.rfft(frames * self.window, axis=2)
+        combined = np.einsum("wck,wck->wk", spectra, steering)
+        windows = np.fft.irfft(combined, self.frame_length, axis=1)
+        return self._overlap_add(windows)
+
+    def _steer(self, frames):
+        """Steering table row per window, held at the last confident bearing."""
+        bearing, confidence = self.localizer.locate(frames)
+        confident = confidence >= self.min_confidence
+        found = np.rint(
+            (bearing[confident] - self.localizer.bearings[0])
+            / (self.localizer.bearings[1] - self.localizer.bearings[0])
+        ).astype(int)
+        # each window uses the newest confident bearing so far, the held one before any
+        indices = np.concatenate([[self._bearing_index], found])
+        rows = indices[np.cumsum(confident)]
+
+        self._bearing_index = int(rows[-1])
+        self.bearing = float(self.localizer.bearings[self._bearing_index])
+        return self._steering[rows]
+
+    def _overlap_add(self, windows):
+        """Sum each hop of output from the windows that cover it."""
+        blocks = windows.reshape(len(windows), self.overlap, self.hop_length)
+        blocks = np.concatenate([self._tail, blocks])
+        count = len(windows)
+        # hop w is block r of window w - r, for every r
+        out = sum(
+            blocks[self.overlap - 1 - r : self.overlap - 1 - r + count, r]
+            for r in range(self.overlap)
+        )
+        if self.overlap > 1:
+            self._tail = blocks[-(self.overlap - 1) :]
+        return (out / self._gain).reshape(-1).astype(np.float32)
@@ -2,18 +2,28 @@ import time
 import random
 from robot.software.berry_detection import BerryDetection
 from robot.software.audio_processing import CollectAudio
+from robot.software.scheduling import SensorScheduler
+from robot.software.telemetry import TelemetryReader
 
 
 class StateManager:
 
-    def __init__(self, arduino):
+    def __init__(self, arduino, use_vision_worker=False):
         """
         Manages robot states and behavior signals based on input signals
         Handles prioritization of behaviors and idle behavior loop.
+
+        Args:
+            arduino (serial.Serial): Serial connection to the Arduino
+            use_vision_worker (Boolean) (optional): Run camera capture and analysis in a
+                separate process (defaults to False)
         """
-        self.berry_detection = BerryDetection()
+        self.berry_detection = BerryDetection(use_worker=use_vision_worker)
         self.audio_collector = CollectAudio()
         self.arduino = arduino
+        # button and encoders come back as telemetry frames, parsed on their own thread
+        self.telemetry = TelemetryReader(arduino)
+        self.telemetry.start()
 
         # Run signals: 1 = active, 0 = inactive
         # Priority is order in dict (earlier = higher priority)
@@ -33,6 +43,16 @@ class StateManager:
         }
         # active behavior durations are in their run signal logics
 
+        # Sensor rates: seconds between readings (0 = every tick), and states where a
+        # reading can't change the decision because a higher priority behavior is running
+        self.sensor_scheduler = SensorScheduler()
+        self.sensor_scheduler.add("button", 0)
+        # melody analysis runs on its own thread, this only collects its events
+        self.sensor_scheduler.add("melody", 0.1, disabled_states=["run_petted"])
+        self.sensor_scheduler.add(
+            "darkness", 0.25, disabled_states=["run_petted", "run_look_for_treat"]
+        )
+
         self.run_signal = 0
         self.state = "default"
 
@@ -54,12 +74,11 @@ class StateManager:
 
     def update_petted(self, now):
         """Check button press and update petted behavior."""
-        line = self.arduino.read(1)  # Read 1 byte
-        if line:
-            # Decode byte to string and strip whitespace
-            self.button_pressed = line.decode()
+        if self.sensor_scheduler.due("button", now, self.state):
+            # pressed now or at any point since the last check, never waits on the port
+            self.button_pressed = self.telemetry.button_pressed()
 
-        if self.button_pressed == "1":
+        if self.button_pressed:
             self.petted_start = now
             self.run_signals["run_look_for_treat"] = 0
             self.look_for_treat_start = None
@@ -74,7 +93,12 @@ class StateManager:
 
     def update_melody(self, now):
         """Check for melody detection and update look for treat behavior."""
-        self.heard_melody = self.audio_collector.detect_melody()
+        self.heard_melody = False
+        if not self.sensor_scheduler.enabled("melody", self.state):
+            # melodies heard now are stale by the time they'd be acted on, drop them
+            self.audio_collector.detect_melody()
+        elif self.sensor_scheduler.due("melody", now, self.state):
+            self.heard_melody = self.audio_collector.detect_melody()
         if self.heard_melody:
             self.look_for_treat_start = now
 
@@ -88,7 +112,11 @@ class StateManager:
 
     def update_sleep(self, now):
         """Check darkness and update sleep behavior."""
-        self.dark = self.berry_detection.get_darkness()
+        if not self.sensor_scheduler.enabled("darkness", self.state):
+            # no new readings in this state, don't keep acting on the last one
+            self.dark = False
+        elif self.sensor_scheduler.due("darkness", now, self.state):
+            self.dark = self.berry_detection.get_darkness()
         # 1 if dark environment, 0 if not
         if self.dark:
             self.sleep_start = now
@@ -104,6 +132,7 @@ class StateManager:
         """
         Update all run signals and set current active behavior.
         Their order in the list matters of more than 1 happens the same time.
+        Sensors are only read when sensor_scheduler says they are due.
         """
         self.update_petted(now)
         self.update_melody(now)
@@ -9,7 +9,11 @@ import struct
 import math
 from enum import IntEnum
 import robot.software.eye_display as eye_display
-from robot.software.berry_detection import BerryDetection
+
+
+# leftMotor rightMotor ear tail bright leftEye rightEye, compiled once. The eye rows are
+# bytes, so "8s" packs the same bytes as the eight "B" fields of "<BBBBB8B8B" did
+ACTUATOR_PACKET = struct.Struct("<BBBBB8s8s")
 
 
 class Parameters(IntEnum):
@@ -40,11 +44,16 @@ class RobotBehaviors:
         self.left_eye.set_state(self.left_eye.eye_with_position((1, 1)))
         self.right_eye.set_state(self.right_eye.eye_with_position((2, 1)))
 
+        # build_packet() packs into this buffer every tick instead of allocating
+        self._packet = bytearray(ACTUATOR_PACKET.size)
+        self._packet_view = memoryview(self._packet)
+
         self.manager = manager
         self.state = self.manager.state
         self.behavior = self.default
 
-        self.berry_detection = BerryDetection()
+        # shared with the manager so each frame is only analyzed once
+        self.berry_detection = self.manager.berry_detection
 
         self._wag_direction = 1  # 1 = increasing, -1 = decreasing
         self._ear_direction = 1
@@ -81,6 +90,10 @@ class RobotBehaviors:
         """
         <BB B B B 8s 8s>
         leftMotor rightMotor ear tail bright leftEye rightEye
+
+        Returns:
+            memoryview: The packet, a view of a buffer the next call overwrites, so copy
+                it with bytes() to keep it
         """
         # pack:
         # Serial Data format: (21 byte packet)
@@ -92,16 +105,18 @@ class RobotBehaviors:
         # Bytes 5-12 = Array for the left eye
         # Bytes 13-20 = Array for the right eye
 
-        return struct.pack(
-            "<BBBBB8B8B",
+        ACTUATOR_PACKET.pack_into(
+            self._packet,
+            0,
             int(self.left_speed + 127),
             int(self.right_speed + 127),
             int(self.ear),
             int(self.tail),
             self.eye_brightness,
-            *self.left_eye.current_state,
-            *self.right_eye.current_state,
+            self.left_eye.current_state,
+            self.right_eye.current_state,
         )
+        return self._packet_view
 
     def default(self):
         """
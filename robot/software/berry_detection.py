@@ -1,27 +1,304 @@
 from math import floor
+from typing import NamedTuple
 import numpy as np
 import cv2 as cv
+from robot.software.camera import get_camera
+from robot.software.color_segmentation import ColorSegmenter
+from robot.software.brightness import BrightnessEstimator, frame_value
+from robot.software.vision_worker import VisionWorker
 
-cap = cv.VideoCapture(0)
-if not cap.isOpened():
-    print("Cannot open camera")
-    raise Exception("you suck")
-else:
-    print("opened camera")
+
+class TargetDetection(NamedTuple):
+    """Where one colour target is in a frame."""
+
+    name: str
+    position: tuple | None  # (x, y) in the rotated frame, or None
+    area: float  # number of matching pixels
+
+
+class FrameAnalysis(NamedTuple):
+    """Everything the robot needs from one camera frame, computed together."""
+
+    frame_id: int
+    timestamp: float  # monotonic capture time
+    brightness: float  # mean HSV value of a pixel subsample (0-255)
+    berry_position: tuple | None  # (x, y) in the rotated frame, or None
+    berry_area: float  # number of red pixels
+    targets: tuple = ()  # TargetDetection for every colour target
+
+
+def _locate(binary_image, x0, y0, scale, width):
+    """
+    Find the centroid of a mask, mapped to full resolution rotated frame coordinates.
+
+    Returns:
+        ((float, float) or None, Float): Position, or None if the mask is empty, and area
+    """
+    moments = cv.moments(binary_image, True)
+    if moments["m00"] == 0:
+        return None, 0.0
+
+    # back to full resolution pixel centers
+    center_x, center_y = (
+        (moments["m10"] / moments["m00"] + x0 + 0.5) * scale - 0.5,
+        (moments["m01"] / moments["m00"] + y0 + 0.5) * scale - 0.5,
+    )
+    return (center_y, width - 1 - center_x), moments["m00"] * scale**2
+
+
+def analyze_frame(
+    frame, timestamp=None, frame_id=0, pyramid_levels=0, roi=None, segmenter=None
+):
+    """
+    Run all per-frame vision work in one pass: the brightness comes from a pixel
+    subsample, and only the searched part of the frame is segmented.
+
+    The camera is mounted sideways, so berry positions are reported in the frame rotated
+    90 degrees counterclockwise. Instead of rotating every pixel, the centroid is mapped
+    into rotated coordinates: (x, y) -> (y, width - 1 - x).
+
+    Args:
+        frame (ndarray): BGR frame from the camera
+        timestamp (Float) (optional): Capture time of the frame
+        frame_id (Int) (optional): Id of the frame from the capture thread
+        pyramid_levels (Int) (optional): Number of times to halve the frame before
+            analyzing it (defaults to 0, full resolution)
+        roi ((int, int, int, int)) (optional): (x0, y0, x1, y1) box in unrotated full
+            resolution pixels to search for the berry in, defaults to the whole frame
+        segmenter (ColorSegmenter) (optional): Lookup table segmenter to label all of its
+            colour targets at once, the first target is the berry. Defaults to the red HSV
+            ranges
+
+    Returns:
+        FrameAnalysis: Results for the frame, in full resolution coordinates
+    """
+    small = frame
+    for _ in range(pyramid_levels):
+        small = cv.pyrDown(small)
+    scale = 2**pyramid_levels
+    width = frame.shape[1]
+    brightness = frame_value(small, max(1, 8 // scale))
+
+    x0, y0 = 0, 0
+    x1, y1 = small.shape[1], small.shape[0]
+    if roi is not None:
+        x0, y0 = roi[0] // scale, roi[1] // scale
+        x1, y1 = roi[2] // scale, roi[3] // scale
+
+    targets = []
+    if segmenter is not None:
+        labels = segmenter.label(small[y0:y1, x0:x1])
+        for name in segmenter.names:
+            mask = segmenter.mask(labels, name)
+            targets.append(TargetDetection(name, *_locate(mask, x0, y0, scale, width)))
+    else:
+        search = cv.cvtColor(small[y0:y1, x0:x1], cv.COLOR_BGR2HSV)
+        # use hue values 0-10 *and* 170-180 to account for wrapping, because
+        # that's where red is in hsv space
+        binary_image_1 = cv.inRange(search, (0, 60, 60), (10, 255, 130))
+        binary_image_2 = cv.inRange(search, (170, 60, 60), (180, 255, 130))
+        # OR instead of uint8 +, which wraps where the ranges overlap
+        binary_image = cv.bitwise_or(binary_image_1, binary_image_2)
+        targets.append(TargetDetection("red", *_locate(binary_image, x0, y0, scale, width)))
+
+    berry = targets[0]
+    return FrameAnalysis(
+        frame_id, timestamp, brightness, berry.position, berry.area, tuple(targets)
+    )
+
+
+def unrotate(position, width):
+    """Map a berry position back from the rotated frame to camera pixels."""
+    return width - 1 - position[1], position[0]
 
 
 class BerryDetection:
 
-    def get_darkness(self):
-        ret, frame = cap.read()
-        # if frame is read correctly ret is True
-        if not ret:
+    def __init__(
+        self,
+        camera=None,
+        pyramid_levels=1,
+        track=True,
+        min_area=20,
+        targets=None,
+        brightness_mode="pixels",
+        use_worker=False,
+        redetect_interval=30,
+    ):
+        """
+        Args:
+            camera (CameraCapture) (optional): Capture thread to read frames from, defaults
+                to the shared camera
+            pyramid_levels (Int) (optional): Number of times to halve frames before
+                analyzing them (defaults to 1)
+            track (Boolean) (optional): Once the berry is found, only search a region
+                around it on the next frames (defaults to True)
+            min_area (Float) (optional): Fewest red pixels (full resolution) that count as
+                a lock on the berry (defaults to 20)
+            targets (tuple<ColorTarget>) (optional): Colours to track with the lookup
+                table segmenter, the first one is the berry. Defaults to None, which
+                segments red in HSV
+            brightness_mode (String) (optional): How get_darkness() measures brightness,
+                "pixels" or "exposure", see BrightnessEstimator (defaults to "pixels")
+            use_worker (Boolean) (optional): Run capture and analysis in a VisionWorker
+                process instead of this one. Berry results then only cover the berry,
+                not every colour target (defaults to False)
+            redetect_interval (Int) (optional): While tracking, search the whole frame
+                every this many frames, so a blob inside a stale box can't hold the lock
+                (defaults to 30)
+        """
+        self.worker = None
+        self.camera = None
+        if use_worker:
+            self.worker = VisionWorker(
+                pyramid_levels=pyramid_levels,
+                track=track,
+                min_area=min_area,
+                targets=targets,
+                redetect_interval=redetect_interval,
+            )
+            self.worker.start()
+        else:
+            self.camera = camera if camera is not None else get_camera()
+        self.pyramid_levels = pyramid_levels
+        self.track = track
+        self.min_area = min_area
+        self.segmenter = ColorSegmenter(targets) if targets is not None else None
+        self.brightness = BrightnessEstimator(brightness_mode)
+        self._analysis = None
+        self._roi = None  # search box around the last berry position
+        self.redetect_interval = redetect_interval
+        self._since_full = 0  # frames analyzed since the last full frame search
+
+    def _update_roi(self, analysis, frame_shape):
+        """Center the next search box on the berry, or clear it if the berry was lost."""
+        if analysis.berry_position is None or analysis.berry_area < self.min_area:
+            self._roi = None
+            return
+
+        height, width = frame_shape[:2]
+        x, y = unrotate(analysis.berry_position, width)
+        # a box a few berry-widths wide, so normal motion between frames stays inside it
+        half = max(48, int(3 * np.sqrt(analysis.berry_area)))
+        self._roi = (
+            max(0, int(x) - half),
+            max(0, int(y) - half),
+            min(width, int(x) + half),
+            min(height, int(y) + half),
+        )
+
+    def _analyze(self, frame, timestamp, frame_id):
+        """
+        Analyze a frame, searching the tracking box first and the whole frame if the box
+        lost the berry, or every redetect_interval frames.
+        """
+        roi = self._roi if self.track else None
+        if self._since_full + 1 >= self.redetect_interval:
+            roi = None
+        analysis = None
+        if roi is not None:
+            analysis = analyze_frame(
+                frame, timestamp, frame_id, self.pyramid_levels, roi, self.segmenter
+            )
+            # too small to be the berry, e.g. noise left in the box after it moved away
+            if analysis.berry_position is None or analysis.berry_area < self.min_area:
+                analysis = None
+        if analysis is None:
+            analysis = analyze_frame(
+                frame, timestamp, frame_id, self.pyramid_levels, None, self.segmenter
+            )
+            self._since_full = 0
+        else:
+            self._since_full += 1
+        self._update_roi(analysis, frame.shape)
+        return analysis
+
+    def _worker_record(self):
+        """
+        Get the worker's newest result record. If the worker died, fall back to capturing
+        and analyzing in this process from now on.
+        """
+        try:
+            return self.worker.latest()
+        except RuntimeError as error:
+            print(f"{error}, analyzing frames in this process instead")
+            self.worker.stop()
+            self.worker = None
+            self.camera = get_camera()
+            self._analysis = None
+            return None
+
+    def _worker_analysis(self):
+        """Turn the worker's newest result record into a FrameAnalysis."""
+        record = self._worker_record()
+        if record is None:
             return None
+        if self._analysis is not None and self._analysis.frame_id == record["frame_id"]:
+            return self._analysis
 
-        hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
-        _, _, v = cv.split(hsv_frame)
-        print("brightness:", np.mean(v))
-        return np.mean(v) < 100
+        berry_position = None
+        if not np.isnan(record["x"]):
+            berry_position = (float(record["x"]), float(record["y"]))
+        self._analysis = FrameAnalysis(
+            int(record["frame_id"]),
+            float(record["timestamp"]),
+            float(record["brightness"]),
+            berry_position,
+            float(record["area"]),
+        )
+        return self._analysis
+
+    def analysis(self):
+        """
+        Get the analysis of the newest frame, analyzing it only the first time it is asked
+        for, so every consumer in a tick shares one pass over the frame.
+
+        Returns:
+            FrameAnalysis or None: Results for the newest frame, or None if no frame has
+                been captured yet
+        """
+        if self.worker is not None:
+            return self._worker_analysis()
+
+        frame, timestamp, frame_id = self.camera.latest()
+        # None until the capture thread has read its first frame
+        if frame is None:
+            return None
+
+        if self._analysis is None or self._analysis.frame_id != frame_id:
+            self._analysis = self._analyze(frame, timestamp, frame_id)
+        return self._analysis
+
+    def _exposure(self):
+        """Get the camera's exposure and gain from the capture thread or the worker."""
+        if self.worker is None:
+            return self.camera.latest_exposure()
+        record = self._worker_record()
+        if record is None or np.isnan(record["exposure"]):
+            return None, None
+        return float(record["exposure"]), float(record["gain"])
+
+    def get_darkness(self):
+        """
+        Check whether the room is dark, with smoothing and hysteresis.
+
+        Returns:
+            Boolean or None: Whether it is dark, or None if there is nothing to measure yet
+        """
+        if self.brightness.mode == "exposure":
+            exposure, gain = self._exposure()
+            if exposure is None:
+                return None
+            value = self.brightness.measure(exposure=exposure, gain=gain)
+        else:
+            # measured in the shared analysis, in the worker or in this process alike
+            analysis = self.analysis()
+            if analysis is None:
+                return None
+            value = analysis.brightness
+
+        print("brightness:", value)
+        return self.brightness.update(value)
 
     def get_berry_position(self):
         """
@@ -30,26 +307,8 @@ class BerryDetection:
         Returns:
             (int, int) or None: (x,y) position of object, or None if no object is detected
         """
-        ret, frame = cap.read()
-        # if frame is read correctly ret is True
-        if not ret:
+        analysis = self.analysis()
+        if analysis is None:
             return None
 
-        frame = cv.rotate(frame, cv.ROTATE_90_COUNTERCLOCKWISE)
-        hsv_frame = cv.cvtColor(frame, cv.COLOR_BGR2HSV)
-
-        # use hue values 0-10 *and* 170-180 to account for wrapping, because
-        # that's where red is in hsv space
-        binary_image_1 = cv.inRange(hsv_frame, (0, 60, 60), (10, 255, 130))
-        binary_image_2 = cv.inRange(hsv_frame, (170, 60, 60), (180, 255, 130))
-        binary_image = binary_image_1 + binary_image_2
-
-        moments = cv.moments(binary_image)
-        if moments["m00"] != 0:
-            center_x, center_y = (
-                moments["m10"] / moments["m00"],
-                moments["m01"] / moments["m00"],
-            )
-            return (center_x, center_y)
-
-        return None
+        return analysis.berry_position
@@ -0,0 +1,163 @@
+"""
+Scene brightness for the sleep trigger, smoothed and with hysteresis.
+"""
+
+import time
+import cv2 as cv
+
+
+def frame_value(frame, stride=8):
+    """
+    Estimate the mean HSV value of a frame, the brightest of its channels per pixel, from
+    every stride-th pixel in both directions. Same metric as the full frame HSV mean the
+    sleep thresholds were set on.
+
+    Args:
+        frame (ndarray): BGR frame
+        stride (Int) (optional): Pixel step (defaults to 8, 1/64 of the pixels)
+
+    Returns:
+        Float: Mean value (0-255)
+    """
+    height, width = frame.shape[:2]
+    # nearest neighbour resize picks every stride-th pixel, without numpy's per-call overhead
+    sample = cv.resize(
+        frame,
+        (max(1, width // stride), max(1, height // stride)),
+        interpolation=cv.INTER_NEAREST,
+    )
+    if sample.ndim == 2:
+        return float(cv.mean(sample)[0])
+    blue, green, red = cv.split(sample)
+    return float(cv.mean(cv.max(cv.max(blue, green), red))[0])
+
+
+def exposure_time(exposure):
+    """
+    Convert a camera's exposure to V4L2's absolute units. Some drivers report exposure as
+    log2 seconds instead, a negative number that grows toward 0 as the exposure gets
+    longer.
+
+    Args:
+        exposure (Float): CAP_PROP_EXPOSURE as the driver reports it
+
+    Returns:
+        Float: Exposure time in 100 us units, longer in the dark
+    """
+    if exposure < 0:
+        return 2.0**exposure * 10000
+    return exposure
+
+
+class BrightnessEstimator:
+    """
+    Decides whether the room is dark.
+
+    Modes:
+    - "pixels": mean HSV value of a frame subsample, dark when it drops below a threshold
+    - "exposure": exposure times gain reported by the camera, dark when it rises above a
+      threshold. Auto exposure compensates in the dark, so this needs no pixels at all,
+      but the thresholds depend on the camera and have to be calibrated.
+    """
+
+    MODES = ("pixels", "exposure")
+
+    def __init__(
+        self,
+        mode="pixels",
+        stride=8,
+        smoothing=0.5,
+        dark_below=90,
+        light_above=100,
+        exposure_dark_above=500,
+        exposure_light_below=300,
+    ):
+        """
+        Args:
+            mode (String) (optional): "pixels" or "exposure" (defaults to "pixels")
+            stride (Int) (optional): Pixel step for the value subsample (defaults to 8)
+            smoothing (Float) (optional): Weight of each new measurement in the moving
+                average, 1 for no smoothing (defaults to 0.5)
+            dark_below (Float) (optional): Value that turns sleep on (defaults to 90)
+            light_above (Float) (optional): Value that turns sleep back off (defaults to
+                100)
+            exposure_dark_above (Float) (optional): Exposure level that turns sleep on
+                (defaults to 500)
+            exposure_light_below (Float) (optional): Exposure level that turns sleep back
+                off (defaults to 300)
+        """
+        if mode not in BrightnessEstimator.MODES:
+            raise ValueError(f"Unknown brightness mode: {mode}")
+
+        self.mode = mode
+        self.stride = stride
+        self.smoothing = smoothing
+        self.dark_below = dark_below
+        self.light_above = light_above
+        self.exposure_dark_above = exposure_dark_above
+        self.exposure_light_below = exposure_light_below
+
+        self.level = None  # smoothed measurement
+        self.dark = False
+
+        # cost of measurements
+        self.calls = 0
+        self.total_time = 0.0
+
+    def measure(self, frame=None, exposure=None, gain=None):
+        """
+        Take one raw measurement for the current mode.
+
+        Args:
+            frame (ndarray) (optional): BGR frame, used in "pixels" mode
+            exposure (Float) (optional): Camera exposure, used in "exposure" mode
+            gain (Float) (optional): Camera gain, used in "exposure" mode
+
+        Returns:
+            Float: Mean value in "pixels" mode, exposure level in "exposure" mode
+        """
+        start = time.perf_counter()
+        if self.mode == "pixels":
+            value = frame_value(frame, self.stride)
+        else:
+            value = exposure_time(exposure) * max(gain or 1.0, 1.0)
+        self.total_time += time.perf_counter() - start
+        self.calls += 1
+        return value
+
+    def update(self, value):
+        """
+        Add a measurement to the moving average and update the dark state.
+
+        Args:
+            value (Float): Output of measure()
+
+        Returns:
+            Boolean: Whether it is dark
+        """
+        if self.level is None:
+            self.level = value
+        else:
+            self.level += self.smoothing * (value - self.level)
+
+        # only change state once past the far threshold, so noise can't toggle it
+        if self.mode == "pixels":
+            if self.level < self.dark_below:
+                self.dark = True
+            elif self.level > self.light_above:
+                self.dark = False
+        else:
+            if self.level > self.exposure_dark_above:
+                self.dark = True
+            elif self.level < self.exposure_light_below:
+                self.dark = False
+        return self.dark
+
+    def cost(self):
+        """
+        Returns:
+            Float: Mean seconds per measurement
+        """
+        if self.calls == 0:
+            return 0.0
+        return self.total_time / self.calls
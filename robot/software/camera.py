@@ -0,0 +1,109 @@
+"""
+Camera capture on a background thread that keeps only the newest frame.
+"""
+
+import threading
+import time
+import cv2 as cv
+
+
+class CameraCapture(threading.Thread):
+    """Reads frames in the background and holds the newest one in a locked slot."""
+
+    def __init__(self, device=0, exposure_interval=15):
+        """
+        Args:
+            device (Int) (optional): OpenCV camera index (defaults to 0)
+            exposure_interval (Int) (optional): Read the camera's exposure and gain every
+                this many frames (defaults to 15)
+        """
+        super().__init__(daemon=True)
+        self.cap = cv.VideoCapture(device)
+        if not self.cap.isOpened():
+            print("Cannot open camera")
+            raise RuntimeError(f"Cannot open camera {device}")
+        print("opened camera")
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._timestamp = None
+        self._frame_id = 0
+        self._exposure = (None, None)  # (exposure, gain)
+        self.exposure_interval = exposure_interval
+        self._running = True
+
+        # statistics
+        self.frames_captured = 0
+        self.failed_reads = 0
+
+    def run(self):
+        """Capture loop, replaces the slot with every new frame."""
+        while self._running:
+            ret, frame = self.cap.read()
+            timestamp = time.monotonic()
+            if not ret:
+                self.failed_reads += 1
+                time.sleep(0.01)  # don't spin if the camera dropped out
+                continue
+
+            with self._lock:
+                self._frame = frame
+                self._timestamp = timestamp
+                self._frame_id += 1
+            self.frames_captured += 1
+
+            if (self.frames_captured - 1) % self.exposure_interval == 0:
+                # read on this thread, so the driver is never used by two threads at once
+                self._exposure = (
+                    self.cap.get(cv.CAP_PROP_EXPOSURE),
+                    self.cap.get(cv.CAP_PROP_GAIN),
+                )
+
+        self.cap.release()
+
+    def latest(self):
+        """
+        Get the newest frame without waiting for the camera.
+
+        Returns:
+            (ndarray, Float, Int) or (None, None, 0): Frame, monotonic capture time and
+                frame id, or Nones if no frame has been captured yet. The frame must not be
+                modified, the capture thread never writes into a frame after publishing it.
+        """
+        with self._lock:
+            return self._frame, self._timestamp, self._frame_id
+
+    def latest_exposure(self):
+        """
+        Get the camera's most recently read auto exposure settings.
+
+        Returns:
+            (Float, Float) or (None, None): Exposure and gain as reported by the driver
+        """
+        return self._exposure
+
+    def stop(self):
+        """Stop the capture thread and release the camera."""
+        self._running = False
+
+
+_shared_camera = None
+_shared_camera_lock = threading.Lock()
+
+
+def get_camera(device=0):
+    """
+    Get the camera shared by every part of the robot, starting its thread on first use.
+
+    Args:
+        device (Int) (optional): OpenCV camera index (defaults to 0)
+
+    Returns:
+        CameraCapture: Running capture thread
+    """
+    global _shared_camera
+    with _shared_camera_lock:
+        if _shared_camera is None:
+            _shared_camera = CameraCapture(device)
+            _shared_camera.start()
+        return _shared_camera
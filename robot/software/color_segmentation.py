@@ -0,0 +1,126 @@
+"""
+Colour segmentation through a cached BGR -> label lookup table, one bit per target.
+"""
+
+import os
+import hashlib
+from typing import NamedTuple
+import numpy as np
+import cv2 as cv
+
+
+class ColorTarget(NamedTuple):
+    """A named colour, as one or more inclusive OpenCV HSV ranges (H 0-180, S/V 0-255)."""
+
+    name: str
+    hsv_ranges: tuple  # ((low_hsv, high_hsv), ...)
+
+
+# use hue values 0-10 *and* 170-180 for red to account for wrapping, because
+# that's where red is in hsv space
+COLOR_TARGETS = (
+    ColorTarget(
+        "red",
+        (((0, 60, 60), (10, 255, 130)), ((170, 60, 60), (180, 255, 130))),
+    ),
+)
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "fox-bot")
+
+
+class ColorSegmenter:
+    """Labels pixels of BGR images with a bitmask of the colour targets they match."""
+
+    def __init__(self, targets=COLOR_TARGETS, bits=5, cache_dir=CACHE_DIR):
+        """
+        Args:
+            targets (tuple<ColorTarget>) (optional): Colours to label, at most 8
+                (defaults to COLOR_TARGETS)
+            bits (Int) (optional): Bits kept per BGR channel, at most 5 so table indices
+                fit in uint16. The table has 2**(3 * bits) entries (defaults to 5)
+            cache_dir (String) (optional): Folder to cache compiled tables in, None to
+                always compile (defaults to ~/.cache/fox-bot)
+        """
+        if len(targets) > 8:
+            raise ValueError("At most 8 colour targets fit in a uint8 label")
+        if bits > 5:
+            raise ValueError("At most 5 bits per channel fit in a uint16 table index")
+
+        self.targets = tuple(targets)
+        self.names = [target.name for target in self.targets]
+        self.bits = bits
+        self.lut = self._load_or_compile(cache_dir)
+
+        # per channel table that turns a uint8 value into its part of the table index,
+        # the three parts are then summed into the index by one cv.transform
+        values = np.arange(256, dtype=np.uint16) >> (8 - bits)
+        self._channel_lut = np.stack(
+            [values << (2 * bits), values << bits, values], axis=1
+        ).reshape(256, 1, 3)
+        self._sum_channels = np.ones((1, 3))
+
+    def _cache_path(self, cache_dir):
+        key = hashlib.sha1(repr((self.targets, self.bits)).encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, f"color_lut_{key}.npy")
+
+    def _load_or_compile(self, cache_dir):
+        if cache_dir is None:
+            return self.compile()
+
+        path = self._cache_path(cache_dir)
+        if os.path.exists(path):
+            return np.load(path)
+
+        lut = self.compile()
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(path, lut)
+        return lut
+
+    def compile(self):
+        """
+        Build the lookup table by classifying the center colour of every quantized BGR bin.
+
+        Returns:
+            ndarray: uint8 labels indexed by (b << 2 * bits) | (g << bits) | r
+        """
+        levels = 2**self.bits
+        step = 256 // levels
+        centers = np.arange(levels, dtype=np.uint8) * step + step // 2
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        bgr = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1).reshape(-1, 1, 3)
+        hsv = cv.cvtColor(bgr, cv.COLOR_BGR2HSV)
+
+        lut = np.zeros(levels**3, dtype=np.uint8)
+        for bit, target in enumerate(self.targets):
+            mask = np.zeros(levels**3, dtype=bool)
+            for low, high in target.hsv_ranges:
+                mask |= cv.inRange(hsv, low, high).ravel() > 0
+            lut[mask] |= np.uint8(1 << bit)
+        return lut
+
+    def label(self, bgr):
+        """
+        Label every pixel for all targets in one pass.
+
+        Args:
+            bgr (ndarray): BGR image
+
+        Returns:
+            ndarray: uint8 image where bit i is set if the pixel matches target i
+        """
+        index = cv.transform(cv.LUT(bgr, self._channel_lut), self._sum_channels)
+        return self.lut.take(index)
+
+    def mask(self, labels, name):
+        """
+        Get one target's binary mask from a label image.
+
+        Args:
+            labels (ndarray): Output of label()
+            name (String): Target name
+
+        Returns:
+            ndarray: uint8 mask, 255 where the target matched
+        """
+        bit = np.uint8(1 << self.names.index(name))
+        return cv.compare(labels & bit, 0, cv.CMP_GT)
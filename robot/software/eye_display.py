@@ -1,7 +1,7 @@
 class EyeDisplay:
 
     def __init__(self):
-        self.current_state = [0] * 8  # current state is a list of binary integers
+        self.current_state = bytes(8)  # current state is one byte per row
 
     def set_state(self, eye):
         """
@@ -15,21 +15,22 @@ class EyeDisplay:
 
     def eye_to_bytes(self, eye_list):
         """
-        Convert list of booleans to binary integers
+        Convert list of booleans to one byte per row, the first LED is the highest bit
 
         Args:
             eye_list (list<list<boolean>>): 2d list of booleans representing which LEDs should
                 be on or off
 
         Returns:
-            list<int>: Bytes as binary ints
+            bytes: One byte per row, packed straight into the actuator packet
         """
-        eye_bytes = []
+        rows = []
         for line in eye_list:
-            flattened_string = "".join([str(bit) for bit in line])
-            # print(flattened_string)
-            eye_bytes.append(int(flattened_string, 2))
-        return eye_bytes
+            row = 0
+            for bit in line:
+                row = (row << 1) | bit
+            rows.append(row)
+        return bytes(rows)
 
     def eye_with_position(self, position):
         """
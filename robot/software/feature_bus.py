@@ -0,0 +1,182 @@
+"""
+Streaming audio features, computed once per hop and read by every subscriber.
+"""
+
+import numpy as np
+import librosa
+from robot.software.audio_buffer import AudioRingBuffer
+from robot.software.pitch_tracking import frame_signal, hann_window
+
+
+class FeatureSubscription:
+    """One consumer's cursor into a feature ring."""
+
+    def __init__(self, bus, name):
+        self.name = name
+        self.ring = bus.rings[name]
+        self.position = self.ring.written  # starts with the next frame
+        self.lost = 0  # frames overwritten before this subscriber read them
+
+    def read(self):
+        """
+        Get every frame computed since the last read, as a view into the ring. It is
+        overwritten once the ring wraps around, so copy it to keep it.
+
+        Returns:
+            ndarray: (n_frames, ...) feature frames, oldest first
+        """
+        frames, end = self.ring.read_from(self.position)
+        self.lost += end - self.position - len(frames)
+        self.position = end
+        return frames
+
+
+class FeatureBus:
+    """
+    Streaming STFT front-end with mel and MFCC features on top of it.
+
+    Built in features, each computed from the one in brackets:
+    - "frames": raw frames of the stream (frame_length samples)
+    - "spectrum" (frames): complex rfft of the Hann windowed frame
+    - "magnitude" (spectrum): absolute value of the spectrum
+    - "mel" (magnitude): power in n_mels mel bands
+    - "mfcc" (mel): first n_mfcc coefficients of the DCT of the log mel bands, the same as
+      librosa.feature.mfcc without its top_db clipping
+    """
+
+    def __init__(
+        self,
+        sr,
+        frame_length=1024,
+        hop_length=256,
+        n_mels=40,
+        n_mfcc=13,
+        ring_frames=128,
+    ):
+        """
+        Args:
+            sr (Int): Sample rate of the stream
+            frame_length (Int) (optional): Samples per frame and FFT size
+                (defaults to 1024)
+            hop_length (Int) (optional): Samples between frames (defaults to 256)
+            n_mels (Int) (optional): Mel bands (defaults to 40)
+            n_mfcc (Int) (optional): MFCCs kept (defaults to 13)
+            ring_frames (Int) (optional): Frames of each feature kept for subscribers
+                (defaults to 128)
+        """
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.ring_frames = ring_frames
+        self.pending = np.zeros(0, dtype=np.float32)  # samples not yet fully framed
+
+        self.features = {}  # name -> (source feature, function of a batch of source)
+        self.rings = {}
+        self._active = set()  # features that have to be computed
+
+        n_bins = frame_length // 2 + 1
+        # periodic Hann, like librosa.stft
+        self.window = hann_window(frame_length)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=frame_length, n_mels=n_mels)
+        self.dct = _dct_matrix(n_mels)[:n_mfcc]
+
+        self.register("frames", None, None, (frame_length,))
+        self.register(
+            "spectrum",
+            "frames",
+            lambda frames: np.fft.rfft(frames * self.window),
+            (n_bins,),
+            np.complex64,
+        )
+        self.register("magnitude", "spectrum", np.abs, (n_bins,))
+        self.register("mel", "magnitude", lambda m: (m**2) @ self.mel_basis.T, (n_mels,))
+        self.register(
+            "mfcc",
+            "mel",
+            lambda mel: (10 * np.log10(np.maximum(mel, 1e-10))) @ self.dct.T,
+            (n_mfcc,),
+        )
+
+    def register(self, name, source, function, shape, dtype=np.float32):
+        """
+        Add a feature computed from an existing one.
+
+        Args:
+            name (String): Feature name to subscribe to
+            source (String): Feature it is computed from
+            function (callable): Takes an (n_frames, ...) batch of the source feature and
+                returns the (n_frames, ...) batch of this one
+            shape (tuple): Shape of one frame of the feature
+            dtype (numpy dtype) (optional): Type of the feature (defaults to float32)
+        """
+        if name in self.features:
+            raise ValueError(f"Feature {name} is already registered")
+        if source is not None and source not in self.features:
+            raise ValueError(f"Unknown source feature: {source}")
+        self.features[name] = (source, function)
+        self.rings[name] = AudioRingBuffer(self.ring_frames, dtype, shape)
+
+    def subscribe(self, name):
+        """
+        Start receiving a feature.
+
+        Args:
+            name (String): Feature name
+
+        Returns:
+            FeatureSubscription: Cursor to read the new frames with
+        """
+        if name not in self.features:
+            raise ValueError(f"Unknown feature: {name}")
+        # computing a feature needs everything it is derived from
+        needed = name
+        while needed is not None:
+            self._active.add(needed)
+            needed = self.features[needed][0]
+        return FeatureSubscription(self, name)
+
+    def process(self, samples):
+        """
+        Add samples and compute the subscribed features for every frame now complete.
+
+        Args:
+            samples (ndarray): New float samples
+
+        Returns:
+            Int: Number of new frames
+        """
+        self.pending = np.concatenate([self.pending, samples])
+        frames = frame_signal(self.pending, self.frame_length, self.hop_length)
+        if len(frames) == 0:
+            return 0
+        # keep what the next frame on the grid still needs
+        self.pending = self.pending[len(frames) * self.hop_length :]
+
+        computed = {"frames": frames}
+        # registration order puts every source before the features made from it
+        for name, (source, function) in self.features.items():
+            if name not in self._active:
+                continue
+            if function is not None:
+                computed[name] = function(computed[source])
+            self.rings[name].write(computed[name])
+        return len(frames)
+
+    def skip(self, samples):
+        """
+        Add samples without computing features, e.g. silence. The last frame's worth is
+        kept, so a sound starting right after still has its first frame.
+
+        Args:
+            samples (ndarray): New float samples
+        """
+        self.pending = np.concatenate([self.pending, samples])[-self.frame_length :]
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix, row k is the k-th basis vector."""
+    k = np.arange(n)[:, None]
+    t = np.arange(n)[None, :]
+    dct = np.sqrt(2 / n) * np.cos(np.pi * k * (2 * t + 1) / (2 * n))
+    dct[0] /= np.sqrt(2)
+    return dct.astype(np.float32)
@@ -0,0 +1,151 @@
+"""
+Sound bearing from the 3 microphone array, GCC-PHAT against a table of bearing delays.
+"""
+
+import numpy as np
+from robot.software.pitch_tracking import frame_signal, hann_window
+
+SPEED_OF_SOUND = 343.0  # m/s
+INCH = 0.0254  # m
+RADIUS = 10.5 * INCH  # microphones sit on a circle of this radius, spacing sqrt(3) * r
+# microphone directions, counterclockwise from the robot's front: forward, left, right
+MIC_ANGLES = (0.0, 120.0, -120.0)
+PAIRS = ((0, 1), (0, 2), (1, 2))
+
+
+class SoundLocalizer:
+    """
+    Estimates the bearing of the loudest sound source, counterclockwise from the front
+    in degrees (-180 to 180), which is also the angle to spin to face it.
+    """
+
+    def __init__(
+        self,
+        sr,
+        frame_length=512,
+        hop_length=256,
+        resolution=1.0,
+        interpolation=8,
+        phat_weight=0.7,
+        min_rms=1e-3,
+        radius=RADIUS,
+        mic_angles=MIC_ANGLES,
+    ):
+        """
+        Args:
+            sr (Int): Sample rate of every channel
+            frame_length (Int) (optional): Samples per window (defaults to 512)
+            hop_length (Int) (optional): Samples between windows (defaults to 256)
+            resolution (Float) (optional): Degrees between bearings in the lookup table
+                (defaults to 1.0)
+            interpolation (Int) (optional): Upsampling of the cross-correlation, for
+                delays finer than a sample (defaults to 8)
+            phat_weight (Float) (optional): How much of each cross spectrum's magnitude
+                is divided out, 1 is plain PHAT. A little less keeps noisy bins between
+                the harmonics of a voice or a note from counting as much as the
+                harmonics (defaults to 0.7)
+            min_rms (Float) (optional): Quietest window that gets a bearing, for float
+                samples in [-1, 1] (defaults to 1e-3)
+            radius (Float) (optional): Radius of the microphone circle in meters
+                (defaults to 10.5 inches)
+            mic_angles (tuple) (optional): Direction of each microphone in degrees,
+                counterclockwise from the front (defaults to forward, left, right)
+        """
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.interpolation = interpolation
+        self.phat_weight = phat_weight
+        self.min_rms = min_rms
+        self.window = hann_window(frame_length)
+        self.pending = np.zeros((len(mic_angles), 0), dtype=np.float32)
+
+        # zero padded to twice the window, so the correlation isn't circular
+        self.n_fft = 2 * frame_length
+        self.n_corr = interpolation * self.n_fft
+        # a pair can't be further apart in time than the microphone spacing allows
+        spacing = 2 * radius * np.sin(np.radians(60))
+        self.max_lag = int(np.ceil(spacing / SPEED_OF_SOUND * sr * interpolation)) + 1
+
+        # the inverse FFT of the zero padded cross spectrum, but only at the lags a
+        # pair can reach, -max_lag..max_lag. Every spectrum bin but the first counts
+        # twice for its negative frequency twin, the first one's imaginary part drops.
+        bins = np.arange(self.n_fft // 2 + 1)
+        lags = np.arange(-self.max_lag, self.max_lag + 1)
+        angle = 2 * np.pi * np.outer(bins, lags) / self.n_corr
+        twice = np.where(bins == 0, 1.0, 2.0)[:, None] / self.n_corr
+        self._basis = np.concatenate([twice * np.cos(angle), -twice * np.sin(angle)])
+
+        # delay of each pair for every bearing, as an index into the lag window
+        self.bearings = np.arange(-180, 180, resolution)
+        theta = np.radians(self.bearings)[:, None]
+        phi = np.radians(np.asarray(mic_angles))[None, :]
+        # a plane wave from theta reaches microphone i r cos(theta - phi_i) / c early
+        arrival = -radius * np.cos(theta - phi) / SPEED_OF_SOUND
+        first, second = np.array(PAIRS).T
+        delays = (arrival[:, first] - arrival[:, second]) * sr * interpolation
+        self.lookup = np.rint(delays).astype(int).T + self.max_lag  # (pairs, bearings)
+        self._first, self._second = first, second
+
+    def locate(self, frames):
+        """
+        Estimate the bearing in windows that were already framed.
+
+        Args:
+            frames (ndarray): (n_windows, channels, frame_length) samples
+
+        Returns:
+            (ndarray, ndarray): Bearing in degrees and confidence (0-1) per window,
+                NaN bearing and 0 confidence where it is too quiet
+        """
+        frames = np.asarray(frames, dtype=np.float64)
+        spectra = np.fft.rfft(frames * self.window, self.n_fft)  # every channel at once
+        cross = spectra[:, self._first] * np.conj(spectra[:, self._second])
+        # PHAT weighting flattens the magnitude, so the peak is sharp for any sound
+        magnitude = np.maximum(np.abs(cross), 1e-12)
+        cross /= magnitude**self.phat_weight
+        # a few hundred lags as one matrix product, instead of the whole upsampled
+        # correlation that an inverse FFT would write out for every window and pair
+        parts = np.concatenate([cross.real, cross.imag], axis=2)
+        window = parts @ self._basis  # (windows, pairs, lags)
+        # scaled by the peak a perfectly coherent pair would reach, 1 at any delay
+        weights = magnitude ** (1 - self.phat_weight)
+        peak = 2 * weights.sum(axis=2) - weights[:, :, 0] - weights[:, :, -1]
+        window /= np.maximum(peak / self.n_corr, 1e-12)[:, :, None]
+
+        # score of every bearing: sum of each pair's correlation at its expected delay
+        pairs = np.arange(len(PAIRS))[:, None]
+        scores = window[:, pairs, self.lookup].sum(axis=1)  # (windows, bearings)
+        best = np.argmax(scores, axis=1)
+        confidence = scores[np.arange(len(frames)), best] / len(PAIRS)
+
+        rms = np.sqrt(np.mean(frames**2, axis=(1, 2)))
+        loud = rms >= self.min_rms
+        bearing = np.where(loud, self.bearings[best], np.nan)
+        confidence = np.where(loud, np.clip(confidence, 0, 1), 0.0)
+        return bearing, confidence
+
+    def process(self, samples):
+        """
+        Add samples of every channel and locate every window that is now complete.
+
+        Args:
+            samples (ndarray): (channels, n) new float samples, lined up in time
+
+        Returns:
+            (ndarray, ndarray): Bearing and confidence per new window, see locate()
+        """
+        self.pending = np.concatenate([self.pending, samples], axis=1)
+        if self.pending.shape[1] < self.frame_length:
+            return np.zeros(0), np.zeros(0)
+
+        # (windows, channels, frame_length) views, every channel on the same grid
+        frames = np.stack(
+            [
+                frame_signal(channel, self.frame_length, self.hop_length)
+                for channel in self.pending
+            ],
+            axis=1,
+        )
+        self.pending = self.pending[:, len(frames) * self.hop_length :]
+        return self.locate(frames)
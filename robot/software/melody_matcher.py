@@ -0,0 +1,114 @@
+"""
+Streaming melody matcher, fed one note at a time.
+"""
+
+
+class MelodyMatcher:
+    """Matches a stream of notes against many melodies at once."""
+
+    def __init__(self):
+        self.melodies = {}  # name -> notes
+        self.tolerance = {}  # name -> max_incorrect_notes
+        self.position = {}  # name -> notes matched so far
+        self.last_match = {}  # name -> index of the last note that matched
+        self._waiting = {}  # note -> names whose next note it is
+        self._starts = {}  # note -> names whose melody starts with it
+        self.count = 0  # notes consumed
+
+    def add(self, name, notes, max_incorrect_notes=-1):
+        """
+        Register a melody.
+
+        Args:
+            name (String): Melody name, reported when it is heard
+            notes (list): Notes of the melody, in the same form fed to feed()
+            max_incorrect_notes (Int) (optional): Maximum number of incorrect notes that can
+                be between correct notes before the match starts over. If -1, then there is
+                no limit to incorrect notes. Defaults to -1
+        """
+        if len(notes) == 0:
+            raise ValueError("A melody needs at least one note")
+        if name in self.melodies:
+            self.remove(name)
+
+        self.melodies[name] = list(notes)
+        self.tolerance[name] = max_incorrect_notes
+        self._starts.setdefault(self.melodies[name][0], set()).add(name)
+        self._set_position(name, 0)
+
+    def remove(self, name):
+        """Unregister a melody."""
+        self._waiting[self._next_note(name)].discard(name)
+        self._starts[self.melodies[name][0]].discard(name)
+        for table in (self.melodies, self.tolerance, self.position, self.last_match):
+            del table[name]
+
+    def reset(self):
+        """Drop every partial match."""
+        for name in self.melodies:
+            self._set_position(name, 0)
+
+    def _next_note(self, name):
+        return self.melodies[name][self.position[name]]
+
+    def _set_position(self, name, position):
+        """Move a melody to a new position and into the bucket for its next note."""
+        if name in self.position:
+            self._waiting[self._next_note(name)].discard(name)
+        self.position[name] = position
+        self.last_match[name] = self.count
+        self._waiting.setdefault(self._next_note(name), set()).add(name)
+
+    def _expired(self, name, incorrect_until):
+        """
+        Whether too many incorrect notes came since the melody's last correct one, counting
+        the notes before index incorrect_until.
+        """
+        tolerance = self.tolerance[name]
+        incorrect = incorrect_until - self.last_match[name] - 1
+        return self.position[name] > 0 and tolerance != -1 and incorrect > tolerance
+
+    def feed(self, note):
+        """
+        Consume one note.
+
+        Args:
+            note: Next note in the stream
+
+        Returns:
+            list<String>: Names of the melodies this note completed
+        """
+        heard = []
+        # melodies that gave up waiting restart if this is their first note; the rest of
+        # the expired ones are reset lazily, when the note they wait for comes
+        for name in list(self._starts.get(note, ())):
+            # this note is one more incorrect note for melodies not waiting for it
+            if self._next_note(name) != note and self._expired(name, self.count + 1):
+                self._set_position(name, 0)
+
+        for name in list(self._waiting.get(note, ())):
+            if self._expired(name, self.count):
+                self._set_position(name, 0)
+                if self._next_note(name) != note:
+                    continue
+
+            position = self.position[name] + 1
+            if position == len(self.melodies[name]):
+                heard.append(name)
+                position = 0
+            self._set_position(name, position)
+
+        self.count += 1
+        return heard
+
+    def feed_many(self, notes):
+        """
+        Consume notes in order.
+
+        Returns:
+            list<String>: Names of the melodies completed, once per completion
+        """
+        heard = []
+        for note in notes:
+            heard += self.feed(note)
+        return heard
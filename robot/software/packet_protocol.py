@@ -0,0 +1,324 @@
+"""
+Framing for the Arduino's serial link, must match
+robot/hardware/usb_receive/usb_receive.ino.
+"""
+
+import binascii
+
+# frame layout:
+#   0-1     sync 0xAA 0x55
+#   2       protocol version
+#   3       frame type
+#   4       sequence number, +1 per frame and wrapping at 255
+#   5       payload length
+#   6..     payload
+#   last 2  CRC-16/CCITT-FALSE of bytes 2 to the end of the payload, little endian
+SYNC = b"\xaa\x55"
+VERSION = 1
+HEADER_SIZE = 6
+CRC_SIZE = 2
+MAX_PAYLOAD = 32  # must match MAX_PAYLOAD in the Arduino sketch
+
+# frame types
+FRAME_ACTUATORS = 1  # the 21 byte actuator packet from RobotBehaviors.build_packet()
+FRAME_DELTA = 2  # changed actuator fields only, see DeltaEncoder
+FRAME_TELEMETRY = 3  # Arduino to host: button, encoders and counters, see telemetry.py
+FRAME_HELLO = 4  # empty, the first frame of a newly opened link, restarts the sequence
+
+# frames further back than this mean the sender restarted, not that they arrived late
+SEQUENCE_WINDOW = 16
+
+# fields of the actuator packet a delta frame can carry, as (offset, size), in the order
+# of their bits in the delta mask: motors, ears, tail, brightness, then the 8 left eye
+# rows and the 8 right eye rows
+PACKET_SIZE = 21
+EYE_ROWS = tuple((5 + row, 1) for row in range(16))
+DELTA_FIELDS = ((0, 2), (2, 1), (3, 1), (4, 1)) + EYE_ROWS
+DELTA_MASK_SIZE = 3  # bytes, little endian
+DELTA_ALL = (1 << len(DELTA_FIELDS)) - 1
+
+
+def crc16(data):
+    """
+    CRC-16/CCITT-FALSE (polynomial 0x1021, starting at 0xFFFF), computed in C by binascii.
+
+    Args:
+        data (bytes): Bytes to check
+
+    Returns:
+        Int: 16 bit CRC
+    """
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+class FrameEncoder:
+    """Wraps payloads into frames, numbering them in the order they are sent."""
+
+    def __init__(self):
+        self.sequence = 0  # sequence number of the next frame
+
+    def encode(self, frame_type, payload):
+        """
+        Args:
+            frame_type (Int): One of the FRAME_ constants
+            payload (bytes): At most MAX_PAYLOAD bytes
+
+        Returns:
+            bytes: The whole frame, ready to write to the port
+        """
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError(f"Payload is longer than {MAX_PAYLOAD} bytes")
+
+        body = bytes((VERSION, frame_type, self.sequence, len(payload))) + payload
+        self.sequence = (self.sequence + 1) & 0xFF
+        return SYNC + body + crc16(body).to_bytes(CRC_SIZE, "little")
+
+
+class FrameDecoder:
+    """
+    Finds frames in a byte stream that may have lost, gained or corrupted bytes. Same
+    parser as the Arduino sketch, used for frames the Arduino sends back and to check the
+    protocol without hardware.
+
+    When a frame fails its checks, the search for the next sync bytes restarts at the
+    byte after the rejected frame's sync bytes rather than after its claimed length, so a
+    corrupted length byte can't swallow the good frame behind it.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._last_sequence = None
+
+        # statistics
+        self.frames = 0  # frames accepted
+        self.rejected = 0  # frames with a wrong version, length or CRC
+        self.out_of_order = 0  # frames older than, or the same as, the last accepted one
+        self.lost = 0  # frames missing from gaps in the sequence numbers
+        self.skipped_bytes = 0  # bytes thrown away while searching for sync bytes
+
+    def feed(self, data):
+        """
+        Parse the next bytes of the stream.
+
+        Args:
+            data (bytes): Bytes as read from the port
+
+        Returns:
+            list<(Int, Int, bytes)>: Type, sequence number and payload of every frame
+                accepted
+        """
+        self._buffer += data
+        buffer = self._buffer
+        frames = []
+        position = 0
+        while True:
+            start = buffer.find(SYNC, position)
+            if start < 0:
+                # keep a trailing first sync byte, it may be the start of a frame
+                keep = 1 if buffer[-1:] == SYNC[:1] else 0
+                self.skipped_bytes += len(buffer) - keep - position
+                position = len(buffer) - keep
+                break
+            self.skipped_bytes += start - position
+            position = start
+
+            if len(buffer) - position < HEADER_SIZE:
+                break
+            version, frame_type, sequence, length = buffer[position + 2 : position + 6]
+            if version != VERSION or length > MAX_PAYLOAD:
+                self._reject()
+                position += 1
+                continue
+            end = position + HEADER_SIZE + length + CRC_SIZE
+            if len(buffer) < end:
+                break
+            body = bytes(buffer[position + 2 : end - CRC_SIZE])
+            if crc16(body) != int.from_bytes(buffer[end - CRC_SIZE : end], "little"):
+                self._reject()
+                position += 1
+                continue
+
+            if frame_type == FRAME_HELLO:
+                self._last_sequence = None  # a new sender
+            if self._accept(sequence):
+                frames.append((frame_type, sequence, body[HEADER_SIZE - 2 :]))
+            position = end
+
+        del buffer[:position]
+        return frames
+
+    @property
+    def pending(self):
+        """Bytes buffered but not parsed yet, the start of a frame still arriving."""
+        return len(self._buffer)
+
+    def _reject(self):
+        """Count a frame that failed its checks, its first byte is skipped."""
+        self.rejected += 1
+        self.skipped_bytes += 1
+
+    def _accept(self, sequence):
+        """Check a valid frame's sequence number, False for a stale or repeated frame."""
+        if self._last_sequence is not None:
+            # signed distance from the last frame, -128 to 127
+            step = (sequence - self._last_sequence + 128) % 256 - 128
+            if -SEQUENCE_WINDOW < step <= 0:
+                self.out_of_order += 1
+                return False
+            if step > 0:
+                self.lost += step - 1
+        self._last_sequence = sequence
+        self.frames += 1
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frames accepted, rejected, out of order and lost, and bytes skipped
+        """
+        return {
+            "frames": self.frames,
+            "rejected": self.rejected,
+            "out_of_order": self.out_of_order,
+            "lost": self.lost,
+            "skipped_bytes": self.skipped_bytes,
+        }
+
+
+class DeltaEncoder:
+    """
+    Frames actuator packets as deltas: a bitmask of the DELTA_FIELDS that changed since
+    the last frame, followed by only those fields' bytes. Every keyframe_interval packets
+    the whole packet is sent instead, so the Arduino recovers from a lost delta. The first
+    keyframe comes after a hello frame, so an Arduino that outlived the last host restarts
+    its sequence instead of dropping frames as stale.
+    """
+
+    def __init__(self, keyframe_interval=50):
+        """
+        Args:
+            keyframe_interval (Int) (optional): Packets from one full packet to the next,
+                1 sends every packet in full (defaults to 50, once a second at 50 Hz)
+        """
+        self.keyframe_interval = keyframe_interval
+        self.encoder = FrameEncoder()
+        self._last = None  # last packet sent
+        self._since_keyframe = 0
+
+        # statistics
+        self.keyframes = 0
+        self.requested_keyframes = 0  # sent early because the Arduino lost a delta's base
+        self.deltas = 0
+        self.unchanged = 0  # packets that weren't sent because nothing changed
+        self.bytes_sent = 0
+
+    def encode(self, packet):
+        """
+        Args:
+            packet (bytes): 21 byte actuator packet from RobotBehaviors.build_packet()
+
+        Returns:
+            bytes: Frame to write to the port, empty if nothing changed
+        """
+        packet = bytes(packet)
+        self._since_keyframe += 1
+        if self._last is None or self._since_keyframe >= self.keyframe_interval:
+            hello = self.encoder.encode(FRAME_HELLO, b"") if self._last is None else b""
+            frame = hello + self.encoder.encode(FRAME_ACTUATORS, packet)
+            self._since_keyframe = 0
+            self.keyframes += 1
+        else:
+            mask = 0
+            changed = []
+            last = self._last
+            for bit, (offset, size) in enumerate(DELTA_FIELDS):
+                field = packet[offset : offset + size]
+                if field != last[offset : offset + size]:
+                    mask |= 1 << bit
+                    changed.append(field)
+            if mask == 0:
+                self.unchanged += 1
+                return b""
+            payload = mask.to_bytes(DELTA_MASK_SIZE, "little") + b"".join(changed)
+            frame = self.encoder.encode(FRAME_DELTA, payload)
+            self.deltas += 1
+
+        self._last = packet
+        self.bytes_sent += len(frame)
+        return frame
+
+    def request_keyframe(self):
+        """Send the next packet in full, e.g. when telemetry says a delta's base was lost."""
+        if self._last is not None and self._since_keyframe + 1 < self.keyframe_interval:
+            self._since_keyframe = self.keyframe_interval
+            self.requested_keyframes += 1
+
+
+class DeltaDecoder:
+    """
+    Rebuilds the actuator packet from keyframes and delta frames, like the Arduino sketch.
+    Stale or repeated frames are ignored, and a delta is only applied on top of the frame
+    right before it, after a gap in the sequence numbers deltas are dropped until the
+    next keyframe.
+    """
+
+    def __init__(self):
+        self.packet = bytearray(PACKET_SIZE)
+        self.synced = False  # whether packet matches the host's, as far as is known
+        self._last_sequence = None
+        self._gap = True  # whether frames were lost right before the last accepted one
+
+        # statistics
+        self.dropped_deltas = 0  # deltas that came while waiting for a keyframe
+        self.rejected = 0  # deltas whose length doesn't match their mask
+        self.out_of_order = 0  # frames older than, or the same as, the last accepted one
+
+    def apply(self, frame_type, sequence, payload):
+        """
+        Args:
+            frame_type (Int): FRAME_ACTUATORS, FRAME_DELTA or FRAME_HELLO
+            sequence (Int): Frame's sequence number
+            payload (bytes): Frame's payload
+
+        Returns:
+            Int: Mask of the DELTA_FIELDS that were written, 0 if none
+        """
+        if frame_type == FRAME_HELLO:
+            self._last_sequence = None
+            self._gap = True
+        if not self._accept(sequence):
+            return 0
+
+        if frame_type == FRAME_ACTUATORS and len(payload) == PACKET_SIZE:
+            self.packet[:] = payload
+            self.synced = True
+            return DELTA_ALL
+        if frame_type != FRAME_DELTA:
+            return 0
+        if not self.synced or self._gap:
+            self.synced = False
+            self.dropped_deltas += 1
+            return 0
+
+        mask = int.from_bytes(payload[:DELTA_MASK_SIZE], "little")
+        fields = [field for bit, field in enumerate(DELTA_FIELDS) if mask >> bit & 1]
+        if DELTA_MASK_SIZE + sum(size for _, size in fields) != len(payload):
+            self.rejected += 1
+            return 0
+        position = DELTA_MASK_SIZE
+        for offset, size in fields:
+            self.packet[offset : offset + size] = payload[position : position + size]
+            position += size
+        return mask
+
+    def _accept(self, sequence):
+        """acceptSequence() of the sketch, False for a stale or repeated frame."""
+        if self._last_sequence is not None:
+            step = (sequence - self._last_sequence + 128) % 256 - 128
+            if -SEQUENCE_WINDOW < step <= 0:
+                self.out_of_order += 1
+                return False
+            # a gap, or far behind because the host restarted and its hello was lost
+            self._gap = step != 1
+        self._last_sequence = sequence
+        return True
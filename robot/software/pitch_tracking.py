@@ -0,0 +1,277 @@
+"""
+Vectorized YIN pitch tracking and note quantization for melody recognition.
+"""
+
+import numpy as np
+
+NOTE_NAMES = ["C", "C♯", "D", "D♯", "E", "F", "F♯", "G", "G♯", "A", "A♯", "B"]
+
+
+def hz_to_midi(f0):
+    """
+    Round frequencies to the nearest MIDI note number.
+
+    Args:
+        f0 (ndarray): Frequencies in Hz
+
+    Returns:
+        ndarray: int MIDI note numbers (A4 = 69)
+    """
+    return np.rint(69 + 12 * np.log2(np.asarray(f0) / 440.0)).astype(int)
+
+
+def midi_to_note(midi):
+    """Name a MIDI note number the way librosa does, e.g. 70 -> "A♯4"."""
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+
+def note_to_midi(note):
+    """
+    Get the MIDI number of a note name like "A♯4", "Bb3" or "C5".
+
+    Args:
+        note (String): Note name
+
+    Returns:
+        Int: MIDI note number
+    """
+    name = note[0].upper()
+    octave_start = 1
+    offset = 0
+    for accidental in note[1:]:
+        if accidental in "♯#":
+            offset += 1
+        elif accidental in "♭b":
+            offset -= 1
+        else:
+            break
+        octave_start += 1
+    return NOTE_NAMES.index(name) + offset + 12 * (int(note[octave_start:]) + 1)
+
+
+def frame_signal(y, frame_length, hop_length):
+    """
+    View a signal as overlapping frames without copying.
+
+    Returns:
+        ndarray: (n_frames, frame_length) view, frames start every hop_length samples
+    """
+    if len(y) < frame_length:
+        return np.zeros((0, frame_length), dtype=y.dtype)
+    return np.lib.stride_tricks.sliding_window_view(y, frame_length)[::hop_length]
+
+
+def hann_window(frame_length):
+    """
+    Periodic Hann window, the one every spectrum of the audio stream is taken with, so
+    spectra from different consumers can be compared and overlap-added.
+
+    Returns:
+        ndarray: float32 window of frame_length samples
+    """
+    return np.hanning(frame_length + 1)[:-1].astype(np.float32)
+
+
+def yin(frames, sr, fmin, fmax, threshold=0.2):
+    """
+    Estimate the fundamental frequency of a batch of frames with YIN.
+
+    Every frame is handled in the same array operations: one FFT based autocorrelation,
+    the cumulative mean normalized difference, and a vectorized search for the first
+    dip below the threshold, refined by parabolic interpolation.
+
+    Args:
+        frames (ndarray): (n_frames, frame_length) samples
+        sr (Int): Sample rate
+        fmin (Float): Lowest frequency to look for
+        fmax (Float): Highest frequency to look for
+        threshold (Float) (optional): Dip depth that counts as voiced (defaults to 0.2)
+
+    Returns:
+        (ndarray, ndarray): Frequencies (NaN where unvoiced) and voiced flags per frame
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    n_frames, frame_length = frames.shape
+    window = frame_length // 2
+    tau_min = max(1, int(np.floor(sr / fmax)))
+    tau_max = min(window, int(np.ceil(sr / fmin)))
+    if n_frames == 0 or tau_max <= tau_min + 1:
+        return np.full(n_frames, np.nan), np.zeros(n_frames, dtype=bool)
+
+    # r(tau) = sum_{j < window} x[j] * x[j + tau], for every frame at once
+    n_fft = 2 ** int(np.ceil(np.log2(frame_length + window)))
+    spectrum = np.fft.rfft(frames, n_fft)
+    head = np.fft.rfft(frames[:, :window], n_fft)
+    acf = np.fft.irfft(spectrum * np.conj(head), n_fft)[:, : tau_max + 1]
+
+    # d(tau) = e(0) + e(tau) - 2 r(tau), e(tau) = energy of x[tau : tau + window]
+    energy = np.cumsum(np.pad(frames**2, ((0, 0), (1, 0))), axis=1)
+    taus = np.arange(tau_max + 1)
+    window_energy = energy[:, taus + window] - energy[:, taus]
+    diff = window_energy[:, :1] + window_energy - 2 * acf
+    diff[:, 0] = 0
+
+    # cumulative mean normalized difference
+    cumulative = np.cumsum(diff[:, 1:], axis=1)
+    cmnd = np.ones_like(diff)
+    cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.maximum(cumulative, 1e-12)
+
+    # first local minimum below the threshold in the searched lag range
+    search = cmnd[:, tau_min : tau_max + 1]
+    is_min = np.zeros_like(search, dtype=bool)
+    is_min[:, 1:-1] = (search[:, 1:-1] <= search[:, :-2]) & (
+        search[:, 1:-1] < search[:, 2:]
+    )
+    candidates = is_min & (search < threshold)
+    voiced = candidates.any(axis=1)
+    best = np.argmax(candidates, axis=1)
+
+    # parabolic interpolation around the dip
+    rows = np.arange(n_frames)
+    center = np.clip(best, 1, search.shape[1] - 2)
+    left = search[rows, center - 1]
+    middle = search[rows, center]
+    right = search[rows, center + 1]
+    curvature = left - 2 * middle + right
+    curved = np.abs(curvature) > 1e-12
+    shift = np.where(curved, 0.5 * (left - right) / np.where(curved, curvature, 1), 0)
+    period = tau_min + center + np.clip(shift, -1, 1)
+
+    f0 = np.where(voiced, sr / period, np.nan)
+    return f0, voiced
+
+
+def midi_to_hz(midi):
+    """Frequency of MIDI note numbers in Hz."""
+    return 440.0 * 2.0 ** ((np.asarray(midi) - 69) / 12)
+
+
+class GoertzelBank:
+    """
+    Note detector for a known set of notes: measures the energy at just those pitches
+    instead of estimating a general f0.
+
+    Each filter is a Hann windowed single-bin DFT, which is exactly what a Goertzel filter
+    computes. All filters over a batch of frames are evaluated as one matrix product.
+    The bank covers every note, its octave neighbours, and the second harmonic of each,
+    so an octave error or a strong overtone doesn't read as a melody note.
+    """
+
+    def __init__(self, sr, notes, frame_length, threshold=0.08, min_rms=1e-3):
+        """
+        Args:
+            sr (Int): Sample rate
+            notes (list<Int>): MIDI numbers of the notes to listen for
+            frame_length (Int): Samples per frame, long enough to separate the closest
+                notes (about 4 periods of their frequency difference)
+            threshold (Float) (optional): Share of the frame's energy the winning note
+                needs, a pure tone gives about 1/3 (defaults to 0.08)
+            min_rms (Float) (optional): Quietest frame that can hold a note
+                (defaults to 1e-3)
+        """
+        self.sr = sr
+        self.frame_length = frame_length
+        self.threshold = threshold
+        self.min_rms = min_rms
+
+        melody = set(int(note) for note in notes)
+        self.candidates = np.array(
+            sorted({note + octave for note in melody for octave in (-12, 0, 12)})
+        )
+        bank = np.union1d(self.candidates, self.candidates + 12)
+        self._fundamental = np.searchsorted(bank, self.candidates)
+        self._harmonic = np.searchsorted(bank, self.candidates + 12)
+
+        self.frequencies = midi_to_hz(bank)
+        self.window = hann_window(frame_length).astype(np.float64)
+        phase = 2 * np.pi * np.outer(np.arange(frame_length), self.frequencies) / sr
+        self._cos = self.window[:, None] * np.cos(phase)
+        self._sin = self.window[:, None] * np.sin(phase)
+        self._from_bins = None  # spectrum interpolation, built on first use
+
+    def detect(self, frames):
+        """
+        Find the strongest bank note in each frame.
+
+        Args:
+            frames (ndarray): (n_frames, frame_length) samples
+
+        Returns:
+            (ndarray, ndarray): MIDI numbers and whether each frame holds a note
+        """
+        frames = np.asarray(frames, dtype=np.float64)
+        energy = (frames @ self._cos) ** 2 + (frames @ self._sin) ** 2
+        # Parseval: total spectral energy of the windowed frame
+        total = self.frame_length * np.sum((frames * self.window) ** 2, axis=1)
+        rms = np.sqrt(np.mean(frames**2, axis=1))
+        return self._pick(energy, total, rms)
+
+    def detect_spectrum(self, spectra):
+        """
+        Same as detect(), from the rfft of already windowed frames, e.g. the "spectrum"
+        feature of a FeatureBus, so no pass over the samples is needed.
+
+        The DFT of a frame determines its spectrum at every frequency, so the energy at
+        each bank note is an exact linear combination of the bins. The frame RMS is
+        estimated from the windowed energy.
+
+        Args:
+            spectra (ndarray): (n_frames, frame_length // 2 + 1) complex spectra
+
+        Returns:
+            (ndarray, ndarray): MIDI numbers and whether each frame holds a note
+        """
+        if self._from_bins is None:
+            self._from_bins = self._interpolation()
+        spectra = np.ascontiguousarray(spectra, dtype=np.complex64)
+        # real and imaginary parts interleaved, as one real matrix product
+        parts = spectra.view(np.float32) @ self._from_bins
+        n_bank = len(self.frequencies)
+        energy = parts[:, :n_bank] ** 2 + parts[:, n_bank:] ** 2
+
+        # Parseval over the full spectrum, bins other than DC and Nyquist appear twice
+        power = np.abs(spectra) ** 2
+        total = 2 * np.sum(power, axis=1) - power[:, 0] - power[:, -1]
+        windowed_mean = total / self.frame_length**2
+        rms = np.sqrt(windowed_mean / np.mean(self.window**2))
+        return self._pick(energy, total, rms)
+
+    def _interpolation(self):
+        """
+        Matrix that takes rfft bins X[k] to the DFT at each bank frequency f:
+        X(f) = sum_k X[k] D(k, f) over all N bins, and X[N - k] = conj(X[k]).
+        Rows alternate between the real and imaginary part of each bin, columns hold the
+        real parts of X(f) and then the imaginary parts.
+        """
+        n = self.frame_length
+        bins = np.arange(n)
+        # D(k, f) = 1/N sum_t exp(j theta t), theta = 2 pi (k / N - f / sr)
+        theta = 2 * np.pi * (bins[:, None] / n - self.frequencies[None, :] / self.sr)
+        denominator = 1 - np.exp(1j * theta)
+        flat = np.abs(denominator) < 1e-12
+        kernel = np.where(
+            flat, n, (1 - np.exp(1j * theta * n)) / np.where(flat, 1, denominator)
+        ) / n
+
+        half = n // 2
+        positive = kernel[: half + 1]
+        negative = np.zeros_like(positive)
+        negative[1:half] = kernel[n - np.arange(1, half)]
+
+        # X(f) = sum_k (a + jb) P + (a - jb) Q = a (P + Q) + j b (P - Q)
+        from_real = positive + negative
+        from_imag = 1j * (positive - negative)
+        matrix = np.zeros((2 * (half + 1), 2 * len(self.frequencies)), dtype=np.float32)
+        matrix[0::2] = np.hstack([from_real.real, from_real.imag])
+        matrix[1::2] = np.hstack([from_imag.real, from_imag.imag])
+        return matrix
+
+    def _pick(self, energy, total, rms):
+        """Strongest bank note per frame, from the energy at every bank frequency."""
+        # a note's own energy plus half its second harmonic's, so a tone an octave up
+        # still scores higher for the upper note
+        score = energy[:, self._fundamental] + 0.5 * energy[:, self._harmonic]
+        best = np.argmax(score, axis=1)
+        best_score = score[np.arange(len(score)), best]
+        voiced = (rms >= self.min_rms) & (best_score >= self.threshold * total)
+        return self.candidates[best], voiced
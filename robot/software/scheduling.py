@@ -0,0 +1,211 @@
+"""
+Fixed rate ticks for the control loop, with period and jitter histograms.
+"""
+
+import time
+
+
+class TickScheduler:
+    """
+    Keeps the control loop on a fixed-rate grid of deadlines instead of sleeping a fixed
+    amount after every tick, so slow ticks do not make the loop drift below its rate.
+
+    Overrun policies (what happens when a tick takes longer than one period):
+    - "skip": drop the missed deadlines and continue on the next grid point
+    - "catch_up": run the missed ticks back to back until the loop is on time again
+    """
+
+    POLICIES = ("skip", "catch_up")
+
+    def __init__(self, rate_hz=50, policy="skip", max_catch_up=5, bin_width=0.001):
+        """
+        Args:
+            rate_hz (Float) (optional): Target tick rate in Hz (defaults to 50)
+            policy (String) (optional): Overrun policy, "skip" or "catch_up" (defaults to
+                "skip")
+            max_catch_up (Int) (optional): Most ticks to run back to back under "catch_up"
+                before falling back to skipping (defaults to 5)
+            bin_width (Float) (optional): Width of a histogram bin in seconds (defaults to 1 ms)
+        """
+        if policy not in TickScheduler.POLICIES:
+            raise ValueError(f"Unknown overrun policy: {policy}")
+
+        self.period = 1.0 / rate_hz
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.bin_width = bin_width
+
+        self.next_deadline = None
+        self.last_tick = None
+        self._behind = 0  # ticks run back to back while catching up
+
+        # statistics
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.max_jitter = 0.0
+        self.period_histogram = {}  # bin index -> count
+        self.jitter_histogram = {}  # bin index -> count
+
+    def start(self):
+        """Start the deadline grid at the current time."""
+        self.next_deadline = time.monotonic()
+        self.last_tick = None
+
+    def wait(self):
+        """
+        Block until the next tick is due, then record its timing.
+
+        Returns:
+            Float: Monotonic time the tick started at
+        """
+        if self.next_deadline is None:
+            self.start()
+
+        remaining = self.next_deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        now = time.monotonic()
+        self._record(now)
+        self._advance(now)
+        return now
+
+    def _advance(self, now):
+        """Move the deadline one period forward, handling overruns by the policy."""
+        self.next_deadline += self.period
+        if now < self.next_deadline:
+            self._behind = 0
+            return
+
+        # already late for the next deadline
+        self.overruns += 1
+        if self.policy == "catch_up" and self._behind < self.max_catch_up:
+            self._behind += 1
+            return
+
+        # skip to the first grid point in the future
+        missed = int((now - self.next_deadline) // self.period) + 1
+        self.skipped += missed
+        self.next_deadline += missed * self.period
+        self._behind = 0
+
+    def _record(self, now):
+        """Add the tick's period and its lateness to the histograms."""
+        self.ticks += 1
+        jitter = now - self.next_deadline
+        self.max_jitter = max(self.max_jitter, jitter)
+        self._add(self.jitter_histogram, jitter)
+
+        if self.last_tick is not None:
+            self._add(self.period_histogram, now - self.last_tick)
+        self.last_tick = now
+
+    def _add(self, histogram, value):
+        index = int(value // self.bin_width)
+        histogram[index] = histogram.get(index, 0) + 1
+
+    def stats(self):
+        """
+        Summarize loop timing since start.
+
+        Returns:
+            dict: Tick count, overrun and skip counts, mean/max period and jitter in seconds
+        """
+        period_count = sum(self.period_histogram.values())
+        jitter_count = sum(self.jitter_histogram.values())
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "mean_period": self._mean(self.period_histogram, period_count),
+            "mean_jitter": self._mean(self.jitter_histogram, jitter_count),
+            "max_jitter": self.max_jitter,
+        }
+
+    def _mean(self, histogram, count):
+        if count == 0:
+            return 0.0
+        # use bin centers
+        total = sum((index + 0.5) * self.bin_width * n for index, n in histogram.items())
+        return total / count
+
+    def format_histogram(self, histogram, width=40):
+        """
+        Render a histogram as text, one line per bin in milliseconds.
+
+        Args:
+            histogram (dict): period_histogram or jitter_histogram
+            width (Int) (optional): Length of the longest bar (defaults to 40)
+
+        Returns:
+            String: Text histogram
+        """
+        if not histogram:
+            return "(empty)"
+        peak = max(histogram.values())
+        lines = []
+        for index in sorted(histogram):
+            count = histogram[index]
+            bar = "#" * max(1, round(width * count / peak))
+            low_ms = index * self.bin_width * 1000
+            lines.append(f"{low_ms:7.1f} ms | {bar} {count}")
+        return "\n".join(lines)
+
+
+class SensorScheduler:
+    """
+    Decides which sensors to read on a tick, so each sensor runs at its own rate and only
+    in states where its reading can change a decision.
+    """
+
+    def __init__(self):
+        self.sensors = {}  # name -> {"period", "disabled_states", "last"}
+
+    def add(self, name, period, disabled_states=()):
+        """
+        Register a sensor.
+
+        Args:
+            name (String): Sensor name
+            period (Float): Seconds between readings, 0 to read on every tick
+            disabled_states (list<String>) (optional): States where the sensor is not read
+        """
+        self.sensors[name] = {
+            "period": period,
+            "disabled_states": set(disabled_states),
+            "last": None,
+        }
+
+    def enabled(self, name, state):
+        """
+        Check whether a sensor is read at all in a state.
+
+        Args:
+            name (String): Sensor name
+            state (String): Current robot state
+
+        Returns:
+            Boolean: False if the state is one of the sensor's disabled states
+        """
+        return state not in self.sensors[name]["disabled_states"]
+
+    def due(self, name, now, state):
+        """
+        Check whether a sensor should be read this tick, and mark it as read if so.
+
+        Args:
+            name (String): Sensor name
+            now (Float): Current time in seconds
+            state (String): Current robot state
+
+        Returns:
+            Boolean: Whether the sensor should be read now
+        """
+        sensor = self.sensors[name]
+        if not self.enabled(name, state):
+            return False
+        if sensor["last"] is not None and now - sensor["last"] < sensor["period"]:
+            return False
+        sensor["last"] = now
+        return True
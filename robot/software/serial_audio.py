@@ -0,0 +1,311 @@
+"""
+Reader for the 3 microphone audio packets the Arduino sends over USB serial.
+"""
+
+import os
+import select
+import threading
+import time
+import numpy as np
+from robot.software.audio_buffer import AudioRingBuffer
+
+# a packet is the header and 243 interleaved int16 frames of the 3 channels
+HEADER = b"\xff\xfe"
+PAYLOAD_SIZE = 1458  # must match the Arduino sketch
+CHANNELS = 3  # must match NUM_CHANNELS in the Arduino sketch
+SAMPLE_RATE = 7500  # per channel, must match SAMPLE_RATE in the Arduino sketch
+BAUD_RATE = 1000000
+
+
+class FramedAudioParser:
+    """Splits a byte stream into audio packets and writes their frames into a ring."""
+
+    def __init__(
+        self,
+        buffer_seconds=10,
+        channels=CHANNELS,
+        payload_size=PAYLOAD_SIZE,
+        sample_rate=SAMPLE_RATE,
+        read_size=8192,
+    ):
+        """
+        Args:
+            buffer_seconds (Float) (optional): Seconds of audio kept per channel
+                (defaults to 10)
+            channels (Int) (optional): Interleaved channels per packet (defaults to 3)
+            payload_size (Int) (optional): Payload bytes per packet (defaults to 1458)
+            sample_rate (Int) (optional): Samples per second per channel
+                (defaults to 7500)
+            read_size (Int) (optional): Most bytes taken in per read (defaults to 8192)
+        """
+        if payload_size % (2 * channels) != 0:
+            raise ValueError("Payload must hold whole frames of int16 samples")
+
+        self.channels = channels
+        self.payload_size = payload_size
+        self.packet_size = len(HEADER) + payload_size
+        self.frames_per_packet = payload_size // (2 * channels)
+        self.sample_rate = sample_rate
+        # one row per frame like the payloads, but each channel stored contiguously, so
+        # writing de-interleaves and reads are (channels, n) views
+        self.ring = AudioRingBuffer(
+            int(buffer_seconds * sample_rate), shape=(channels,), planar=True
+        )
+
+        # unparsed bytes live in _buffer[:_fill], with room for one more read
+        self.read_size = read_size
+        self._buffer = bytearray(2 * self.packet_size + read_size)
+        self._fill = 0
+        self._need = len(HEADER)  # fill at which parsing can make progress again
+        self._drained = True  # whether the last read took everything the port had
+        self.synced = False  # whether a packet is expected to start at the parse position
+        self._locked = False  # whether the stream was confirmed since the last sync loss
+
+        # statistics
+        self.packets = 0
+        self.resyncs = 0  # times a confirmed stream lost its packet boundaries
+        self.skipped_bytes = 0  # bytes thrown away while searching for a header
+        self.dropped_packets = 0  # packets lost to the skipped bytes, estimated
+
+    def fill_from(self, read_into):
+        """
+        Read straight into the free part of the buffer and parse what arrived.
+
+        Args:
+            read_into (callable): Takes a writable memoryview and returns how many bytes
+                it filled, like a file's readinto()
+
+        Returns:
+            Int: Packets parsed
+        """
+        space = memoryview(self._buffer)[self._fill : self._fill + self.read_size]
+        count = read_into(space) or 0
+        self._drained = count < len(space)
+        space.release()
+        self._fill += count
+        # a live port hands over a few dozen bytes per read, only parse once they can
+        # complete a packet
+        if self._fill < self._need:
+            return 0
+        return self._parse()
+
+    def wait_time(self):
+        """
+        Returns:
+            Float: Seconds until enough bytes can have arrived to complete the next packet,
+                so a reader can sleep instead of waking for every few bytes, 0 while the
+                last read left more waiting
+        """
+        if not self._drained:
+            return 0.0
+        bytes_per_second = self.sample_rate / self.frames_per_packet * self.packet_size
+        return max(0, self._need - self._fill) / bytes_per_second
+
+    def feed(self, data):
+        """
+        Parse bytes that were already read, e.g. from a test.
+
+        Args:
+            data (bytes): Next bytes of the stream
+
+        Returns:
+            Int: Packets parsed
+        """
+        parsed = 0
+        view = memoryview(data)
+        while len(view) > 0:
+            chunk = view[: self.read_size]
+
+            def copy(space):
+                space[: len(chunk)] = chunk
+                return len(chunk)
+
+            parsed += self.fill_from(copy)
+            view = view[len(chunk) :]
+        return parsed
+
+    def _parse(self):
+        """Consume every complete packet in the buffer and keep the rest."""
+        data = np.frombuffer(self._buffer, dtype=np.uint8, count=self._fill)
+        position = 0
+        parsed = 0
+        while True:
+            if not self.synced:
+                start = self._find_header(data, position)
+                if start is None:
+                    # keep a trailing 0xFF, it may be the first half of a header
+                    keep = 1 if self._fill > position and data[-1] == HEADER[0] else 0
+                    self._skip(self._fill - keep - position)
+                    position = self._fill - keep
+                    break
+                self._skip(start - position)
+                position = start
+                self.synced = True
+
+            if self._locked:
+                # a confirmed stream: a packet counts as soon as it is complete and its
+                # own header is where the last packet said it would be
+                confirm = 0
+            else:
+                # the first header found after losing sync may be audio that looks like
+                # one, so it only counts once the header after its packet confirms it
+                confirm = 1
+            count = (self._fill - position - confirm * len(HEADER)) // self.packet_size
+            if count <= 0:
+                break
+            starts = position + self.packet_size * np.arange(count + confirm)
+            valid = (data[starts] == HEADER[0]) & (data[starts + 1] == HEADER[1])
+            good = valid[:count] & valid[confirm : count + confirm]
+            run = count if good.all() else int(np.argmin(good))
+
+            end = position + run * self.packet_size
+            self._write(data[position:end].reshape(run, self.packet_size))
+            parsed += run
+            position = end
+            if run > 0:
+                self._locked = True
+            if run < count:
+                # lost sync, or the header found was audio that looked like one: search
+                # again from the byte after it
+                if self._locked:
+                    self.resyncs += 1
+                self.synced = self._locked = False
+                position += 1
+                self._skip(1)
+
+        self.packets += parsed
+        remaining = self._fill - position
+        self._buffer[:remaining] = self._buffer[position : self._fill]
+        self._fill = remaining
+        if self.synced:
+            self._need = self.packet_size + (0 if self._locked else len(HEADER))
+        else:
+            self._need = len(HEADER)
+        return parsed
+
+    def _find_header(self, data, position):
+        """Index of the first header at or after position, None if there is none."""
+        window = data[position:]
+        hits = np.flatnonzero((window[:-1] == HEADER[0]) & (window[1:] == HEADER[1]))
+        if len(hits) == 0:
+            return None
+        return position + int(hits[0])
+
+    def _skip(self, count):
+        """Count bytes thrown away while out of sync."""
+        if count <= 0:
+            return
+        self.skipped_bytes += count
+        # every packet_size bytes lost, or part of it, is a packet that never arrived
+        before = (self.skipped_bytes - count + self.packet_size - 1) // self.packet_size
+        after = (self.skipped_bytes + self.packet_size - 1) // self.packet_size
+        self.dropped_packets += after - before
+
+    def _write(self, packets):
+        """De-interleave packet payloads into the channel planes of the ring."""
+        if len(packets) == 0:
+            return
+        # (packets, frames, channels) view of the samples, no copy
+        payloads = packets[:, len(HEADER) :].view("<i2")
+        frames = payloads.reshape(len(packets), -1, self.channels)
+        # packet by packet, merging packets into one run of frames would need a copy
+        for packet in frames:
+            self.ring.write(packet)
+
+    def latest(self, count):
+        """
+        Get the newest samples of every channel, lined up in time.
+
+        Args:
+            count (Int): Samples per channel, at most the ring capacity
+
+        Returns:
+            ndarray: (channels, count) int16 view, fewer columns until enough arrived,
+                same lifetime rules as AudioRingBuffer.latest()
+        """
+        return self.ring.latest(count).T
+
+    def read_from(self, position):
+        """
+        Get every sample written since a reader's cursor, lined up in time.
+
+        Args:
+            position (Int): Reader's cursor, from a previous call or 0
+
+        Returns:
+            (ndarray, Int): (channels, n) int16 view of the new samples and the reader's
+                new cursor, fewer than the cursor difference if the ring overflowed, same
+                lifetime rules as AudioRingBuffer.latest()
+        """
+        frames, end = self.ring.read_from(position)
+        return frames.T, end
+
+
+class SerialAudioReader(threading.Thread):
+    """Reads the microphone stream in the background and parses it as it arrives."""
+
+    def __init__(self, port, baud_rate=BAUD_RATE, timeout=0.1, **options):
+        """
+        Args:
+            port (String or serial.Serial): Serial port name, or an opened port
+            baud_rate (Int) (optional): Must match the Arduino (defaults to 1000000)
+            timeout (Float) (optional): Seconds a read waits for data (defaults to 0.1)
+            **options: FramedAudioParser arguments
+        """
+        super().__init__(daemon=True)
+        if isinstance(port, str):
+            import serial  # only needed when the reader opens the port itself
+
+            port = serial.Serial(port, baud_rate, timeout=timeout)
+        self.serial = port
+        self.timeout = timeout
+        # on POSIX the port is read straight into the parser's buffer
+        self._fd = port.fileno() if hasattr(port, "fileno") and os.name == "posix" else None
+        self.parser = FramedAudioParser(**options)
+        self.ring = self.parser.ring
+        self._running = True
+        self.read_errors = 0
+
+    def run(self):
+        self.serial.reset_input_buffer()
+        while self._running:
+            try:
+                self.parser.fill_from(self._read_into)
+            except OSError:
+                self.read_errors += 1
+            # the rest of the packet takes this long to arrive anyway
+            time.sleep(min(self.parser.wait_time(), self.timeout))
+        self.serial.close()
+
+    def _read_into(self, space):
+        """Wait for data, then take everything that is buffered, up to len(space)."""
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], self.timeout)
+            if not ready:
+                return 0
+            return os.readv(self._fd, [space])
+
+        waiting = self.serial.in_waiting
+        data = self.serial.read(min(len(space), max(1, waiting)))
+        space[: len(data)] = data
+        return len(data)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Packets parsed, resyncs, skipped bytes, dropped packets, read errors and
+                unread frames overwritten in the ring
+        """
+        parser = self.parser
+        return {
+            "packets": parser.packets,
+            "resyncs": parser.resyncs,
+            "skipped_bytes": parser.skipped_bytes,
+            "dropped_packets": parser.dropped_packets,
+            "read_errors": self.read_errors,
+            "overflowed": self.ring.overflowed,
+        }
+
+    def stop(self):
+        """Stop reading and close the port."""
+        self._running = False
@@ -0,0 +1,140 @@
+"""
+Reader for the telemetry frames the Arduino sends back on the actuator link.
+"""
+
+import os
+import select
+import struct
+import threading
+import time
+from robot.software.packet_protocol import FRAME_TELEMETRY, FrameDecoder
+
+# must match the telemetry payload in robot/hardware/usb_receive/usb_receive.ino
+TELEMETRY = struct.Struct("<BiiIIHH")
+BUTTON_PRESSED = 1  # pressed when the frame was sent
+BUTTON_LATCHED = 2  # pressed at some point since the last frame
+NEEDS_KEYFRAME = 4  # a delta's base was lost, the actuators wait for a full packet
+
+
+class TelemetryReader(threading.Thread):
+    """Parses telemetry in the background and keeps the newest values."""
+
+    def __init__(self, port, timeout=0.1, read_size=4096):
+        """
+        Args:
+            port (serial.Serial): Opened Arduino port, the control loop keeps writing to it
+            timeout (Float) (optional): Seconds a read waits for data (defaults to 0.1)
+            read_size (Int) (optional): Most bytes taken in per read (defaults to 4096)
+        """
+        super().__init__(daemon=True)
+        self.serial = port
+        self.timeout = timeout
+        self.read_size = read_size
+        # on POSIX the port is read with select and os.read, never blocking a writer
+        self._fd = port.fileno() if hasattr(port, "fileno") and os.name == "posix" else None
+        self.decoder = FrameDecoder()
+        self._running = True
+        self.read_errors = 0
+        self.disconnected = False  # the port reached end of file, e.g. was unplugged
+
+        self.latest = None  # newest telemetry dict, None until the first frame
+        # presses counted by this thread and collected by the control loop, each counter
+        # only written by one thread so no press is lost between the two
+        self._presses = 0
+        self._presses_seen = 0
+
+    def run(self):
+        while self._running:
+            try:
+                data = self._read()
+            except EOFError:
+                self.disconnected = True
+                break
+            except OSError:
+                self.read_errors += 1
+                time.sleep(self.timeout)  # a failing port fails again right away
+                continue
+            if data:
+                self._publish(self.decoder.feed(data))
+
+    def _read(self):
+        """
+        Wait for data, then take everything that is buffered, up to read_size.
+
+        Returns:
+            bytes: Data read, empty if none came within the timeout
+        """
+        if self._fd is not None:
+            ready, _, _ = select.select([self._fd], [], [], self.timeout)
+            if not ready:
+                return b""
+            data = os.read(self._fd, self.read_size)
+            if not data:
+                # readable without data, the port is gone and would be readable forever
+                raise EOFError("Arduino port closed")
+            return data
+        return self.serial.read(min(self.read_size, max(1, self.serial.in_waiting)))
+
+    def _publish(self, frames):
+        """Swap in the newest telemetry frame, latching any button press in between."""
+        latest = None
+        for frame_type, _, payload in frames:
+            if frame_type != FRAME_TELEMETRY or len(payload) != TELEMETRY.size:
+                continue
+            latest = payload
+            button = payload[0]
+            if button & (BUTTON_PRESSED | BUTTON_LATCHED):
+                self._presses += 1
+        if latest is None:
+            return
+
+        flags, right, left, loops, received, rejected, lost = TELEMETRY.unpack(latest)
+        self.latest = {
+            "time": time.monotonic(),
+            "button": bool(flags & BUTTON_PRESSED),
+            "needs_keyframe": bool(flags & NEEDS_KEYFRAME),
+            "encoder_right": right,
+            "encoder_left": left,
+            "loop_count": loops,
+            "frames_received": received,
+            "frames_rejected": rejected,
+            "frames_lost": lost,
+        }
+
+    def button_pressed(self):
+        """
+        Whether the button is pressed, or was pressed since the last call even if only
+        between two telemetry frames. Never waits.
+
+        Returns:
+            Boolean: Pressed now or since the last call
+        """
+        presses = self._presses
+        pressed = presses != self._presses_seen
+        self._presses_seen = presses
+        latest = self.latest
+        return pressed or (latest is not None and latest["button"])
+
+    def age(self):
+        """
+        Returns:
+            Float: Seconds since the newest telemetry arrived, inf before the first
+        """
+        latest = self.latest
+        return float("inf") if latest is None else time.monotonic() - latest["time"]
+
+    def stats(self):
+        """
+        Returns:
+            dict: Telemetry frames parsed, rejected, out of order and lost, bytes skipped,
+                read errors and whether the port was disconnected
+        """
+        return dict(
+            self.decoder.stats(),
+            read_errors=self.read_errors,
+            disconnected=self.disconnected,
+        )
+
+    def stop(self):
+        """Stop reading, the port stays open for the control loop."""
+        self._running = False
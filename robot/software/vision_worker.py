@@ -0,0 +1,249 @@
+"""
+Optional process that owns the camera and runs BerryDetection, frames and results go
+through shared memory rings.
+"""
+
+import atexit
+import time
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import cv2 as cv
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("seq", "<u8"),  # written last, 0 while the record is being filled in
+        ("frame_id", "<u8"),
+        ("timestamp", "<f8"),  # monotonic capture time, shared by all processes
+        ("brightness", "<f4"),
+        ("x", "<f4"),  # berry position in the rotated frame, NaN if none
+        ("y", "<f4"),
+        ("area", "<f4"),
+        ("exposure", "<f4"),
+        ("gain", "<f4"),
+    ]
+)
+RESULT_SLOTS = 8
+
+
+def _result_views(buf, slots):
+    """Split the result buffer into the latest sequence number and the record ring."""
+    header = np.ndarray((1,), dtype="<u8", buffer=buf)
+    records = np.ndarray((slots,), dtype=RECORD_DTYPE, buffer=buf, offset=8)
+    return header, records
+
+
+class _SlotCamera:
+    """Stands in for CameraCapture inside the worker, serving the frame just read."""
+
+    def __init__(self):
+        self.frame = None
+        self.timestamp = None
+        self.frame_id = 0
+        self.exposure = (None, None)
+
+    def latest(self):
+        return self.frame, self.timestamp, self.frame_id
+
+    def latest_exposure(self):
+        return self.exposure
+
+
+def _capture_loop(cap, frames, header, records, stop, options):
+    """Capture into the frame ring, analyze each frame and publish its record."""
+    # imported here so the control process doesn't need the analysis stack for this module
+    from robot.software.berry_detection import BerryDetection
+
+    camera = _SlotCamera()
+    detection = BerryDetection(camera, **options)
+    slots = len(frames)
+    seq = 0
+    while not stop.is_set():
+        slot = frames[(seq + 1) % slots]
+        # decode straight into shared memory
+        ret, frame = cap.read(slot)
+        timestamp = time.monotonic()
+        if not ret:
+            time.sleep(0.01)
+            continue
+        if frame is not slot:
+            # the driver allocated its own buffer, it ignored the size the ring was made
+            # for, so scale into the slot and report positions in the ring's pixels
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                if frame.ndim == 2:
+                    frame = cv.cvtColor(frame, cv.COLOR_GRAY2BGR)
+                cv.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot)
+
+        seq += 1
+        camera.frame, camera.timestamp, camera.frame_id = slot, timestamp, seq
+        if seq % 15 == 1:
+            camera.exposure = (
+                cap.get(cv.CAP_PROP_EXPOSURE),
+                cap.get(cv.CAP_PROP_GAIN),
+            )
+        analysis = detection.analysis()
+
+        record = records[seq % RESULT_SLOTS]
+        record["seq"] = 0
+        record["frame_id"] = seq
+        record["timestamp"] = timestamp
+        record["brightness"] = analysis.brightness
+        if analysis.berry_position is None:
+            record["x"] = record["y"] = np.nan
+        else:
+            record["x"], record["y"] = analysis.berry_position
+        record["area"] = analysis.berry_area
+        exposure, gain = camera.exposure
+        record["exposure"] = np.nan if exposure is None else exposure
+        record["gain"] = np.nan if gain is None else gain
+        record["seq"] = seq
+        header[0] = seq
+
+
+def _worker_main(device, shape, slots, frame_name, result_name, ready, stop, options):
+    """Worker process entry point."""
+    frame_shm = shared_memory.SharedMemory(name=frame_name)
+    result_shm = shared_memory.SharedMemory(name=result_name)
+    frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=frame_shm.buf)
+    header, records = _result_views(result_shm.buf, RESULT_SLOTS)
+
+    cap = cv.VideoCapture(device)
+    try:
+        if not cap.isOpened():
+            print("Cannot open camera")
+            return
+        cap.set(cv.CAP_PROP_FRAME_WIDTH, shape[1])
+        cap.set(cv.CAP_PROP_FRAME_HEIGHT, shape[0])
+        ready.set()
+        _capture_loop(cap, frames, header, records, stop, options)
+    except Exception:
+        # the control process only sees the exit code, so say why here
+        traceback.print_exc()
+        raise
+    finally:
+        cap.release()
+        # views into shared memory have to go before it can be closed
+        del frames, header, records
+        frame_shm.close()
+        result_shm.close()
+
+
+class VisionWorker:
+    """Runs capture and analysis in a separate process and reads back its results."""
+
+    def __init__(self, device=0, shape=(480, 640, 3), slots=4, **options):
+        """
+        Args:
+            device (Int) (optional): OpenCV camera index (defaults to 0)
+            shape ((int, int, int)) (optional): Frame shape the camera is set to
+                (defaults to (480, 640, 3))
+            slots (Int) (optional): Frames in the shared ring (defaults to 4)
+            **options: BerryDetection arguments for the analysis in the worker
+        """
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_size = int(np.prod(self.shape)) * slots
+        result_size = 8 + RECORD_DTYPE.itemsize * RESULT_SLOTS
+
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=frame_size)
+        self._result_shm = shared_memory.SharedMemory(create=True, size=result_size)
+        self.frames = np.ndarray(
+            (slots,) + self.shape, dtype=np.uint8, buffer=self._frame_shm.buf
+        )
+        self._header, self._records = _result_views(self._result_shm.buf, RESULT_SLOTS)
+        self._header[0] = 0
+
+        self._ready = mp.Event()
+        self._stop = mp.Event()
+        self.process = mp.Process(
+            target=_worker_main,
+            args=(
+                device,
+                self.shape,
+                slots,
+                self._frame_shm.name,
+                self._result_shm.name,
+                self._ready,
+                self._stop,
+                options,
+            ),
+            daemon=True,
+        )
+        self._last = None
+        self.torn_reads = 0
+
+    def start(self, timeout=5):
+        """
+        Start the worker and wait until it has opened the camera.
+
+        Args:
+            timeout (Float) (optional): Seconds to wait for the camera (defaults to 5)
+        """
+        self.process.start()
+        if not self._ready.wait(timeout):
+            self.stop()
+            raise RuntimeError("Vision worker could not open the camera")
+        atexit.register(self.stop)
+
+    def latest(self):
+        """
+        Get the newest result record without waiting for the worker.
+
+        Returns:
+            ndarray or None: Copy of the newest RECORD_DTYPE record, or None if there are
+                no results yet
+
+        Raises:
+            RuntimeError: If the worker process has died, its results would be stale
+        """
+        if not self.process.is_alive():
+            raise RuntimeError(
+                f"Vision worker stopped (exit code {self.process.exitcode})"
+            )
+        for _ in range(3):
+            seq = int(self._header[0])
+            if seq == 0:
+                return self._last
+            # seqlock: the worker zeroes a slot's seq before rewriting it and sets it
+            # last, so a slot that shows the same seq before and after the copy wasn't
+            # touched in between
+            index = seq % RESULT_SLOTS
+            if self._records["seq"][index] != seq:
+                continue
+            record = self._records[index].copy()
+            if self._records["seq"][index] == seq:
+                self._last = record
+                return record
+            # the worker lapped the ring while we copied
+            self.torn_reads += 1
+        return self._last
+
+    def latest_frame(self):
+        """
+        Get a view of the frame the newest record was computed from, without copying.
+        The worker overwrites it after `slots` more frames, so copy it to keep it.
+
+        Returns:
+            ndarray or None: BGR frame in shared memory
+        """
+        seq = int(self._header[0])
+        if seq == 0:
+            return None
+        return self.frames[seq % self.slots]
+
+    def stop(self):
+        """Stop the worker and free the shared memory."""
+        if self._frame_shm is None:
+            return
+        self._stop.set()
+        if self.process.is_alive():
+            self.process.join(timeout=2)
+        del self.frames, self._header, self._records
+        self._frame_shm.close()
+        self._frame_shm.unlink()
+        self._result_shm.close()
+        self._result_shm.unlink()
+        self._frame_shm = None